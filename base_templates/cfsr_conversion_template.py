@@ -16,7 +16,10 @@ path_output = '/some/path'
 path_pycfs = '/some/path'  # The path to cfsr.py and gribou.py
 var_names = ['pressfc']  # The RDA archive cfsr dataset prefix
 grib_var_names = ['Surface pressure']
-"""The grib_var_names can be obtained from gribou.all_str_dump(file_name)"""
+"""The grib_var_names can be obtained from gribou.all_str_dump(file_name),
+or with their levels for all the variables from cfsr.inventory(grib_files);
+cfsr.conversion_specs(inventory, {grib_var_name: (nc_var_name, nc_units)})
+then gives the keyword arguments of each cfsr.hourly_grib2_to_netcdf call."""
 grib_levels = [None]
 """The grib levels are set to None if there are no vertical level units
 in the groubou.all_str_dump(file_name), otherwise the number is used
@@ -37,6 +40,8 @@ the higher resolution is selected, set to 'highres'. For lower resolutions,
 the file names should have a *.l.gdas.* structure, in this case set to
 'lowres'"""
 cache_size = 100
+"""For a few large months, cfsr.hourly_grib2_to_netcdf_parallel splits the
+compression of each month over multiple processes (nparts)."""
 
 rc = Client()
 with rc[:].sync_imports():
@@ -78,6 +83,7 @@ for i, var_name in enumerate(var_names):
                 nc_format=nc_format))
 
     if nc_var_names[i] in ['tasmin','tasmax']:
-        print("WARNING: this is a cumulative min/max variable, need to run"
-              "cfsr_sampling.py afterwards.")
+        print("WARNING: this is a cumulative min/max variable, pass "
+              "extremes='window' (6h extremes) or extremes='hourly' to "
+              "hourly_grib2_to_netcdf, or run cfsr_sampling.py afterwards.")
 
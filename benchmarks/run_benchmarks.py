@@ -0,0 +1,268 @@
+"""Benchmarks of the conversion and reading hot paths.
+
+Usage:
+
+    $ python run_benchmarks.py results.json [baseline.json]
+
+Synthetic files are written in a temporary directory. GRIB2 benchmarks
+require ecCodes (to write the files) and pygrib (to read them), they are
+skipped otherwise. Results are stored as JSON with the versions of the
+libraries, and compared to a baseline run if one is given. Failed
+benchmarks are reported with their traceback and are not stored, the
+exit status is then 1.
+
+"""
+
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+import traceback
+
+import numpy as np
+import numpy.ma as ma
+import netCDF4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'cfs'))
+
+import netcdf as nc
+import timely as ty
+import synthetic
+
+try:
+    import cfsr
+    import gribou
+except ImportError:
+    cfsr = None
+    gribou = None
+
+repeat = 3
+ndays = 2
+"""Number of days in the synthetic GRIB2 months."""
+grid_netcdf = (91, 180)
+"""Grid of the synthetic NetCDF months."""
+nmonths = 3
+
+
+def time_it(function, repeat=repeat):
+    """Best and mean wall time of a function.
+
+    Parameters
+    ----------
+    function : function without arguments
+    repeat : int
+
+    Returns
+    -------
+    out : dict
+
+    """
+
+    times = []
+    for i in range(repeat):
+        t = timeit.default_timer()
+        function()
+        times.append(timeit.default_timer() - t)
+    return {'best': min(times), 'mean': sum(times) / len(times),
+            'repeat': repeat}
+
+
+def versions():
+    d = {'python': platform.python_version(), 'platform': platform.platform(),
+         'numpy': np.__version__, 'netCDF4': netCDF4.__version__,
+         'netcdf-c': netCDF4.__netcdf4libversion__,
+         'hdf5': netCDF4.__hdf5libversion__}
+    for module_name in ['pygrib', 'eccodes', 'h5py']:
+        try:
+            module = __import__(module_name)
+            d[module_name] = getattr(module, '__version__', 'unknown')
+        except ImportError:
+            d[module_name] = None
+    return d
+
+
+def grib_benchmarks(path):
+    """Benchmarks of gribou and cfsr on synthetic GRIB2 files."""
+
+    benchmarks = {}
+    for grid in sorted(synthetic.grids.keys()):
+        for var_name in sorted(synthetic.variables.keys()):
+            grib_file = os.path.join(path, "%s_%s.grb2" % (var_name, grid))
+            synthetic.write_grib2_month(grib_file, var_name, 1979, 1,
+                                        ndays=ndays, grid=grid)
+            list_of_msg_dicts = gribou.get_all_msg_dict(grib_file)
+            cfsr_var = cfsr.CFSRVariable(list_of_msg_dicts[0])
+            nc_var_name = synthetic.variables[var_name]['nc_var_name']
+            key = "%s_%s" % (var_name, grid)
+            nc_file = os.path.join(path, key + '.nc')
+
+            benchmarks['gribou.get_all_msg_dict_' + key] = (
+                lambda f=grib_file: gribou.get_all_msg_dict(f))
+            benchmarks['cfsr.filter_var_timesteps_' + key] = (
+                lambda d=list_of_msg_dicts, v=cfsr_var:
+                cfsr.filter_var_timesteps(d, v.name, v.level))
+            for output_format in ['netcdf', 'raw']:
+                benchmarks["cfsr.hourly_grib2_to_netcdf_%s_%s" % (
+                    output_format, key)] = (
+                    lambda f=grib_file, o=nc_file, v=cfsr_var, n=nc_var_name,
+                    of=output_format:
+                    cfsr.hourly_grib2_to_netcdf(f, 'rda', o, n, v.name,
+                                                v.level, output_format=of))
+    return benchmarks
+
+
+def netcdf_benchmarks(path):
+    """Benchmarks of multi-file reads on synthetic NetCDF files."""
+
+    nc_files = []
+    for month in range(1, nmonths + 1):
+        nc_file = os.path.join(path, "tas_1979%02d.nc" % (month,))
+        synthetic.write_netcdf_month(nc_file, 'tas', 1979, month,
+                                     *grid_netcdf)
+        nc_files.append(nc_file)
+    mfv = nc.MultiFileVariable(nc_files, 'tas')
+    rs = np.random.RandomState(0)
+    points = np.array([rs.randint(0, grid_netcdf[0], 100),
+                       rs.randint(0, grid_netcdf[1], 100)]).T
+    with nc.dataset_pool.open(nc_files[0]) as nc1:
+        tvs = nc1.variables['time_vectors'][:, :]
+
+    benchmarks = {}
+    benchmarks['netcdf._time_vectors_to_datetimes'] = (
+        lambda: nc._time_vectors_to_datetimes(tvs))
+    benchmarks['netcdf.MultiFileVariable'] = (
+        lambda: nc.MultiFileVariable(nc_files, 'tas'))
+    benchmarks['netcdf.MultiFileVariable_point'] = lambda: mfv[:, 45, 90]
+    benchmarks['netcdf.MultiFileVariable_map'] = lambda: mfv[800, :, :]
+    benchmarks['netcdf.MultiFileVariable.points_100'] = (
+        lambda: mfv.points(points))
+    benchmarks['netcdf.load_point_timeseries_from_multiple_files'] = (
+        lambda: nc.load_point_timeseries_from_multiple_files(
+            nc_files, 'tas', j=45, i=90, access_pattern='point'))
+    return benchmarks
+
+
+def timely_benchmarks():
+    """Benchmarks of the timely arithmetic hot paths."""
+
+    base = datetime.datetime(1979, 1, 1)
+    nt = 24 * 365
+    warp = np.array([(base + datetime.timedelta(hours=h)).timetuple()[0:6]
+                     for h in range(nt)])
+    # timely expects a full mask
+    tvs = ma.array(warp, mask=np.zeros(warp.shape, dtype=bool))
+    tseries = ty.TimeSeries(tvs)
+    months = np.array([[[1979, m, 1, 0, 0, 0],
+                        [1979 + m // 12, m % 12 + 1, 1, 0, 0, 0]]
+                       for m in range(1, 13)])
+    mperiod = ty.MultiPeriod(ma.array(months,
+                                      mask=np.zeros(months.shape, bool)),
+                             False, True)
+    year = ty.Period(ma.array([[1979, 1, 1, 0, 0, 0], [1980, 1, 1, 0, 0, 0]],
+                              mask=np.zeros([2, 6], bool)), False, True)
+    date = ty.Date(ma.array([1979, 1, 1, 0, 0, 0], mask=[False] * 6))
+    six_hours = ty.DeltaT([0, 0, 0, 6])
+    one_day = ty.DeltaT([0, 0, 1])
+
+    def date_additions():
+        d = date
+        for i in range(100):
+            d = d + six_hours
+
+    benchmarks = {}
+    benchmarks['timely.TimeSeries'] = lambda: ty.TimeSeries(tvs)
+    benchmarks['timely.Date_add_100'] = date_additions
+    benchmarks['timely.MultiDate_add'] = lambda: tseries + six_hours
+    benchmarks['timely.TimeSeries.timestep'] = lambda: tseries.timestep()
+    benchmarks['timely.Period.regular_division_daily'] = (
+        lambda: year.regular_division(one_day, None, one_day))
+    benchmarks['timely.MultiDate.intersection_many_monthly'] = (
+        lambda: tseries.intersection_many(mperiod))
+    benchmarks['timely.MultiPeriod.count_hours'] = (
+        lambda: mperiod.count_hours())
+    return benchmarks
+
+
+def run(benchmarks):
+    """Time the benchmarks.
+
+    Parameters
+    ----------
+    benchmarks : dict
+        function without arguments for each benchmark name.
+
+    Returns
+    -------
+    out : tuple of dict
+        timings of the successful benchmarks, and traceback of the failed
+        ones.
+
+    """
+
+    results = {}
+    errors = {}
+    for name in sorted(benchmarks.keys()):
+        try:
+            results[name] = time_it(benchmarks[name])
+        except Exception as e:
+            errors[name] = traceback.format_exc()
+            print("%-60s FAILED %s: %s" % (name, type(e).__name__, e))
+            continue
+        print("%-60s %10.4f s" % (name, results[name]['best']))
+    return results, errors
+
+
+def compare(results, baseline):
+    """Print the ratio of the best times to a baseline run."""
+
+    for name in sorted(results.keys()):
+        if name not in baseline:
+            continue
+        if ('best' not in results[name]) or ('best' not in baseline[name]):
+            continue
+        ratio = results[name]['best'] / baseline[name]['best']
+        print("%-60s %6.2fx" % (name, ratio))
+
+
+def main(results_file, baseline_file=None):
+    path = tempfile.mkdtemp()
+    try:
+        benchmarks = timely_benchmarks()
+        benchmarks.update(netcdf_benchmarks(path))
+        warp = importlib.util.find_spec('eccodes') is not None
+        flag_grib = warp and (gribou is not None)
+        if flag_grib:
+            benchmarks.update(grib_benchmarks(path))
+        else:
+            print("ecCodes or pygrib not found, skipping GRIB2 benchmarks.")
+        results, errors = run(benchmarks)
+    finally:
+        nc.dataset_pool.clear()
+        shutil.rmtree(path)
+    output = {'date': datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+              'versions': versions(), 'results': results}
+    with open(results_file, 'w') as f:
+        json.dump(output, f, indent=1, sort_keys=True)
+    if baseline_file is not None:
+        with open(baseline_file, 'r') as f:
+            baseline = json.load(f)
+        compare(results, baseline['results'])
+    for name in sorted(errors.keys()):
+        sys.stderr.write("\n%s failed:\n%s" % (name, errors[name]))
+    if errors:
+        sys.stderr.write("\n%d benchmark(s) failed.\n" % (len(errors),))
+    return len(errors)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in [2, 3]:
+        print(__doc__)
+        sys.exit(1)
+    if main(*sys.argv[1:]):
+        sys.exit(1)
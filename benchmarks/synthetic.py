@@ -0,0 +1,198 @@
+"""Synthetic CFSR-like GRIB2 and NetCDF files for the benchmarks.
+
+GRIB2 files are written with ecCodes, one variable per file and per month
+as in the RDA archive. Each 6-hourly cycle has the structure of the CFSR
+time series files:
+
+ * instant variables: analysis, 3 minutes spin-up, then 1h to 6h forecasts.
+ * avg and accum variables: 0-1h to 0-6h forecasts.
+
+"""
+
+import datetime
+
+import numpy as np
+import netCDF4
+
+grids = {'0.5': (361, 720, 0.5), '0.3125': (577, 1152, 0.3125)}
+"""Regular lat/lon grids (nlat, nlon, resolution) of the CFSR products."""
+
+variables = {
+    'tmp2m': {'nc_var_name': 'tas', 'discipline': 0, 'parameterCategory': 0,
+              'parameterNumber': 0, 'typeOfFirstFixedSurface': 103,
+              'scaledValueOfFirstFixedSurface': 2, 'stepType': 'instant',
+              'mean': 280.0, 'amplitude': 30.0},
+    'prate': {'nc_var_name': 'pr', 'discipline': 0, 'parameterCategory': 1,
+              'parameterNumber': 7, 'typeOfFirstFixedSurface': 1,
+              'stepType': 'avg', 'mean': 3e-5, 'amplitude': 3e-5},
+    'apcp': {'nc_var_name': 'pr', 'discipline': 0, 'parameterCategory': 1,
+             'parameterNumber': 8, 'typeOfFirstFixedSurface': 1,
+             'stepType': 'accum', 'mean': 0.5, 'amplitude': 0.5},
+}
+"""Variables of each kind of statistic, keyed by RDA file prefix, with the
+name of the converted NetCDF variable."""
+
+
+def _field(nlat, nlon, mean, amplitude, seed):
+    # Smooth field with some noise, so that packing is realistic.
+    rs = np.random.RandomState(seed)
+    lat = np.linspace(-np.pi / 2, np.pi / 2, nlat)[:, None]
+    lon = np.linspace(0, 2 * np.pi, nlon, endpoint=False)[None, :]
+    warp = np.cos(lat) * np.sin(lon + seed * 0.1)
+    warp = warp + 0.05 * rs.standard_normal([nlat, nlon])
+    return np.abs(mean + amplitude * warp)
+
+
+def _cycle_steps(step_type):
+    # (startStep, endStep) of the messages of one cycle.
+    if step_type == 'instant':
+        return [(0, 0), (0, 0)] + [(k, k) for k in range(1, 7)]
+    return [(0, k) for k in range(1, 7)]
+
+
+def write_grib2_month(grib_file, var_name, year, month, ndays=None,
+                      grid='0.5'):
+    """Write a month of a synthetic CFSR variable in a GRIB2 file.
+
+    Parameters
+    ----------
+    grib_file : string
+    var_name : string
+        a key of variables.
+    year : int
+    month : int
+    ndays : int, optional
+        number of days, defaults to the whole month.
+    grid : string, optional
+        a key of grids.
+
+    Returns
+    -------
+    out : int
+        number of messages.
+
+    """
+
+    import eccodes
+
+    nlat, nlon, resolution = grids[grid]
+    definition = variables[var_name]
+    if ndays is None:
+        warp = datetime.date(year + month // 12, month % 12 + 1, 1)
+        ndays = (warp - datetime.date(year, month, 1)).days
+    sample = eccodes.codes_grib_new_from_samples('regular_ll_sfc_grib2')
+    n = 0
+    with open(grib_file, 'wb') as f:
+        for day in range(1, ndays + 1):
+            for hour in [0, 6, 12, 18]:
+                for start_step, end_step in _cycle_steps(
+                        definition['stepType']):
+                    gid = eccodes.codes_clone(sample)
+                    eccodes.codes_set(gid, 'centre', 'kwbc')
+                    eccodes.codes_set(gid, 'Ni', nlon)
+                    eccodes.codes_set(gid, 'Nj', nlat)
+                    eccodes.codes_set(gid, 'latitudeOfFirstGridPointInDegrees',
+                                      90.0)
+                    eccodes.codes_set(gid, 'latitudeOfLastGridPointInDegrees',
+                                      90.0 - (nlat - 1) * resolution)
+                    eccodes.codes_set(gid,
+                                      'longitudeOfFirstGridPointInDegrees',
+                                      0.0)
+                    eccodes.codes_set(gid, 'longitudeOfLastGridPointInDegrees',
+                                      (nlon - 1) * resolution)
+                    eccodes.codes_set(gid, 'iDirectionIncrementInDegrees',
+                                      resolution)
+                    eccodes.codes_set(gid, 'jDirectionIncrementInDegrees',
+                                      resolution)
+                    eccodes.codes_set(gid, 'jScansPositively', 0)
+                    eccodes.codes_set(gid, 'dataDate',
+                                      year * 10000 + month * 100 + day)
+                    eccodes.codes_set(gid, 'dataTime', hour * 100)
+                    if definition['stepType'] == 'instant':
+                        eccodes.codes_set(gid, 'productDefinitionTemplateNumber',
+                                          0)
+                        eccodes.codes_set(gid, 'forecastTime', end_step)
+                    else:
+                        eccodes.codes_set(gid, 'productDefinitionTemplateNumber',
+                                          8)
+                        eccodes.codes_set(gid, 'typeOfStatisticalProcessing',
+                                          {'avg': 0, 'accum': 1}[
+                                              definition['stepType']])
+                        eccodes.codes_set(gid, 'stepRange',
+                                          "%d-%d" % (start_step, end_step))
+                    for key in ['discipline', 'parameterCategory',
+                                'parameterNumber', 'typeOfFirstFixedSurface']:
+                        eccodes.codes_set(gid, key, definition[key])
+                    if 'scaledValueOfFirstFixedSurface' in definition:
+                        eccodes.codes_set(gid, 'scaleFactorOfFirstFixedSurface',
+                                          0)
+                        eccodes.codes_set(
+                            gid, 'scaledValueOfFirstFixedSurface',
+                            definition['scaledValueOfFirstFixedSurface'])
+                    eccodes.codes_set(gid, 'bitsPerValue', 16)
+                    data = _field(nlat, nlon, definition['mean'],
+                                  definition['amplitude'], n)
+                    eccodes.codes_set_values(gid, data.ravel())
+                    eccodes.codes_write(gid, f)
+                    eccodes.codes_release(gid)
+                    n += 1
+    eccodes.codes_release(sample)
+    return n
+
+
+def write_netcdf_month(nc_file, var_name, year, month, nlat, nlon,
+                       initial_year=1979):
+    """Write a month of hourly data laid out as the converted CFSR files.
+
+    Parameters
+    ----------
+    nc_file : string
+    var_name : string
+    year : int
+    month : int
+    nlat : int
+    nlon : int
+    initial_year : int, optional
+
+    """
+
+    first = datetime.datetime(year, month, 1)
+    last = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+    nt = int((last - first).total_seconds() // 3600)
+    # Same layout as cfsr.optimal_chunksizes
+    clon = np.sqrt(1000000.0 * nlon / (nlat * nt))
+    clat = nlat * clon / nlon
+    chunksizes = (nt, min(nlat, int(np.ceil(clat))),
+                  min(nlon, int(np.ceil(clon))))
+
+    nc1 = netCDF4.Dataset(nc_file, 'w', format='NETCDF4')
+    nc1.createDimension('time', None)
+    nc1.createDimension('timecomp', 6)
+    nc1.createDimension('lat', nlat)
+    nc1.createDimension('lon', nlon)
+    time = nc1.createVariable('time', 'i4', ('time',), zlib=True)
+    time.units = "hours since %d-01-01 00:00:00" % (initial_year,)
+    time.calendar = 'gregorian'
+    time_vectors = nc1.createVariable('time_vectors', 'i2',
+                                      ('time', 'timecomp'), zlib=True)
+    lat = nc1.createVariable('lat', 'f4', ('lat',), zlib=True)
+    lat.units = 'degrees_north'
+    lat[:] = np.linspace(-90, 90, nlat)
+    lon = nc1.createVariable('lon', 'f4', ('lon',), zlib=True)
+    lon.units = 'degrees_east'
+    lon[:] = np.linspace(0, 360, nlon, endpoint=False)
+    var1 = nc1.createVariable(var_name, 'f4', ('time', 'lat', 'lon'),
+                              zlib=True, chunksizes=chunksizes,
+                              fill_value=netCDF4.default_fillvals['f4'])
+    var1.units = 'K'
+
+    hours = (first - datetime.datetime(initial_year, 1, 1)).total_seconds()
+    hours = int(hours // 3600) + np.arange(nt)
+    time[:] = hours
+    datetimes = [first + datetime.timedelta(hours=t) for t in range(nt)]
+    time_vectors[:, :] = [x.timetuple()[0:6] for x in datetimes]
+    # Chunks span the whole month, write it at once rather than compressing
+    # each chunk again for every slab.
+    var1[:, :, :] = np.array([_field(nlat, nlon, 280.0, 30.0, t)
+                              for t in range(nt)], dtype='f4')
+    nc1.close()
@@ -0,0 +1,299 @@
+"""
+=======
+Catalog
+=======
+
+SQLite metadata catalog of a tree of NetCDF files.
+
+Functions:
+
+ * :func:`build_catalog` - scan a directory tree and refresh the catalog.
+ * :func:`find_files` - files of a variable overlapping a period.
+ * :func:`list_variables` - variables in the catalog.
+
+Times are stored as 'YYYY-MM-DD hh:mm:ss' strings built from the time
+vectors, which sort the same way as the dates in any calendar.
+
+"""
+
+import os
+import sqlite3
+import fnmatch
+import warnings
+
+import netCDF4
+import numpy as np
+import numpy.ma as ma
+
+import netcdf as nc
+
+schema = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    calendar TEXT,
+    time_units TEXT,
+    first_time TEXT,
+    last_time TEXT,
+    time_step REAL,
+    nt INTEGER,
+    nlat INTEGER,
+    nlon INTEGER
+);
+CREATE TABLE IF NOT EXISTS variables (
+    path TEXT,
+    name TEXT,
+    units TEXT,
+    dimensions TEXT,
+    shape TEXT,
+    dtype TEXT,
+    chunking TEXT,
+    zlib INTEGER,
+    complevel INTEGER,
+    shuffle INTEGER,
+    PRIMARY KEY (path, name)
+);
+CREATE INDEX IF NOT EXISTS variables_name ON variables (name);
+CREATE INDEX IF NOT EXISTS files_times ON files (first_time, last_time);
+"""
+
+
+def _time_string(time_vector):
+    # Sortable string of a (possibly partial) time vector.
+    warp = [int(x) for x in time_vector]
+    defaults = [0, 1, 1, 0, 0, 0]
+    warp = warp + defaults[len(warp):6]
+    return "%04d-%02d-%02d %02d:%02d:%02d" % tuple(warp[0:6])
+
+
+def _file_record(nc1):
+    # Time and grid metadata of an open NetCDF file.
+    record = {'calendar': None, 'time_units': None, 'first_time': None,
+              'last_time': None, 'time_step': None, 'nt': None,
+              'nlat': None, 'nlon': None}
+    if 'lat' in nc1.dimensions:
+        record['nlat'] = len(nc1.dimensions['lat'])
+    if 'lon' in nc1.dimensions:
+        record['nlon'] = len(nc1.dimensions['lon'])
+    if 'time' not in nc1.variables:
+        return record
+    time1 = nc1.variables['time']
+    record['nt'] = time1.shape[0]
+    record['calendar'] = nc._calendar_from_time_variable(time1)
+    record['time_units'] = getattr(time1, 'units', None)
+    if not time1.shape[0]:
+        return record
+    if 'time_vectors' in nc1.variables:
+        tvs = nc1.variables['time_vectors']
+        first_tv = tvs[0, :]
+        last_tv = tvs[-1, :]
+    else:
+        warp = netCDF4.num2date([time1[0], time1[-1]], time1.units,
+                                record['calendar'])
+        first_tv = warp[0].timetuple()[0:6]
+        last_tv = warp[1].timetuple()[0:6]
+    record['first_time'] = _time_string(ma.getdata(first_tv))
+    record['last_time'] = _time_string(ma.getdata(last_tv))
+    if time1.shape[0] > 1 and record['time_units'] is not None:
+        steps = np.unique(np.diff(time1[:]))
+        if steps.size == 1:
+            time_unit = nc.cf_decode_time_since(record['time_units'])[0]
+            seconds_per_unit = {'day': 86400.0, 'hour': 3600.0,
+                                'minute': 60.0, 'second': 1.0}
+            record['time_step'] = float(steps[0]) * seconds_per_unit[time_unit]
+    return record
+
+
+def _variable_records(nc1):
+    # Metadata of the data variables of an open NetCDF file (coordinates,
+    # bounds and time vectors are left out).
+    excludes = ['time_vectors']
+    for var_name in nc1.variables.keys():
+        var1 = nc1.variables[var_name]
+        if hasattr(var1, 'bounds'):
+            excludes.append(var1.bounds)
+    records = []
+    for var_name in nc1.variables.keys():
+        var1 = nc1.variables[var_name]
+        if var_name in excludes or var_name in var1.dimensions:
+            continue
+        if var_name in nc1.dimensions:
+            continue
+        try:
+            chunking = var1.chunking()
+        except Exception:
+            chunking = None
+        filters = var1.filters()
+        if filters is None:
+            filters = {}
+        if chunking is not None and chunking != 'contiguous':
+            chunking = ','.join([str(x) for x in chunking])
+        records.append({'name': var_name,
+                        'units': getattr(var1, 'units', None),
+                        'dimensions': ','.join(var1.dimensions),
+                        'shape': ','.join([str(x) for x in var1.shape]),
+                        'dtype': str(var1.dtype),
+                        'chunking': chunking,
+                        'zlib': int(bool(filters.get('zlib', False))),
+                        'complevel': int(filters.get('complevel', 0)),
+                        'shuffle': int(bool(filters.get('shuffle', False)))})
+    return records
+
+
+def build_catalog(root, catalog_file, pattern='*.nc'):
+    """Scan a directory tree and refresh the catalog.
+
+    Parameters
+    ----------
+    root : str
+        directory to scan recursively.
+    catalog_file : str
+        SQLite database, created if it does not exist.
+    pattern : str
+        file name pattern.
+
+    Returns
+    -------
+    out : dict
+        number of files 'added', 'updated', 'removed' and 'unchanged'.
+
+    Notes
+    -----
+    Only files that are new or whose modification time or size changed
+    are opened. Files under root that disappeared are removed from the
+    catalog. Unreadable files are skipped with a warning.
+
+    """
+
+    root = os.path.abspath(root)
+    counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    connection = sqlite3.connect(catalog_file)
+    try:
+        connection.executescript(schema)
+        known = {}
+        for path, mtime, size in connection.execute(
+                "SELECT path, mtime, size FROM files"):
+            known[path] = (mtime, size)
+        found = set()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(fnmatch.filter(filenames, pattern)):
+                path = os.path.join(dirpath, filename)
+                found.add(path)
+                warp = os.stat(path)
+                signature = (warp.st_mtime, warp.st_size)
+                if known.get(path) == signature:
+                    counts['unchanged'] += 1
+                    continue
+                try:
+                    nc1 = netCDF4.Dataset(path, 'r')
+                except (IOError, OSError, RuntimeError) as e:
+                    warnings.warn("Skipping %s: %s" % (path, e))
+                    continue
+                try:
+                    record = _file_record(nc1)
+                    variable_records = _variable_records(nc1)
+                finally:
+                    nc1.close()
+                if path in known:
+                    counts['updated'] += 1
+                else:
+                    counts['added'] += 1
+                record['path'] = path
+                record['mtime'] = signature[0]
+                record['size'] = signature[1]
+                connection.execute("DELETE FROM variables WHERE path = ?",
+                                   (path,))
+                connection.execute(
+                    "INSERT OR REPLACE INTO files VALUES (:path, :mtime, "
+                    ":size, :calendar, :time_units, :first_time, :last_time, "
+                    ":time_step, :nt, :nlat, :nlon)", record)
+                for variable_record in variable_records:
+                    variable_record['path'] = path
+                    connection.execute(
+                        "INSERT INTO variables VALUES (:path, :name, :units, "
+                        ":dimensions, :shape, :dtype, :chunking, :zlib, "
+                        ":complevel, :shuffle)", variable_record)
+        for path in known.keys():
+            if path.startswith(root + os.sep) and path not in found:
+                connection.execute("DELETE FROM files WHERE path = ?", (path,))
+                connection.execute("DELETE FROM variables WHERE path = ?",
+                                   (path,))
+                counts['removed'] += 1
+        connection.commit()
+    finally:
+        connection.close()
+    return counts
+
+
+def find_files(catalog_file, var_name, period=None):
+    """Files of a variable overlapping a period.
+
+    Parameters
+    ----------
+    catalog_file : str
+    var_name : str
+    period : timely Period or pair of time vectors, optional
+        e.g. ([1979, 1], [1979, 12, 31, 23]), missing elements are the
+        beginning of the year, cycle, etc. The bounds of a pair are
+        included, those of a Period follow its left_open and right_open.
+
+    Returns
+    -------
+    out : list of str
+        paths sorted by first time, e.g. for MultiFileVariable.
+
+    """
+
+    query = ("SELECT files.path FROM files JOIN variables "
+             "ON files.path = variables.path WHERE variables.name = ?")
+    arguments = [var_name]
+    if period is not None:
+        left_open = False
+        right_open = False
+        if hasattr(period, 'times'):
+            initial_time = ma.getdata(period.times[0, :])
+            final_time = ma.getdata(period.times[1, :])
+            left_open = bool(np.any(period.left_open))
+            right_open = bool(np.any(period.right_open))
+        else:
+            initial_time, final_time = period
+        query += " AND files.last_time %s ? AND files.first_time %s ?" % (
+            '>' if left_open else '>=', '<' if right_open else '<=')
+        arguments.extend([_time_string(initial_time),
+                          _time_string(final_time)])
+    query += " ORDER BY files.first_time, files.path"
+    connection = sqlite3.connect(catalog_file)
+    try:
+        return [row[0] for row in connection.execute(query, arguments)]
+    finally:
+        connection.close()
+
+
+def list_variables(catalog_file):
+    """Variables in the catalog.
+
+    Parameters
+    ----------
+    catalog_file : str
+
+    Returns
+    -------
+    out : list of tuple
+        (name, units, shape of the grid (nlat, nlon), number of files,
+        first time, last time), sorted by name.
+
+    """
+
+    query = ("SELECT variables.name, variables.units, files.nlat, files.nlon, "
+             "COUNT(*), MIN(files.first_time), MAX(files.last_time) "
+             "FROM variables JOIN files ON files.path = variables.path "
+             "GROUP BY variables.name, variables.units, files.nlat, "
+             "files.nlon ORDER BY variables.name")
+    connection = sqlite3.connect(catalog_file)
+    try:
+        return [(row[0], row[1], (row[2], row[3]), row[4], row[5], row[6])
+                for row in connection.execute(query)]
+    finally:
+        connection.close()
@@ -1,4 +1,9 @@
+import collections
 import datetime
+import json
+import multiprocessing
+import os
+import timeit
 
 import numpy as np
 import numpy.ma as ma
@@ -9,7 +14,9 @@ import gribou
 
 from cfsr_defaults import standard_names, variable_keys
 
-# Step 1: gribou.all_str_dump(grib_file) of a sample file.
+# Step 1: gribou.all_str_dump(grib_file) of a sample file, or
+# cfsr.inventory(grib_files) for the names and levels of all the variables,
+# then cfsr.conversion_specs to get the hourly_grib2_to_netcdf arguments.
 
 # Orography example :
 # cfsr.fixed_grib2_to_netcdf('flxf01.gdas.1979010100.grb2',
@@ -117,6 +124,102 @@ class CFSRVariable:
             return True
 
 
+class ConversionMetrics:
+    """Per-stage timing and throughput of a conversion."""
+
+    def __init__(self, callback=None, logger=None):
+        """Initialize ConversionMetrics.
+
+        Parameters
+        ----------
+        callback : function, optional
+            called with the summary dictionary at the end of a conversion.
+        logger : logging.Logger, optional
+            the summary is logged as JSON at the INFO level.
+
+        Notes
+        -----
+        Stages are timed back to back with switch(stage), so that the sum
+        of the stages is close to the wall time of the conversion.
+
+        """
+
+        self.callback = callback
+        self.logger = logger
+        self.timings = collections.OrderedDict()
+        self.messages = 0
+        self.bytes_read = 0
+        self.bytes_decoded = 0
+        self.bytes_written = 0
+        self.peak_buffer_bytes = 0
+        self.flushes = 0
+        self._stage = None
+        self._stage_start = None
+        self._start = timeit.default_timer()
+
+    def switch(self, stage):
+        """End the current stage and start another one (None to stop)."""
+
+        now = timeit.default_timer()
+        if self._stage is not None:
+            warp = self.timings.get(self._stage, 0.0)
+            self.timings[self._stage] = warp + now - self._stage_start
+        self._stage = stage
+        self._stage_start = now
+
+    def buffer(self, nbytes):
+        """Record the size of an in-memory buffer."""
+
+        self.peak_buffer_bytes = max(self.peak_buffer_bytes, nbytes)
+
+    def summary(self):
+        """Metrics as a dictionary.
+
+        Returns
+        -------
+        out : dictionary
+            wall_time and stages in seconds, messages, messages_per_second,
+            MB_read (GRIB messages), MB_decoded, MB_written (uncompressed
+            data given to the NetCDF library), peak_buffer_bytes and
+            flushes.
+
+        """
+
+        wall_time = timeit.default_timer() - self._start
+        d = collections.OrderedDict()
+        d['wall_time'] = wall_time
+        d['stages'] = collections.OrderedDict(self.timings)
+        d['stages']['other'] = wall_time - sum(self.timings.values())
+        d['messages'] = self.messages
+        if wall_time > 0:
+            d['messages_per_second'] = self.messages / wall_time
+        else:
+            d['messages_per_second'] = None
+        d['MB_read'] = self.bytes_read / 1e6
+        d['MB_decoded'] = self.bytes_decoded / 1e6
+        d['MB_written'] = self.bytes_written / 1e6
+        d['peak_buffer_bytes'] = self.peak_buffer_bytes
+        d['flushes'] = self.flushes
+        return d
+
+    def emit(self):
+        """Send the summary to the callback and the logger.
+
+        Returns
+        -------
+        out : dictionary
+
+        """
+
+        self.switch(None)
+        d = self.summary()
+        if self.callback is not None:
+            self.callback(d)
+        if self.logger is not None:
+            self.logger.info("%s", json.dumps(d))
+        return d
+
+
 def optimal_chunksizes(nt, nlat, nlon):
     """Optimal chunksizes for hourly data in a monthly file.
 
@@ -139,11 +242,77 @@ def optimal_chunksizes(nt, nlat, nlon):
 
     clon = np.sqrt(1000000.0 * nlon / (nlat * nt))
     clat = nlat * clon / nlon
-    return (nt, int(np.ceil(clat)), int(np.ceil(clon)))
+    return (nt, min(nlat, int(np.ceil(clat))), min(nlon, int(np.ceil(clon))))
+
+
+def _msg_level(msg_dict):
+    # Level of a message as in CFSRVariable, (level1, level2) with NaN for
+    # missing surfaces.
+    if msg_dict['unitsOfFirstFixedSurface'] == 'unknown':
+        return (np.nan, np.nan)
+    warp1 = msg_dict['scaleFactorOfFirstFixedSurface']
+    warp2 = msg_dict['scaledValueOfFirstFixedSurface']
+    level1 = warp2 / float(10 ** warp1)
+    if msg_dict['unitsOfSecondFixedSurface'] == 'unknown':
+        return (level1, np.nan)
+    warp1 = msg_dict['scaleFactorOfSecondFixedSurface']
+    warp2 = msg_dict['scaledValueOfSecondFixedSurface']
+    return (level1, warp2 / float(10 ** warp1))
+
+
+def msg_table(list_of_msg_dicts):
+    """Columnar metadata of the messages of a GRIB file.
+
+    Parameters
+    ----------
+    list_of_msg_dicts : list of dictionaries
+
+    Returns
+    -------
+    out1,out2 : list of string, numpy structured array
+        out1 is the list of variable names, out2 has one row per message
+        with fields 'name_id' (index in out1), 'level1' and 'level2' (NaN
+        if missing, see CFSRVariable.level), 'startStep', 'endStep' and
+        'reference_time' (as YYYYMMDDhhmm).
+
+    """
+
+    names = []
+    name_ids = {}
+    dtype = [('name_id', 'i4'), ('level1', 'f8'), ('level2', 'f8'),
+             ('startStep', 'i4'), ('endStep', 'i4'),
+             ('reference_time', 'i8')]
+    table = np.empty(len(list_of_msg_dicts), dtype=dtype)
+    for j, msg_dict in enumerate(list_of_msg_dicts):
+        name = msg_dict['name']
+        if name not in name_ids:
+            name_ids[name] = len(names)
+            names.append(name)
+        warp = (((msg_dict['year'] * 100 + msg_dict['month']) * 100 +
+                 msg_dict['day']) * 100 + msg_dict['hour']) * 100
+        table[j] = ((name_ids[name],) + _msg_level(msg_dict) +
+                    (msg_dict['startStep'], msg_dict['endStep'],
+                     warp + msg_dict.get('minute', 0)))
+    return names, table
+
+
+def _select_var(names, table, grib_var_name, grib_level):
+    # Message ids of a variable at a level in a msg_table.
+    if grib_var_name not in names:
+        return np.array([], dtype=int)
+    warp = table['name_id'] == names.index(grib_var_name)
+    if grib_level is None:
+        warp &= np.isnan(table['level1'])
+    elif isinstance(grib_level, (tuple, list)):
+        warp &= ((table['level1'] == grib_level[0]) &
+                 (table['level2'] == grib_level[1]))
+    else:
+        warp &= (table['level1'] == grib_level) & np.isnan(table['level2'])
+    return np.nonzero(warp)[0]
 
 
 def filter_var_timesteps(list_of_msg_dicts, grib_var_name, grib_level,
-                         include_analysis=True):
+                         include_analysis=True, table=None):
     """Find message ids that will create a timeserie for a given variable.
 
     Parameters
@@ -152,6 +321,9 @@ def filter_var_timesteps(list_of_msg_dicts, grib_var_name, grib_level,
     grib_var_name : string
     grib_level : float
     include_analysis : bool
+    table : tuple, optional
+        the output of msg_table(list_of_msg_dicts), to reuse it when
+        selecting several variables from the same file.
 
     Returns
     -------
@@ -159,83 +331,306 @@ def filter_var_timesteps(list_of_msg_dicts, grib_var_name, grib_level,
         out1 is the list of message ids that create the timeseries,
         out2 is whether or not the 6hr timestep is skipped.
 
+    Notes
+    -----
+    Two consecutive 0-0 messages are the analysis and the 3 minutes
+    spin-up, the analysis is kept (if include_analysis) and the 6h
+    forecasts are then skipped. A single 0-0 message followed by a 1-1
+    message is kept as the first step of a 0,1,2,3,4,5 timeseries.
+
     """
 
-    list_of_i = []
-    analysis = 'unknown'
-    skip_6 = False
-    for j, msg_dict in enumerate(list_of_msg_dicts):
-        cfsr_var = CFSRVariable(msg_dict)
-        if cfsr_var.name != grib_var_name:
-            continue
-        if cfsr_var.level != grib_level:
+    if table is None:
+        table = msg_table(list_of_msg_dicts)
+    names, table = table
+    ids = _select_var(names, table, grib_var_name, grib_level)
+    if not ids.size:
+        return [], False
+    start_step = table['startStep'][ids]
+    end_step = table['endStep'][ids]
+    zero = (start_step == 0) & (end_step == 0)
+    # Position of each 0-0 message in its run of consecutive 0-0 messages,
+    # even positions are analysis candidates, odd ones their spin-up.
+    k = np.arange(ids.size)
+    warp = zero & ~np.concatenate([[False], zero[:-1]])
+    position = k - np.maximum.accumulate(np.where(warp, k, 0))
+    spinup = zero & (position % 2 == 1)
+    candidate = zero & (position % 2 == 0)
+    after_candidate = np.concatenate([[False], candidate[:-1]])
+    one = (start_step == 1) & (end_step == 1)
+    if include_analysis:
+        analysis = spinup | (one & after_candidate)
+        skip_6 = np.cumsum(spinup) > 0
+    else:
+        analysis = one & after_candidate
+        skip_6 = np.zeros(ids.size, dtype=bool)
+    six = (start_step == 6) & (end_step == 6)
+    forecast = (six & ~skip_6) | (~six & ~zero)
+    # The analysis (previous message) comes before the message itself
+    keys = np.concatenate([2 * k[analysis], 2 * k[forecast] + 1])
+    warp = np.concatenate([ids[analysis] - 1, ids[forecast]])
+    list_of_i = [int(x) for x in warp[np.argsort(keys)]]
+    return list_of_i, bool(skip_6[-1])
+
+
+InventoryRow = collections.namedtuple(
+    'InventoryRow', ['name', 'level_type', 'level', 'step_type', 'units',
+                     'messages', 'timesteps', 'reference_time'])
+"""Variable at a level in a GRIB file, see inventory."""
+
+
+def _table_level(level1, level2):
+    # Level as in CFSRVariable.level from the msg_table fields.
+    if np.isnan(level1):
+        return None
+    if np.isnan(level2):
+        return float(level1)
+    return (float(level1), float(level2))
+
+
+def _inventory_file(grib_file):
+    # Inventory of one GRIB file, rows in order of first appearance.
+    list_of_msg_dicts = gribou.get_all_msg_dict(grib_file)
+    names, table = msg_table(list_of_msg_dicts)
+    rows = []
+    found = set()
+    for j in range(table.size):
+        warp = table[j]
+        name = names[warp['name_id']]
+        level = _table_level(warp['level1'], warp['level2'])
+        if (name, level) in found:
             continue
-        if (msg_dict['startStep'] == 0) and (msg_dict['endStep'] == 0):
-            # assume this is the analysis, expect another instance afterward
-            if analysis == 'unknown':
-                analysis = 'candidate'
-            elif analysis == 'candidate':
-                # all is well, we have the 3min spinup afterward, which we
-                # ignore. Reset analysis to unknown.
-                if include_analysis:
-                    list_of_i.append(j - 1)
-                    skip_6 = True
-                analysis = 'unknown'
-        elif (msg_dict['startStep'] == 1) and (msg_dict['endStep'] == 1):
-            if analysis == 'candidate':
-                # We are in a typical 0,1,2,3,4,5 timeseries, add the analysis
-                list_of_i.append(j - 1)
-                analysis = 'unknown'
-        elif analysis == 'candidate':
-            # the candidate is not the analysis, reset analysis
-            analysis = 'unknown'
-        if (msg_dict['startStep'] == 6) and (msg_dict['endStep'] == 6):
-            if not skip_6:
-                list_of_i.append(j)
-        elif (msg_dict['startStep'] != 0) or (msg_dict['endStep'] != 0):
-            list_of_i.append(j)
-    return list_of_i, skip_6
+        found.add((name, level))
+        ids = _select_var(names, table, name, level)
+        list_of_i, skip_6 = filter_var_timesteps(list_of_msg_dicts, name,
+                                                 level, table=(names, table))
+        msg_dict = list_of_msg_dicts[j]
+        rows.append(InventoryRow(name, msg_dict['typeOfLevel'], level,
+                                 msg_dict['stepType'],
+                                 msg_dict['units'].replace('**', ''),
+                                 ids.size, len(list_of_i),
+                                 int(table['reference_time'][ids].min())))
+    return rows
 
 
-def hourly_grib2_to_netcdf(grib_file, grib_source, nc_file, nc_var_name,
-                           grib_var_name, grib_level, cache_size=100,
-                           initial_year=1979, overwrite_nc_units=None,
-                           include_analysis=True,
-                           nc_format='NETCDF4'):
-    """Convert hourly data from GRIB file containing one month to NetCDF.
+def inventory(grib_files, processes=None, map_function=None):
+    """Inventory of the variables and levels in GRIB files.
 
     Parameters
     ----------
-    grib_file : string
-    grib_source : string
-        The two most common sources are 'rda' and 'nomads'.
-    nc_file : string
-    nc_var_name : string
-    grib_var_name : string
-    grib_level : float
-    cache_size : int, optional
-    initial_year : int, optional
-    overwrite_nc_units : string, optional
-    include_analysis : bool, optional
-    nc_format : string, optional
+    grib_files : list of string
+    processes : int, optional
+        size of the multiprocessing pool, defaults to the number of CPUs.
+    map_function : function(function, iterable), optional
+        parallel map (e.g. an ipyparallel view map_sync), replaces the
+        multiprocessing pool.
+
+    Returns
+    -------
+    out : dict
+        list of InventoryRow for each GRIB file, with the name and level to
+        use as grib_var_name and grib_level, the level type, stepType,
+        units, number of messages, number of timesteps of the converted
+        timeseries (see filter_var_timesteps), and first reference time
+        (YYYYMMDDhhmm).
+
+    """
+
+    if map_function is None:
+        pool = multiprocessing.Pool(processes)
+        try:
+            warp = pool.map(_inventory_file, grib_files)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        warp = list(map_function(_inventory_file, grib_files))
+    return dict(zip(grib_files, warp))
+
+
+def conversion_specs(grib_inventory, nc_var_names, path_output='',
+                     nc_file_pattern=None, grib_source='rda'):
+    """Conversion arguments of hourly_grib2_to_netcdf from an inventory.
+
+    Parameters
+    ----------
+    grib_inventory : dict
+        output of inventory.
+    nc_var_names : dict
+        maps grib_var_name, or (grib_var_name, grib_level), to the NetCDF
+        variable name or to a (nc_var_name, nc_units) tuple. Variables
+        not in nc_var_names are not converted.
+    path_output : string, optional
+    nc_file_pattern : string, optional
+        format string of the NetCDF file names, with the nc_var_name,
+        year and month (of the first reference time) fields, defaults to
+        '{nc_var_name}_1hr_cfsr_reanalysis_{year}{month:02d}.nc'.
+    grib_source : string, optional
+
+    Returns
+    -------
+    out : list of dictionaries
+        keyword arguments of hourly_grib2_to_netcdf, sorted by GRIB file.
 
     Notes
     -----
-    Currently only implemented for 2d fields.
+    Fields with a single timestep (e.g. orography) are left out, they are
+    converted with fixed_grib2_to_netcdf.
 
     """
 
-    list_of_msg_dicts = gribou.get_all_msg_dict(grib_file)
-    list_of_i, analysis_present = filter_var_timesteps(list_of_msg_dicts,
-                                                       grib_var_name,
-                                                       grib_level,
-                                                       include_analysis)
-    cfsr_var = CFSRVariable(list_of_msg_dicts[list_of_i[0]])
-    lats, lons = gribou.get_latlons(grib_file, list_of_i[0] + 1)
+    if nc_file_pattern is None:
+        nc_file_pattern = ("{nc_var_name}_1hr_cfsr_reanalysis_"
+                           "{year}{month:02d}.nc")
+    specs = []
+    for grib_file in sorted(grib_inventory.keys()):
+        for row in grib_inventory[grib_file]:
+            if row.timesteps < 2:
+                continue
+            if (row.name, row.level) in nc_var_names:
+                warp = nc_var_names[(row.name, row.level)]
+            elif row.name in nc_var_names:
+                warp = nc_var_names[row.name]
+            else:
+                continue
+            if isinstance(warp, tuple):
+                nc_var_name, nc_units = warp
+            else:
+                nc_var_name, nc_units = warp, None
+            year = row.reference_time // 100000000
+            month = row.reference_time // 1000000 % 100
+            nc_file = nc_file_pattern.format(nc_var_name=nc_var_name,
+                                             year=year, month=month)
+            specs.append({'grib_file': grib_file, 'grib_source': grib_source,
+                          'nc_file': os.path.join(path_output, nc_file),
+                          'nc_var_name': nc_var_name,
+                          'grib_var_name': row.name,
+                          'grib_level': row.level,
+                          'overwrite_nc_units': nc_units})
+    return specs
 
-    now = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-    nc1 = netCDF4.Dataset(nc_file, 'w', format=nc_format)
 
+def _grid_rows(msg_dict, latitude_order):
+    # Order in which the rows of a GRIB field are written. Rows are scanned
+    # north to south unless jScansPositively is set, they are written with
+    # ascending latitudes unless latitude_order is 'native'.
+    if latitude_order == 'native':
+        return slice(None, None, None)
+    if latitude_order != 'ascending':
+        raise NotImplementedError("Latitude order: %s" % (latitude_order,))
+    if msg_dict.get('jScansPositively', 0):
+        return slice(None, None, None)
+    return slice(None, None, -1)
+
+
+daily_statistics = {'mean': 'mean', 'min': 'minimum', 'max': 'maximum',
+                    'sum': 'sum'}
+"""Daily statistics of hourly_grib2_to_netcdf, with their cell methods."""
+
+
+class _DailyStatistics:
+    """Running daily statistics of the converted time steps.
+
+    Each day is written to the daily files when the first time step of the
+    next day is added (or on flush), so the hourly data is never read back.
+
+    """
+
+    def __init__(self, daily_variables, shape, rows):
+        """Initialize the running statistics.
+
+        Parameters
+        ----------
+        daily_variables : dict
+            daily NetCDF variable for each statistic.
+        shape : tuple of int
+            shape of one time step.
+        rows : slice
+            order in which the rows are written (see _grid_rows).
+
+        """
+
+        self.daily_variables = daily_variables
+        self.rows = rows
+        self.day = None
+        self.t = 0
+        self.total = np.zeros(shape)
+        self.count = np.zeros(shape, dtype='int64')
+        self.minimum = np.empty(shape)
+        self.maximum = np.empty(shape)
+
+    def add(self, time_vector, data):
+        """Add a time step to the statistics of its day."""
+
+        day = tuple([int(x) for x in time_vector[0:3]])
+        if day != self.day:
+            self.flush()
+            self.day = day
+            self.total.fill(0)
+            self.count.fill(0)
+            self.minimum.fill(np.inf)
+            self.maximum.fill(-np.inf)
+        valid = ~ma.getmaskarray(data)
+        values = ma.getdata(data)
+        self.count += valid
+        self.total += np.where(valid, values, 0)
+        np.minimum(self.minimum, np.where(valid, values, np.inf),
+                   out=self.minimum)
+        np.maximum(self.maximum, np.where(valid, values, -np.inf),
+                   out=self.maximum)
+
+    def flush(self):
+        """Write the current day to the daily files."""
+
+        if self.day is None:
+            return
+        date1 = datetime.datetime(*self.day)
+        date2 = date1 + datetime.timedelta(days=1)
+        mask = self.count == 0
+        values = {'sum': self.total, 'min': self.minimum,
+                  'max': self.maximum,
+                  'mean': self.total / np.maximum(self.count, 1)}
+        for statistic, var1 in self.daily_variables.items():
+            nc1 = var1.group()
+            time = nc1.variables['time']
+            num1 = netCDF4.date2num([date1, date2], time.units, time.calendar)
+            time[self.t] = num1[0]
+            nc1.variables['time_bnds'][self.t, :] = num1
+            nc1.variables['time_vectors'][self.t, :] = list(self.day) + [0] * 3
+            warp = ma.array(values[statistic], mask=mask)
+            var1[self.t, :, :] = warp[self.rows, :]
+        self.t += 1
+        self.day = None
+
+
+def _window_ends(list_of_msg_dicts, list_of_i):
+    # Last message of each forecast window (e.g. 0-6h) of running extremes,
+    # a window ends when the next message does not extend it.
+    warp = [list_of_msg_dicts[i] for i in list_of_i]
+    start_step = np.array([msg_dict['startStep'] for msg_dict in warp])
+    end_step = np.array([msg_dict['endStep'] for msg_dict in warp])
+    warp = ((start_step[1:] != start_step[:-1]) |
+            (end_step[1:] <= end_step[:-1]))
+    warp = np.concatenate([warp, [True]])
+    return [i for i, flag in zip(list_of_i, warp) if flag]
+
+
+def _packing_precision(msg_dict):
+    # Quantization step of the packed values of a GRIB message (each message
+    # has its own reference value), decoded values are within this step of
+    # the original field.
+    if 'binaryScaleFactor' not in msg_dict:
+        return 0.0
+    warp = 10.0 ** msg_dict.get('decimalScaleFactor', 0)
+    return 2.0 ** msg_dict['binaryScaleFactor'] / warp
+
+
+def _hourly_nc_header(nc1, nc_var_name, cfsr_var, lats, lons, grib_source,
+                      analysis_present, initial_year, overwrite_nc_units,
+                      chunksizes, rows):
+    # Global attributes, dimensions and variables of the files written by
+    # hourly_grib2_to_netcdf, returns the data variable.
+    now = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
     nc1.Conventions = 'CF-1.5'
     nc1.title = 'Climate System Forecast Reanalysis'
     nc1.history = "%s: Convert from grib2 to NetCDF" % (now,)
@@ -270,8 +665,7 @@ def hourly_grib2_to_netcdf(grib_file, grib_source, nc_file, nc_var_name,
     time.standard_name = 'time'
     time.calendar = 'gregorian'
 
-    time_vectors = nc1.createVariable('time_vectors', 'i2', ('time', 'timecomp'),
-                                      zlib=True)
+    nc1.createVariable('time_vectors', 'i2', ('time', 'timecomp'), zlib=True)
 
     vtype = cfsr_var.vertical_type
     if vtype in ['depthBelowSea', 'heightAboveGround']:
@@ -305,7 +699,7 @@ def hourly_grib2_to_netcdf(grib_file, grib_source, nc_file, nc_var_name,
     lat.units = 'degrees_north'
     lat.long_name = 'latitude'
     lat.standard_name = 'latitude'
-    lat[:] = lats[::-1, 0]
+    lat[:] = lats[rows, 0]
 
     lon = nc1.createVariable('lon', 'f4', ('lon'), zlib=True)
     lon.axis = 'X'
@@ -314,9 +708,8 @@ def hourly_grib2_to_netcdf(grib_file, grib_source, nc_file, nc_var_name,
     lon.standard_name = 'longitude'
     lon[:] = lons[0, :]
 
-    warp = optimal_chunksizes(len(list_of_i), lat.size, lon.size)
     var1 = nc1.createVariable(nc_var_name, 'f4', ('time', 'lat', 'lon'), zlib=True,
-                              fill_value=deff4, chunksizes=warp)
+                              fill_value=deff4, chunksizes=chunksizes)
     if overwrite_nc_units is None:
         var1.units = cfsr_var.units
     else:
@@ -324,20 +717,188 @@ def hourly_grib2_to_netcdf(grib_file, grib_source, nc_file, nc_var_name,
     var1.long_name = cfsr_var.name
     var1.standard_name = standard_names[nc_var_name]
     var1.statistic = cfsr_var.statistic
+    return var1
+
+
+def hourly_grib2_to_netcdf(grib_file, grib_source, nc_file, nc_var_name,
+                           grib_var_name, grib_level, cache_size=100,
+                           initial_year=1979, overwrite_nc_units=None,
+                           include_analysis=True,
+                           nc_format='NETCDF4', time_slice=None,
+                           chunksizes=None, output_format='netcdf',
+                           metrics=None, metrics_attribute=False,
+                           daily=None, write_hourly=True, extremes=None,
+                           latitude_order='ascending'):
+    """Convert hourly data from GRIB file containing one month to NetCDF.
+
+    Parameters
+    ----------
+    grib_file : string
+    grib_source : string
+        The two most common sources are 'rda' and 'nomads'.
+    nc_file : string
+    nc_var_name : string
+    grib_var_name : string
+    grib_level : float
+    cache_size : int, optional
+    initial_year : int, optional
+    overwrite_nc_units : string, optional
+    include_analysis : bool, optional
+    nc_format : string, optional
+    time_slice : slice, optional
+        convert only these time steps of the month (see
+        hourly_grib2_to_netcdf_parallel).
+    chunksizes : tuple of int, optional
+        defaults to optimal_chunksizes.
+    output_format : string, optional
+        'netcdf', or 'raw' for an uncompressed netcdf.RawDataset (a .json
+        sidecar and .npy files next to nc_file), which can be converted
+        later with netcdf.raw_to_netcdf.
+    metrics : ConversionMetrics, optional
+        per-stage timing and throughput, emitted at the end.
+    metrics_attribute : bool, optional
+        store the metrics in the 'conversion_metrics' global attribute.
+    daily : dict, optional
+        daily NetCDF file for each statistic (see daily_statistics), e.g.
+        {'max': 'tasmax_day_cfsr_reanalysis_197901.nc'}.
+    write_hourly : bool, optional
+        set to False to only write the daily files.
+    extremes : string, optional
+        for 'min' and 'max' variables, which hold running extremes since
+        the start of each forecast window: 'window' keeps the last step of
+        each window (the extreme over the whole window, e.g. 6h), 'hourly'
+        recovers the extremes of each hour.
+    latitude_order : string, optional
+        'ascending' (south to north), or 'native' to keep the order of the
+        GRIB grid (see jScansPositively).
+
+    Notes
+    -----
+    Currently only implemented for 2d fields.
+
+    Daily statistics are accumulated while converting, on the days of the
+    time vectors of the hourly time steps (as netcdf.nc_resample with
+    DeltaT([0, 0, 1]) on the hourly file, including a partial last day),
+    masked values are ignored.
+
+    Fields are kept in the GRIB scanning order while converting, the rows
+    are reordered (if needed) when each block of time steps is written, so
+    there is no copy of each decoded message.
+
+    Hourly extremes are exact (up to the packing precision) for the first
+    hour of each window and for the hours where the running extreme changed
+    by more than the packing precision of the two messages, elsewhere the
+    hourly extreme is not known (only bounded by the running extreme) and
+    is masked.
+
+    """
+
+    if metrics is None:
+        metrics = ConversionMetrics()
+    if daily is None:
+        daily = {}
+    for statistic in daily.keys():
+        if statistic not in daily_statistics:
+            raise NotImplementedError("Statistic: %s" % (statistic,))
+    if daily and time_slice is not None:
+        raise NotImplementedError("Daily statistics need the whole month.")
+    if extremes not in [None, 'window', 'hourly']:
+        raise NotImplementedError("Extremes: %s" % (extremes,))
+    metrics.switch('metadata')
+    list_of_msg_dicts = gribou.get_all_msg_dict(grib_file)
+    list_of_i, analysis_present = filter_var_timesteps(list_of_msg_dicts,
+                                                       grib_var_name,
+                                                       grib_level,
+                                                       include_analysis)
+    if extremes == 'window':
+        list_of_i = _window_ends(list_of_msg_dicts, list_of_i)
+    if time_slice is not None:
+        start = time_slice.indices(len(list_of_i))[0]
+        if start > 0:
+            # Averages and accumulations are relative to the previous step
+            previous_i = list_of_i[start - 1]
+            previous_data = gribou.get_msg_data(grib_file, previous_i + 1)
+        list_of_i = list_of_i[time_slice]
+    cfsr_var = CFSRVariable(list_of_msg_dicts[list_of_i[0]])
+    if extremes is not None and cfsr_var.statistic not in ['min', 'max']:
+        msg = "Extremes of a '%s' variable." % (cfsr_var.statistic,)
+        raise NotImplementedError(msg)
+    rows = _grid_rows(list_of_msg_dicts[list_of_i[0]], latitude_order)
+    lats, lons = gribou.get_latlons(grib_file, list_of_i[0] + 1)
+
+    metrics.switch('writing')
+    for warp in [nc_file] + list(daily.values()):
+        nc.dataset_pool.invalidate(warp)
+    if not write_hourly:
+        # Only the structure of the hourly file is kept, in memory
+        nc1 = netCDF4.Dataset(nc_file, 'w', format=nc_format, diskless=True,
+                              persist=False)
+    elif output_format == 'raw':
+        nc1 = nc.RawDataset(nc_file, 'w',
+                            unlimited_sizes={'time': len(list_of_i)})
+    elif output_format == 'netcdf':
+        nc1 = netCDF4.Dataset(nc_file, 'w', format=nc_format)
+    else:
+        raise NotImplementedError("Unknown output format: %s" % output_format)
+
+    if chunksizes is None:
+        chunksizes = optimal_chunksizes(len(list_of_i), lats.shape[0],
+                                        lats.shape[1])
+    var1 = _hourly_nc_header(nc1, nc_var_name, cfsr_var, lats, lons,
+                             grib_source, analysis_present, initial_year,
+                             overwrite_nc_units, chunksizes, rows)
+    time = nc1.variables['time']
+    time_vectors = nc1.variables['time_vectors']
+    if extremes is not None:
+        if extremes == 'window':
+            warp = list_of_msg_dicts[list_of_i[0]]
+            hours = warp['endStep'] - warp['startStep']
+        else:
+            hours = 1
+        warp = {'min': 'minimum', 'max': 'maximum'}[cfsr_var.statistic]
+        var1.cell_methods = "time: %s (interval: %d hour%s)" % (
+            warp, hours, 's' if hours > 1 else '')
+    daily_variables = {}
+    for statistic in sorted(daily.keys()):
+        nc2 = netCDF4.Dataset(daily[statistic], 'w', format=nc_format)
+        warp = optimal_chunksizes(len(list_of_i) // 24 + 2, lats.shape[0],
+                                  lats.shape[1])
+        var2 = _hourly_nc_header(nc2, nc_var_name, cfsr_var, lats, lons,
+                                 grib_source, analysis_present, initial_year,
+                                 overwrite_nc_units, warp, rows)
+        var2.cell_methods = "time: %s" % (daily_statistics[statistic],)
+        if 'nv' not in nc2.dimensions:
+            nc2.createDimension('nv', 2)
+        time2 = nc2.variables['time']
+        time2.bounds = 'time_bnds'
+        nc2.createVariable('time_bnds', time2.dtype, ('time', 'nv'),
+                           zlib=True)
+        daily_variables[statistic] = var2
+    daily_accumulator = _DailyStatistics(daily_variables, lats.shape, rows)
 
     t = 0  # counter for the NetCDF file
     c = 0  # counter for our temporary array
     temporary_array = ma.zeros([cache_size, var1.shape[1], var1.shape[2]])
     temporary_tvs = np.zeros([cache_size, 6])
+    # data and mask of the temporary array
+    warp = temporary_array.nbytes + temporary_array.size
+    metrics.buffer(warp + temporary_tvs.nbytes)
     flag_runtimeerror = False
+    metrics.switch('reading')
+    selected = set(list_of_i)
     for i, grb_msg in enumerate(gribou.msg_iterator(grib_file)):
-        if i not in list_of_i:
+        if i not in selected:
             continue
+        metrics.switch('decoding')
         try:
-            data = grb_msg['values'][::-1, :]
+            data = grb_msg['values']
         except RuntimeError:
             data = ma.masked_all([var1.shape[1], var1.shape[2]])
             flag_runtimeerror = True
+        metrics.messages += 1
+        metrics.bytes_read += list_of_msg_dicts[i].get('totalLength', 0)
+        metrics.bytes_decoded += data.nbytes
+        metrics.switch('deaccumulation')
         dt = list_of_msg_dicts[i]['endStep'] - list_of_msg_dicts[i]['startStep']
         if cfsr_var.statistic == 'avg':
             if dt == 1:
@@ -354,8 +915,22 @@ def hourly_grib2_to_netcdf(grib_file, grib_source, nc_file, nc_var_name,
                 if list_of_msg_dicts[i]['startStep'] != 0:
                     raise NotImplementedError("Weird delta t?")
                 temporary_array[c, :, :] = (data - previous_data) / 3600.0
+        elif extremes == 'hourly' and dt > 1:
+            if list_of_msg_dicts[i]['startStep'] != 0:
+                raise NotImplementedError("Weird delta t?")
+            # Running extreme since the start of the window, the extreme of
+            # the last hour is only known where it changed. An unchanged
+            # extreme can still differ by the packing precision.
+            warp = (_packing_precision(list_of_msg_dicts[i]) +
+                    _packing_precision(list_of_msg_dicts[previous_i]))
+            if cfsr_var.statistic == 'min':
+                warp = data < previous_data - warp
+            else:
+                warp = data > previous_data + warp
+            temporary_array[c, :, :] = ma.masked_where(~warp, data)
         else:
             temporary_array[c, :, :] = data
+        metrics.switch('time_vectors')
         temporary_tvs[c, 0] = list_of_msg_dicts[i]['year']
         temporary_tvs[c, 1] = list_of_msg_dicts[i]['month']
         temporary_tvs[c, 2] = list_of_msg_dicts[i]['day']
@@ -376,22 +951,49 @@ def hourly_grib2_to_netcdf(grib_file, grib_source, nc_file, nc_var_name,
                 temporary_tvs[c, 2] = temporary_tvs[c, 2] + 1
         temporary_tvs[c, 4] = 0
         temporary_tvs[c, 5] = 0
+        if daily:
+            metrics.switch('daily')
+            if nc_var_name == 'clt':
+                warp = temporary_array[c, :, :] / 100.0
+            else:
+                warp = temporary_array[c, :, :]
+            daily_accumulator.add(temporary_tvs[c, :], warp)
         c += 1
         if c == cache_size:
+            metrics.switch('writing')
             c = 0
-            if nc_var_name == 'clt':
-                var1[t:t + cache_size, :, :] = temporary_array / 100.0
-            else:
-                var1[t:t + cache_size, :, :] = temporary_array
+            if write_hourly:
+                if nc_var_name == 'clt':
+                    warp = temporary_array[:, rows, :] / 100.0
+                    var1[t:t + cache_size, :, :] = warp
+                else:
+                    var1[t:t + cache_size, :, :] = temporary_array[:, rows, :]
+                metrics.flushes += 1
+                warp = temporary_array.size * var1.dtype.itemsize
+                metrics.bytes_written += warp
             time_vectors[t:t + cache_size, :] = temporary_tvs
             t += cache_size
         previous_data = data
-    if nc_var_name == 'clt':
-        var1[t:t + c, :, :] = temporary_array[0:c, :, :] / 100.0
-    else:
-        var1[t:t + c, :, :] = temporary_array[0:c, :, :]
+        previous_i = i
+        metrics.switch('reading')
+    metrics.switch('writing')
+    if write_hourly:
+        if nc_var_name == 'clt':
+            var1[t:t + c, :, :] = temporary_array[0:c, rows, :] / 100.0
+        else:
+            var1[t:t + c, :, :] = temporary_array[0:c, rows, :]
+        metrics.flushes += 1
+        warp = c * var1.shape[1] * var1.shape[2]
+        metrics.bytes_written += warp * var1.dtype.itemsize
     time_vectors[t:t + c, :] = temporary_tvs[0:c, :]
+    if daily:
+        metrics.switch('daily')
+        daily_accumulator.flush()
+        for var2 in daily_variables.values():
+            metrics.bytes_written += var2.size * var2.dtype.itemsize
+            var2.group().close()
 
+    metrics.switch('time_vectors')
     datetimes, masked, valid = nc._time_vectors_to_datetimes(time_vectors[:, :])
     num1 = netCDF4.date2num(datetimes, time.units, time.calendar)
     if time.dtype in [np.int8, np.int16, np.int32, np.int64]:
@@ -402,12 +1004,115 @@ def hourly_grib2_to_netcdf(grib_file, grib_source, nc_file, nc_var_name,
 
     if flag_runtimeerror:
         nc1.warnings = "RuntimeError encountered, missing values inserted."
+    # Chunks still in the cache are compressed here
+    metrics.switch('writing')
+    nc1.sync()
+    if metrics_attribute:
+        metrics.switch(None)
+        nc1.conversion_metrics = json.dumps(metrics.summary())
+        metrics.switch('writing')
     nc1.close()
+    metrics.emit()
+
+
+def _hourly_grib2_to_netcdf_part(arguments):
+    # Single argument wrapper for map functions.
+    args, kwargs = arguments
+    hourly_grib2_to_netcdf(*args, **kwargs)
+    return args[2]
+
+
+def hourly_grib2_to_netcdf_parallel(grib_file, grib_source, nc_file,
+                                    nc_var_name, grib_var_name, grib_level,
+                                    nparts=4, map_function=None,
+                                    cache_size=100, initial_year=1979,
+                                    overwrite_nc_units=None,
+                                    include_analysis=True,
+                                    nc_format='NETCDF4', extremes=None,
+                                    latitude_order='ascending'):
+    """Convert one month of hourly data using multiple processes.
+
+    Parameters
+    ----------
+    grib_file : string
+    grib_source : string
+    nc_file : string
+    nc_var_name : string
+    grib_var_name : string
+    grib_level : float
+    nparts : int, optional
+        number of time ranges converted (and compressed) in parallel.
+    map_function : function, optional
+        map(function, list) used to convert the parts, e.g. the map_sync
+        of an ipyparallel view, defaults to a multiprocessing Pool.
+    cache_size : int, optional
+    initial_year : int, optional
+    overwrite_nc_units : string, optional
+    include_analysis : bool, optional
+    nc_format : string, optional
+    extremes : string, optional
+        see hourly_grib2_to_netcdf.
+    latitude_order : string, optional
+        see hourly_grib2_to_netcdf.
+
+    Notes
+    -----
+    Each part is a temporary file (nc_file.partNNN) holding a disjoint
+    range of time steps, which are then stitched together with
+    netcdf.nc_stitch_time_parts. Parts are chunked with whole time ranges
+    so that, with h5py, the compressed chunks are copied as they are.
+
+    """
+
+    list_of_msg_dicts = gribou.get_all_msg_dict(grib_file)
+    list_of_i, analysis_present = filter_var_timesteps(list_of_msg_dicts,
+                                                       grib_var_name,
+                                                       grib_level,
+                                                       include_analysis)
+    if extremes == 'window':
+        list_of_i = _window_ends(list_of_msg_dicts, list_of_i)
+    lats, lons = gribou.get_latlons(grib_file, list_of_i[0] + 1)
+    nt = len(list_of_i)
+    part_length = int(np.ceil(nt / float(nparts)))
+    chunksizes = optimal_chunksizes(part_length, lats.shape[0], lats.shape[1])
+    list_of_arguments = []
+    part_files = []
+    for k, t in enumerate(range(0, nt, part_length)):
+        part_file = "%s.part%03d" % (nc_file, k)
+        part_files.append(part_file)
+        args = (grib_file, grib_source, part_file, nc_var_name, grib_var_name,
+                grib_level)
+        kwargs = {'cache_size': cache_size, 'initial_year': initial_year,
+                  'overwrite_nc_units': overwrite_nc_units,
+                  'include_analysis': include_analysis,
+                  'nc_format': nc_format,
+                  'time_slice': slice(t, t + part_length),
+                  'chunksizes': chunksizes, 'extremes': extremes,
+                  'latitude_order': latitude_order}
+        list_of_arguments.append((args, kwargs))
+    try:
+        if map_function is None:
+            pool = multiprocessing.Pool(len(list_of_arguments))
+            try:
+                pool.map(_hourly_grib2_to_netcdf_part, list_of_arguments)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            list(map_function(_hourly_grib2_to_netcdf_part,
+                              list_of_arguments))
+        nc.nc_stitch_time_parts(part_files, nc_file, nc_format)
+    finally:
+        for part_file in part_files:
+            if os.path.isfile(part_file):
+                os.remove(part_file)
 
 
 def fixed_grib2_to_netcdf(grib_file, nc_file, nc_var_name, msg_id=None,
                           grib_var_name=None, grib_level=None,
-                          overwrite_nc_units=None, nc_format='NETCDF4'):
+                          overwrite_nc_units=None, nc_format='NETCDF4',
+                          metrics=None, metrics_attribute=False,
+                          latitude_order='ascending'):
     """Convert a single spatial field from a GRIB file to NetCDF.
 
     Parameters
@@ -420,32 +1125,34 @@ def fixed_grib2_to_netcdf(grib_file, nc_file, nc_var_name, msg_id=None,
     grib_level : float, optional
     overwrite_nc_units : string, optional
     nc_format : string, optional
+    metrics : ConversionMetrics, optional
+        per-stage timing and throughput, emitted at the end.
+    metrics_attribute : bool, optional
+        store the metrics in the 'conversion_metrics' global attribute.
+    latitude_order : string, optional
+        see hourly_grib2_to_netcdf.
 
     Notes
     -----
-    Currently only implemented for 2d fields.
+    Currently only implemented for 2d fields. See
+    fixed_grib2_to_netcdf_batch to convert several fields of a file.
 
     """
 
-    if msg_id is not None:
-        i = msg_id - 1
-    else:
-        list_of_msg_dicts = gribou.get_all_msg_dict(grib_file)
-        flag_found = False
-        for j, msg_dict in enumerate(list_of_msg_dicts):
-            cfsr_var = CFSRVariable(msg_dict)
-            if cfsr_var.name != grib_var_name:
-                continue
-            if cfsr_var.level != grib_level:
-                continue
-            if flag_found == True:
-                raise NotImplementedError("Found duplicate?")
-            i = j
-            flag_found = True
-    cfsr_var = CFSRVariable(list_of_msg_dicts[i])
-    lats, lons = gribou.get_latlons(grib_file, i + 1)
+    field = {'nc_var_name': nc_var_name, 'msg_id': msg_id,
+             'grib_var_name': grib_var_name, 'grib_level': grib_level,
+             'overwrite_nc_units': overwrite_nc_units}
+    fixed_grib2_to_netcdf_batch(grib_file, [field], nc_file=nc_file,
+                                nc_format=nc_format, metrics=metrics,
+                                metrics_attribute=metrics_attribute,
+                                latitude_order=latitude_order)
 
+
+def _fixed_nc_file(nc_file, lats, nc_format):
+    # New NetCDF file with the global attributes and the grid dimensions of
+    # fixed fields.
     now = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    nc.dataset_pool.invalidate(nc_file)
     nc1 = netCDF4.Dataset(nc_file, 'w', format=nc_format)
 
     nc1.Conventions = 'CF-1.5'
@@ -459,40 +1166,18 @@ def fixed_grib2_to_netcdf(grib_file, nc_file, nc_var_name, msg_id=None,
 
     nc1.createDimension('lat', lats.shape[0])
     nc1.createDimension('lon', lats.shape[1])
+    return nc1
 
-    vtype = cfsr_var.vertical_type
-    if vtype in ['depthBelowSea', 'heightAboveGround']:
-        try:
-            dummy = len(cfsr_var.level)
-            bounds = True
-        except:
-            bounds = False
-        else:
-            nc1.createDimension('nv', 2)
-        level = nc1.createVariable('level', 'f4', (), zlib=True)
-        level.axis = 'Z'
-        level.units = cfsr_var.vertical_units
-        if vtype == 'depthBelowSea':
-            level.positive = 'down'
-        else:
-            level.positive = 'up'
-        level.long_name = vtype
-        level.standard_name = standard_names[vtype]
-        if bounds:
-            level.bounds = 'level_bnds'
-            level_bnds = nc1.createVariable('level_bnds', 'f4', ('nv',), zlib=True)
-            level_bnds[0] = cfsr_var.level[0]
-            level_bnds[1] = cfsr_var.level[1]
-            level[:] = (level_bnds[0] + level_bnds[1]) / 2.0
-        else:
-            level[:] = cfsr_var.level
 
+def _fixed_nc_grid(nc1, lats, lons, rows):
+    # Latitude and longitude coordinates of fixed fields, written after
+    # the level of the first field as in the single field files.
     lat = nc1.createVariable('lat', 'f4', ('lat'), zlib=True)
     lat.axis = 'Y'
     lat.units = 'degrees_north'
     lat.long_name = 'latitude'
     lat.standard_name = 'latitude'
-    lat[:] = lats[::-1, 0]
+    lat[:] = lats[rows, 0]
 
     lon = nc1.createVariable('lon', 'f4', ('lon'), zlib=True)
     lon.axis = 'X'
@@ -501,15 +1186,180 @@ def fixed_grib2_to_netcdf(grib_file, nc_file, nc_var_name, msg_id=None,
     lon.standard_name = 'longitude'
     lon[:] = lons[0, :]
 
-    var1 = nc1.createVariable(nc_var_name, 'f4', ('lat', 'lon'), zlib=True,
-                              fill_value=deff4)
-    if overwrite_nc_units is None:
-        var1.units = cfsr_var.units
+
+def _fixed_nc_level(nc1, cfsr_var, level_name):
+    # Scalar level coordinate (and bounds) of a fixed field, returns False
+    # if the field has no vertical coordinate.
+    vtype = cfsr_var.vertical_type
+    if vtype not in ['depthBelowSea', 'heightAboveGround']:
+        return False
+    try:
+        dummy = len(cfsr_var.level)
+        bounds = True
+    except:
+        bounds = False
     else:
-        var1.units = overwrite_nc_units
-    var1.long_name = cfsr_var.name
-    var1.standard_name = standard_names[nc_var_name]
-    var1.statistic = cfsr_var.statistic
-    var1[:, :] = gribou.get_msg_data(grib_file, i + 1)[::-1, :]
+        if 'nv' not in nc1.dimensions:
+            nc1.createDimension('nv', 2)
+    level = nc1.createVariable(level_name, 'f4', (), zlib=True)
+    level.axis = 'Z'
+    level.units = cfsr_var.vertical_units
+    if vtype == 'depthBelowSea':
+        level.positive = 'down'
+    else:
+        level.positive = 'up'
+    level.long_name = vtype
+    level.standard_name = standard_names[vtype]
+    if bounds:
+        level.bounds = level_name + '_bnds'
+        level_bnds = nc1.createVariable(level_name + '_bnds', 'f4', ('nv',),
+                                        zlib=True)
+        level_bnds[0] = cfsr_var.level[0]
+        level_bnds[1] = cfsr_var.level[1]
+        level[:] = (level_bnds[0] + level_bnds[1]) / 2.0
+    else:
+        level[:] = cfsr_var.level
+    return True
 
-    nc1.close()
+
+def fixed_grib2_to_netcdf_batch(grib_file, fields, nc_file=None,
+                                path_output='', nc_file_pattern=None,
+                                nc_format='NETCDF4', metrics=None,
+                                metrics_attribute=False,
+                                latitude_order='ascending'):
+    """Convert several single spatial fields from a GRIB file to NetCDF.
+
+    Parameters
+    ----------
+    grib_file : string
+    fields : list of dictionaries
+        each with the 'nc_var_name' and, as in fixed_grib2_to_netcdf,
+        either the 'msg_id' or the 'grib_var_name' (and 'grib_level'),
+        optionally 'overwrite_nc_units'.
+    nc_file : string, optional
+        a single fx file with all the fields, otherwise each field is
+        written in its own file.
+    path_output : string, optional
+        directory of the files of each field.
+    nc_file_pattern : string, optional
+        format string of the files of each field, with the nc_var_name
+        field, defaults to '{nc_var_name}_fx_cfsr_reanalysis.nc'.
+    nc_format : string, optional
+    metrics : ConversionMetrics, optional
+        per-stage timing and throughput, emitted at the end.
+    metrics_attribute : bool, optional
+        store the metrics in the 'conversion_metrics' global attribute.
+    latitude_order : string, optional
+        see hourly_grib2_to_netcdf.
+
+    Returns
+    -------
+    out : list of string
+        the NetCDF files written.
+
+    Notes
+    -----
+    The GRIB metadata is read once and the messages in a single pass,
+    all fields are assumed to be on the same grid. In a single file, the
+    level coordinates are named '<nc_var_name>_level' when there is more
+    than one field.
+
+    Examples
+    --------
+    >>> fixed_grib2_to_netcdf_batch(
+    ...     'flxf01.gdas.1979010100.grb2',
+    ...     [{'nc_var_name': 'orog', 'grib_var_name': 'Orography',
+    ...       'overwrite_nc_units': 'm'},
+    ...      {'nc_var_name': 'sftlf', 'grib_var_name': 'Land-sea mask',
+    ...       'overwrite_nc_units': '1'}],
+    ...     nc_file='fx_cfsr_reanalysis.nc')
+
+    """
+
+    if metrics is None:
+        metrics = ConversionMetrics()
+    metrics.switch('metadata')
+    list_of_msg_dicts = gribou.get_all_msg_dict(grib_file)
+    names, table = msg_table(list_of_msg_dicts)
+    list_of_i = []
+    for field in fields:
+        if field.get('msg_id') is not None:
+            list_of_i.append(field['msg_id'] - 1)
+            continue
+        grib_var_name = field.get('grib_var_name')
+        grib_level = field.get('grib_level')
+        warp = _select_var(names, table, grib_var_name, grib_level)
+        if warp.size > 1:
+            raise NotImplementedError("Found duplicate?")
+        if not warp.size:
+            msg = "%s at level %s not found." % (grib_var_name, grib_level)
+            raise NotImplementedError(msg)
+        list_of_i.append(int(warp[0]))
+
+    metrics.switch('reading')
+    selected = set(list_of_i)
+    data = {}
+    lats = None
+    for i, grb_msg in enumerate(gribou.msg_iterator(grib_file)):
+        if i not in selected:
+            continue
+        if lats is None:
+            lats, lons = grb_msg.latlons()
+        metrics.switch('decoding')
+        data[i] = grb_msg['values']
+        metrics.messages += 1
+        metrics.bytes_read += list_of_msg_dicts[i].get('totalLength', 0)
+        metrics.bytes_decoded += data[i].nbytes
+        metrics.switch('reading')
+        if len(data) == len(selected):
+            break
+
+    metrics.switch('writing')
+    rows = _grid_rows(list_of_msg_dicts[list_of_i[0]], latitude_order)
+    if nc_file_pattern is None:
+        nc_file_pattern = "{nc_var_name}_fx_cfsr_reanalysis.nc"
+    nc_files = []
+    nc1 = None
+    for k, field in enumerate(fields):
+        i = list_of_i[k]
+        nc_var_name = field['nc_var_name']
+        if nc1 is None:
+            if nc_file is None:
+                warp = nc_file_pattern.format(nc_var_name=nc_var_name)
+                nc_files.append(os.path.join(path_output, warp))
+            else:
+                nc_files.append(nc_file)
+            nc1 = _fixed_nc_file(nc_files[-1], lats, nc_format)
+        cfsr_var = CFSRVariable(list_of_msg_dicts[i])
+        if (nc_file is None) or (len(fields) == 1):
+            level_name = 'level'
+        else:
+            level_name = nc_var_name + '_level'
+        flag_level = _fixed_nc_level(nc1, cfsr_var, level_name)
+        if 'lat' not in nc1.variables:
+            _fixed_nc_grid(nc1, lats, lons, rows)
+
+        var1 = nc1.createVariable(nc_var_name, 'f4', ('lat', 'lon'),
+                                  zlib=True, fill_value=deff4)
+        if field.get('overwrite_nc_units') is None:
+            var1.units = cfsr_var.units
+        else:
+            var1.units = field['overwrite_nc_units']
+        var1.long_name = cfsr_var.name
+        var1.standard_name = standard_names[nc_var_name]
+        var1.statistic = cfsr_var.statistic
+        if flag_level and level_name != 'level':
+            var1.coordinates = level_name
+        var1[:, :] = data[i][rows, :]
+        metrics.flushes += 1
+        metrics.bytes_written += var1.size * var1.dtype.itemsize
+
+        if (nc_file is None) or (k == len(fields) - 1):
+            if metrics_attribute:
+                metrics.switch(None)
+                nc1.conversion_metrics = json.dumps(metrics.summary())
+                metrics.switch('writing')
+            nc1.close()
+            nc1 = None
+    metrics.emit()
+    return nc_files
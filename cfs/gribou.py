@@ -189,9 +189,12 @@ def msg_iterator(grib_file):
     """
 
     grb1 = pygrib.open(grib_file)
-    for grb_msg in grb1:
-        yield grb_msg
-    grb1.close()
+    try:
+        for grb_msg in grb1:
+            yield grb_msg
+    finally:
+        # Also closed when the iteration is stopped early
+        grb1.close()
 
 
 def get_all_data(grib_file):
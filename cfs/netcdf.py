@@ -6,6 +6,12 @@ NetCDF
 Classes:
 
  * NetCDFError - the exception raised on failure.
+ * MultiFileVariable - variable concatenated along time over multiple files.
+ * DatasetPool - LRU pool of read-only NetCDF handles (see dataset_pool).
+ * LazyFile - read-only NetCDF file with lazy variables.
+ * LazyVariable - proxy of a NetCDF variable reading slices on demand.
+ * RawDataset - uncompressed .npy/JSON alternative to a NetCDF file.
+ * RawVariable - variable of a RawDataset.
 
 Functions:
 
@@ -13,6 +19,7 @@ Functions:
  * :func:`_time_vectors_to_datetimes` - convert time vectors to datetimes.
  * :func:`nc_variables_with_dimension` - variables which use a given dimension.
  * :func:`nc_calendar` - timely calendar of a NetCDF file.
+ * :func:`nc_timely` - timely time series of a NetCDF file.
  * :func:`cf_decode_time_since` - decode time units of a NetCDF file.
  * :func:`_nc_decode_time_units` - decode time units of a NetCDF file.
  * :func:`nc_subdomain_bounds` - bounds of NetCDF subdomain.
@@ -25,6 +32,14 @@ Functions:
  * :func:`nc_copy_variables_structure` - copy variables structure.
  * :func:`nc_copy_variables_attributes` - copy variables attribute.
  * :func:`nc_copy_variables_data` - copy variables data.
+ * :func:`rechunk` - copy files with a new chunking and compression layout.
+ * :func:`nc_stitch_time_parts` - concatenate files of consecutive time ranges.
+ * :func:`nc_resample` - aggregate a variable over time periods.
+ * :func:`nc_sample` - copy every step-th time step of a file.
+ * :func:`nc_sample_files` - nc_sample over many files in parallel.
+ * :func:`nc_set_access_pattern` - tune the chunk cache for an access pattern.
+ * :func:`nc_read_points` - time series at multiple grid points.
+ * :func:`raw_to_netcdf` - convert a RawDataset to a NetCDF file.
  * :func:`save_array` - save an array in a NetCDF file.
 
 DOCUMENTATION TO DO
@@ -36,9 +51,15 @@ FULL REVIEW REQUIRED
 
 """
 
+import collections
+import contextlib
 import datetime
+import itertools
+import json
+import multiprocessing
+import os
+import threading
 import warnings
-import copy
 
 import netCDF4
 import numpy as np
@@ -46,6 +67,17 @@ import numpy.ma as ma
 
 import timely as ty
 
+try:
+    from netCDF4 import netcdftime
+except ImportError:
+    # Moved to the cftime package in netCDF4 1.4
+    import cftime as netcdftime
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
 # from . import ncgeo as geo
 default_calendar = ty.CalGregorian
 
@@ -63,6 +95,571 @@ default_calendar = ty.CalGregorian
 class NetCDFError(Exception):
     pass
 
+
+class DatasetPool:
+    """LRU pool of read-only netCDF4.Dataset handles."""
+
+    def __init__(self, max_size=32):
+        """Initialize DatasetPool.
+
+        Parameters
+        ----------
+        max_size - int
+            maximum number of idle open handles.
+
+        Notes
+        -----
+        Handles are shared and reference counted, only handles that are not
+        in use are closed on eviction. A handle is reopened if the file
+        changed on disk (modification time or size) or was closed
+        elsewhere. Handles inherited by a forked process are dropped
+        without being closed.
+
+        Idle handles keep their files open, which prevents opening them
+        for writing (NetCDF: HDF error or PermissionError). The writers of
+        this module invalidate their output files, call invalidate (or
+        clear) before writing to a file that may still be pooled
+        otherwise, or use max_size=0 to close handles as soon as they are
+        released.
+
+        """
+
+        self.max_size = max_size
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # path -> [dataset, reference count, (mtime, size)]
+        self._handles = collections.OrderedDict()
+        # handles invalidated while in use (by id), closed on release
+        self._stale = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _check_pid(self):
+        if os.getpid() != self._pid:
+            self._reset()
+
+    def _close_idle(self, key):
+        dataset = self._handles.pop(key)[0]
+        if dataset.isopen():
+            dataset.close()
+
+    def _evict(self):
+        for key in list(self._handles.keys()):
+            if len(self._handles) <= self.max_size:
+                break
+            if self._handles[key][1] == 0:
+                self._close_idle(key)
+
+    def acquire(self, nc_file):
+        """Get an open handle, to be given back with release.
+
+        Parameters
+        ----------
+        nc_file - str
+
+        Returns
+        -------
+        out - netCDF4.Dataset
+
+        """
+
+        key = os.path.abspath(nc_file)
+        warp = os.stat(key)
+        signature = (warp.st_mtime, warp.st_size)
+        with self._lock:
+            self._check_pid()
+            if key in self._handles:
+                entry = self._handles[key]
+                if entry[0].isopen() and entry[2] == signature:
+                    self.hits += 1
+                    entry[1] += 1
+                    # most recently used last
+                    self._handles[key] = self._handles.pop(key)
+                    return entry[0]
+                self.invalidate(key)
+            self.misses += 1
+            dataset = netCDF4.Dataset(key, 'r')
+            self._handles[key] = [dataset, 1, signature]
+            self._evict()
+            return dataset
+
+    def release(self, nc_file):
+        """Give back a handle obtained with acquire.
+
+        Parameters
+        ----------
+        nc_file - str or netCDF4.Dataset
+            the file name, or the handle itself.
+
+        """
+
+        with self._lock:
+            self._check_pid()
+            if isinstance(nc_file, netCDF4.Dataset):
+                key = os.path.abspath(nc_file.filepath())
+                flag_pooled = ((key in self._handles) and
+                               (self._handles[key][0] is nc_file))
+                stale_key = id(nc_file)
+            else:
+                key = os.path.abspath(nc_file)
+                flag_pooled = key in self._handles
+                stale_key = None
+                for warp in self._stale.keys():
+                    if self._stale[warp][3] == key:
+                        stale_key = warp
+            if flag_pooled:
+                self._handles[key][1] -= 1
+                self._evict()
+            elif stale_key in self._stale:
+                self._stale[stale_key][1] -= 1
+                if self._stale[stale_key][1] <= 0:
+                    dataset = self._stale.pop(stale_key)[0]
+                    if dataset.isopen():
+                        dataset.close()
+
+    @contextlib.contextmanager
+    def open(self, nc_file):
+        """Context manager giving an open handle.
+
+        Parameters
+        ----------
+        nc_file - str
+
+        """
+
+        dataset = self.acquire(nc_file)
+        try:
+            yield dataset
+        finally:
+            self.release(dataset)
+
+    def invalidate(self, nc_file):
+        """Drop the handle of a file (e.g. before writing to it).
+
+        Parameters
+        ----------
+        nc_file - str
+
+        """
+
+        key = os.path.abspath(nc_file)
+        with self._lock:
+            self._check_pid()
+            if key not in self._handles:
+                return
+            if self._handles[key][1] == 0:
+                self._close_idle(key)
+            else:
+                entry = self._handles.pop(key)
+                self._stale[id(entry[0])] = entry + [key]
+
+    def clear(self):
+        """Drop all handles."""
+
+        with self._lock:
+            self._check_pid()
+            for key in list(self._handles.keys()):
+                self.invalidate(key)
+
+    def stats(self):
+        """Hit and miss counts.
+
+        Returns
+        -------
+        out - dict
+            'hits', 'misses' and 'size' (number of pooled handles).
+
+        """
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._handles)}
+
+
+# Process-wide pool used by the functions of this module, the writers of
+# this module invalidate the files they write.
+dataset_pool = DatasetPool()
+
+
+class LazyVariable:
+    """Proxy of a NetCDF variable reading the requested slices on demand."""
+
+    def __init__(self, lazy_file, var_name, cache=False):
+        """Initialize LazyVariable.
+
+        Parameters
+        ----------
+        lazy_file - LazyFile
+        var_name - str
+        cache - bool
+            load the data in memory (for small coordinate variables).
+
+        """
+
+        self.lazy_file = lazy_file
+        self.name = var_name
+        var1 = lazy_file._variable(var_name)
+        self.dimensions = var1.dimensions
+        self.shape = var1.shape
+        self.ndim = len(var1.shape)
+        self.dtype = var1.dtype
+        self.attributes = {}
+        for attribute in var1.ncattrs():
+            self.attributes[attribute] = getattr(var1, attribute)
+        self._data = None
+        if cache:
+            self._data = var1[...]
+
+    def __getattr__(self, name):
+        # NetCDF attributes (units, calendar, ...) as with netCDF4.Variable
+        attributes = self.__dict__.get('attributes', {})
+        if name in attributes:
+            return attributes[name]
+        raise AttributeError(name)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, item):
+        if self._data is not None:
+            return self._data[item]
+        return self.lazy_file._variable(self.name)[item]
+
+    def ncattrs(self):
+        return list(self.attributes.keys())
+
+
+class LazyFile:
+    """Read-only NetCDF file with LazyVariable proxies, closed on exit."""
+
+    def __init__(self, nc_file, cached_variables=('time', 'lat', 'lon'),
+                 max_cache_bytes=2 ** 24):
+        """Initialize LazyFile.
+
+        Parameters
+        ----------
+        nc_file - str
+        cached_variables - list of str
+            variables loaded in memory when opening the file.
+        max_cache_bytes - int
+            cached variables larger than this are read on demand.
+
+        Notes
+        -----
+        The handle comes from dataset_pool and is given back by close(),
+        or at the end of a with statement. Reading a proxy afterward raises
+        NetCDFError, cached variables remain available.
+
+        """
+
+        self.nc_file = nc_file
+        self.dataset = dataset_pool.acquire(nc_file)
+        self.variables = {}
+        try:
+            for var_name in self.dataset.variables.keys():
+                var1 = self.dataset.variables[var_name]
+                nbytes = int(np.prod(var1.shape)) * var1.dtype.itemsize
+                cache = ((var_name in cached_variables) and
+                         (nbytes <= max_cache_bytes))
+                self.variables[var_name] = LazyVariable(self, var_name,
+                                                        cache)
+        except Exception:
+            self.close()
+            raise
+
+    def _variable(self, var_name):
+        if self.dataset is None:
+            raise NetCDFError("File is closed: %s." % (self.nc_file,))
+        return self.dataset.variables[var_name]
+
+    def __getitem__(self, var_name):
+        return self.variables[var_name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def isopen(self):
+        return self.dataset is not None
+
+    def close(self):
+        if self.dataset is not None:
+            dataset_pool.release(self.dataset)
+            self.dataset = None
+
+
+def _json_value(value):
+    # Attribute or data value as a JSON compatible object.
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return value
+
+
+class RawVariable:
+    """Variable of a RawDataset, in memory or memory-mapped from a .npy file."""
+
+    _internals = ['name', 'dimensions', 'dtype', 'shape', 'size', 'ndim',
+                  'values']
+
+    def __init__(self, name, dtype, dimensions, shape, values,
+                 create_args=None):
+        """Initialize RawVariable.
+
+        Parameters
+        ----------
+        name - str
+        dtype - numpy dtype
+        dimensions - tuple of str
+        shape - tuple of int
+        values - numpy array or numpy.memmap
+            raw values, missing values are the fill value.
+        create_args - dict
+            createVariable arguments, kept for the NetCDF conversion.
+
+        Notes
+        -----
+        values is the zero-copy path to the data. Indexing the variable
+        returns a masked array sharing memory with values, with a mask
+        built from the fill value (none if no value equals it).
+
+        """
+
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.dimensions = tuple(dimensions)
+        self.shape = tuple(shape)
+        self.size = int(np.prod(self.shape))
+        self.ndim = len(self.shape)
+        self.values = values
+        if create_args is None:
+            create_args = {}
+        self._create_args = create_args
+        if 'fill_value' in create_args:
+            self._fill_value = create_args['fill_value']
+        else:
+            self._fill_value = netCDF4.default_fillvals[self.dtype.str[1:]]
+
+    def ncattrs(self):
+        return [key for key in self.__dict__.keys()
+                if (key not in self._internals) and (key[0] != '_')]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, item):
+        if self.ndim == 0:
+            item = Ellipsis
+        warp = ma.masked_equal(self.values[item], self._fill_value,
+                               copy=False)
+        warp.shrink_mask()
+        return warp
+
+    def __setitem__(self, item, value):
+        value = ma.filled(ma.asarray(value), self._fill_value)
+        if self.ndim == 0:
+            self.values[...] = value
+        else:
+            self.values[item] = value
+
+
+class RawDataset:
+    """Uncompressed alternative to a NetCDF file for intermediate data.
+
+    A JSON sidecar holds the dimensions, the attributes and the small
+    variables, large variables are .npy files mapped with numpy.memmap.
+
+    """
+
+    _internals = ['raw_file', 'mode', 'dimensions', 'variables',
+                  'unlimited_sizes', 'max_json_size']
+
+    def __init__(self, raw_file, mode='r', unlimited_sizes=None,
+                 max_json_size=65536):
+        """Initialize RawDataset.
+
+        Parameters
+        ----------
+        raw_file - str
+            the sidecar is raw_file with a .json extension, large
+            variables are next to it as raw_file.var_name.npy.
+        mode - str
+            'r', 'r+' or 'w'.
+        unlimited_sizes - dict
+            size of the unlimited dimensions (mode 'w').
+        max_json_size - int
+            variables with more elements are stored in .npy files.
+
+        Notes
+        -----
+        Only the parts of the netCDF4.Dataset interface used by the
+        converters are available: attributes, createDimension,
+        createVariable, variables and close. Unlimited dimensions are
+        recorded so that raw_to_netcdf can restore them.
+
+        """
+
+        self.raw_file = os.path.splitext(raw_file)[0] + '.json'
+        self.mode = mode
+        self.dimensions = collections.OrderedDict()
+        self.variables = collections.OrderedDict()
+        self.unlimited_sizes = unlimited_sizes or {}
+        self.max_json_size = max_json_size
+        self._unlimited = []
+        if mode == 'w':
+            return
+        with open(self.raw_file, 'r') as json_file:
+            sidecar = json.load(json_file,
+                                object_pairs_hook=collections.OrderedDict)
+        for key, value in sidecar['attributes'].items():
+            setattr(self, key, value)
+        for dim, size in sidecar['dimensions'].items():
+            self.dimensions[dim] = size
+        self._unlimited = sidecar['unlimited']
+        warp = os.path.dirname(self.raw_file)
+        for var_name, description in sidecar['variables'].items():
+            shape = [self.dimensions[dim]
+                     for dim in description['dimensions']]
+            if 'file' in description:
+                # Memory-mapped, nothing is read until sliced
+                values = np.load(os.path.join(warp, description['file']),
+                                 mmap_mode=mode)
+            else:
+                values = np.array(description['data'],
+                                  dtype=description['dtype'])
+                values = values.reshape(shape)
+            var1 = RawVariable(var_name, description['dtype'],
+                               description['dimensions'], shape, values,
+                               description['create_args'])
+            for key, value in description['attributes'].items():
+                setattr(var1, key, value)
+            self.variables[var_name] = var1
+
+    def ncattrs(self):
+        return [key for key in self.__dict__.keys()
+                if (key not in self._internals) and (key[0] != '_')]
+
+    def createDimension(self, dimname, size=None):
+        if size is None:
+            if dimname not in self.unlimited_sizes:
+                msg = "Size of unlimited dimension %s is required."
+                raise NetCDFError(msg % (dimname,))
+            self._unlimited.append(dimname)
+            size = self.unlimited_sizes[dimname]
+        self.dimensions[dimname] = size
+
+    def createVariable(self, varname, datatype, dimensions=(), **args):
+        if isinstance(dimensions, str):
+            dimensions = (dimensions,)
+        shape = [self.dimensions[dim] for dim in dimensions]
+        var1 = RawVariable(varname, datatype, dimensions, shape, None, args)
+        if var1.size > self.max_json_size:
+            npy_file = "%s.%s.npy" % (os.path.splitext(self.raw_file)[0],
+                                      varname)
+            var1.values = np.lib.format.open_memmap(
+                npy_file, mode='w+', dtype=var1.dtype, shape=var1.shape)
+            var1.values[...] = var1._fill_value
+        else:
+            var1.values = np.empty(var1.shape, dtype=var1.dtype)
+            var1.values[...] = var1._fill_value
+        self.variables[varname] = var1
+        return var1
+
+    def sync(self):
+        for var1 in self.variables.values():
+            if isinstance(var1.values, np.memmap) and self.mode != 'r':
+                var1.values.flush()
+
+    def close(self):
+        if self.mode == 'r':
+            return
+        sidecar = collections.OrderedDict()
+        sidecar['attributes'] = collections.OrderedDict(
+            [(key, _json_value(getattr(self, key))) for key in self.ncattrs()])
+        sidecar['dimensions'] = self.dimensions
+        sidecar['unlimited'] = self._unlimited
+        sidecar['variables'] = collections.OrderedDict()
+        for var_name, var1 in self.variables.items():
+            description = collections.OrderedDict()
+            description['dtype'] = var1.dtype.str
+            description['dimensions'] = var1.dimensions
+            description['create_args'] = dict(
+                [(key, _json_value(value))
+                 for key, value in var1._create_args.items()])
+            description['attributes'] = collections.OrderedDict(
+                [(key, _json_value(getattr(var1, key)))
+                 for key in var1.ncattrs()])
+            if isinstance(var1.values, np.memmap):
+                var1.values.flush()
+                description['file'] = os.path.basename(var1.values.filename)
+            else:
+                description['data'] = var1.values.tolist()
+            sidecar['variables'][var_name] = description
+        with open(self.raw_file, 'w') as json_file:
+            json.dump(sidecar, json_file, indent=1)
+
+
+#
+def raw_to_netcdf(raw_file, nc_file, nc_format='NETCDF4', max_bytes=2 ** 27):
+    """Convert a RawDataset to a NetCDF file.
+
+    Parameters
+    ----------
+    raw_file - str
+    nc_file - str
+    nc_format - str
+    max_bytes - int
+        memory bound of each write.
+
+    Notes
+    -----
+    Variables are created with the arguments given when the raw file was
+    written (compression, chunks, fill value), so the NetCDF file is the
+    same as the one the converter would have written directly.
+
+    """
+
+    raw1 = RawDataset(raw_file, 'r')
+    dataset_pool.invalidate(nc_file)
+    nc1 = netCDF4.Dataset(nc_file, 'w', format=nc_format)
+    try:
+        for key in raw1.ncattrs():
+            setattr(nc1, key, getattr(raw1, key))
+        for dim, size in raw1.dimensions.items():
+            if dim in raw1._unlimited:
+                nc1.createDimension(dim, None)
+            else:
+                nc1.createDimension(dim, size)
+        for var_name, var1 in raw1.variables.items():
+            create_args = dict(var1._create_args)
+            if 'chunksizes' in create_args:
+                create_args['chunksizes'] = tuple(create_args['chunksizes'])
+            var2 = nc1.createVariable(var_name, var1.dtype, var1.dimensions,
+                                      **create_args)
+            for key in var1.ncattrs():
+                setattr(var2, key, getattr(var1, key))
+            if var1.ndim == 0:
+                var2[...] = var1.values[...]
+                continue
+            if var1.size == 0:
+                continue
+            chunks = create_args.get('chunksizes')
+            block = _chunk_blocks(var1.shape, chunks, var1.dtype.itemsize,
+                                  max_bytes)
+            ranges = [range(0, n, b) for n, b in zip(var1.shape, block)]
+            # Missing values are already the fill value
+            var2.set_auto_mask(False)
+            for corner in itertools.product(*ranges):
+                slices = tuple([slice(k, min(k + b, n))
+                                for k, b, n in zip(corner, block, var1.shape)])
+                var2[slices] = var1.values[slices]
+    finally:
+        nc1.close()
+
 #
 def mask_combinatorics(some_array, multislice, flag_start=True):
     """Mask combinatorics
@@ -70,6 +667,11 @@ def mask_combinatorics(some_array, multislice, flag_start=True):
     ----------
     some_array - ma.array
     multislice - Multidimensional slices
+        numpy arrays of indices (the same length, taken together as points,
+        e.g. the lat/lon indices of grid cells) and slices.
+    flag_start - bool
+        if True, everything outside of the points is masked, otherwise
+        values at the points are only unmasked.
     Returns
     -------
     out - ma.array
@@ -77,45 +679,44 @@ def mask_combinatorics(some_array, multislice, flag_start=True):
     -----
     This modifies the array in-place.
     Used to mask values outside of a polygon in multidimensional data.
-    MORE COMMENTS NEEDED
-    PARTIAL TEST FUNCTIONS
+    The mask of the points is built once on the dimensions indexed by
+    arrays and broadcast over the other dimensions (restricted to their
+    slices), the data is not copied. Values already masked stay masked.
     """
 
-    combinato_slices = []
-    first_array = -1
-    flag_multi_indices = False
+    array_dims = []
     for i, my_slice in enumerate(multislice):
-        if isinstance(my_slice, type(np.array([0]))):
-            if first_array != -1:
-                flag_multi_indices = True
-                combinato_slices.append(my_slice)
-            else:
-                first_array = i
-                combinato_slices.append(0)
-        else:
-            combinato_slices.append(my_slice)
-    if first_array != -1:
-        initial_mask = copy.deepcopy(ma.getmaskarray(some_array))
-        if flag_start:
-            some_array.mask = np.ones(some_array.shape, dtype=np.bool)
-        if flag_multi_indices:
-            for j in set(multislice[first_array]):
-                combinato_slices[first_array] = j
-                next_combo = []
-                for i, my_slice in enumerate(combinato_slices):
-                    if isinstance(my_slice, type(np.array([0]))):
-                        restrain = np.where(multislice[first_array] == j)
-                        next_combo.append(my_slice[restrain])
-                    else:
-                        next_combo.append(my_slice)
-                mask_combinatorics(some_array, tuple(next_combo), False)
+        if isinstance(my_slice, np.ndarray):
+            array_dims.append(i)
+    if not array_dims:
+        return
+    # Points mask on the dimensions indexed by arrays
+    shape = some_array.shape
+    inside = np.zeros([shape[i] for i in array_dims], dtype=bool)
+    inside[tuple([multislice[i] for i in array_dims])] = True
+    broadcast_shape = [1] * len(shape)
+    for i in array_dims:
+        broadcast_shape[i] = shape[i]
+    inside = inside.reshape(broadcast_shape)
+    # Restrict the other dimensions to their slices
+    for i, my_slice in enumerate(multislice):
+        if i in array_dims:
+            continue
+        selected = np.zeros([shape[i]], dtype=bool)
+        selected[my_slice] = True
+        if selected.all():
+            continue
+        warp = [1] * len(shape)
+        warp[i] = shape[i]
+        inside = np.bitwise_and(inside, selected.reshape(warp))
+    if flag_start:
+        if some_array.mask is ma.nomask:
+            some_array.mask = np.broadcast_to(~inside, shape)
         else:
-            for j in range(multislice[first_array].size):
-                combinato_slices[first_array] = multislice[first_array][j]
-                some_array.mask[tuple(combinato_slices)] = 0
-            return
-        some_array.mask[...] = np.bitwise_or(initial_mask,
-                                             ma.getmaskarray(some_array))
+            some_array.mask |= ~inside
+    elif some_array.mask is not ma.nomask:
+        some_array.mask &= ~inside
+
 
 #
 def _time_vectors_int(time_vectors, force=False, raise_exception=False,
@@ -167,11 +768,11 @@ def _datetimes_to_time_vectors(datetimes):
         return one_datetime.timetuple()[0:6]
 
     try:
-        time_tuples = map(datetime_timetuple, datetimes)
+        time_tuples = list(map(datetime_timetuple, datetimes))
         return _time_vectors_int(ma.array(time_tuples))
     except (AttributeError, TypeError):
-        time_tuple = datetimes.timetuple()
-        return _time_vectors_int(ma.array(time_tuples))
+        time_tuple = datetimes.timetuple()[0:6]
+        return _time_vectors_int(ma.array(time_tuple))
 
 
 #
@@ -212,7 +813,7 @@ def _time_vectors_to_datetimes(time_vectors):
             valid_datetimes.append(0)
         if irregular_calendar:
             try:
-                ndatetime = netCDF4.netcdftime.datetime(*full_vector)
+                ndatetime = netcdftime.datetime(*full_vector)
                 datetime_str = ndatetime.strftime()
             except (ma.MaskError, ValueError):
                 masked_datetimes.append(0)
@@ -230,7 +831,7 @@ def _time_vectors_to_datetimes(time_vectors):
                 else:
                     full_vector[s] = 0
             try:
-                ndatetime = netCDF4.netcdftime.datetime(*full_vector)
+                ndatetime = netcdftime.datetime(*full_vector)
                 datetime_str = ndatetime.strftime()
             except (ma.MaskError, ValueError):
                 masked_datetimes.append(i)
@@ -292,6 +893,38 @@ def nc_calendar(nc1):
     return ty.calendar_from_alias(time1.calendar)
 
 
+#
+def nc_timely(nc1):
+    """Time series of a NetCDF file.
+
+    Parameters
+    ----------
+    nc1 - netCDF4.Dataset
+
+    Returns
+    -------
+    out - timely TimeSeries
+
+    Notes
+    -----
+    The 'time_vectors' variable is used when available, otherwise the
+    'time' variable is decoded.
+
+    """
+
+    calendar = ty.calendar_from_alias(_calendar_from_nc_dataset(nc1))
+    if 'time_vectors' in nc1.variables.keys():
+        tvs = _time_vectors_int(nc1.variables['time_vectors'][:, :])
+    else:
+        time1 = nc1.variables['time']
+        datetimes = netCDF4.num2date(time1[:], time1.units,
+                                     _calendar_from_time_variable(time1))
+        tvs = _datetimes_to_time_vectors(datetimes)
+    # timely expects a full mask array
+    tvs = ma.array(tvs, mask=ma.getmaskarray(tvs))
+    return ty.TimeSeries(tvs, calendar)
+
+
 #
 def cf_decode_time_since(time_since):
     """decode time units of a NetCDF file.
@@ -323,7 +956,7 @@ def cf_decode_time_since(time_since):
         msg = "'since' keyword expected in time units, got: %s" % (since,)
         raise NetCDFError(msg)
     time_vector = split_time[2].split('-')
-    time_vector = map(int, time_vector)
+    time_vector = list(map(int, time_vector))
     if len(split_time) > 3:
         hms = split_time[3].split(':')
         time_vector.append(int(hms[0]))
@@ -367,6 +1000,164 @@ def _nc_decode_time_units(nc1):
     return time_vector, time_unit
 
 
+#
+def _spatial_request(spatially):
+    # Interpret a spatial request as a lon/lat box or a list of lon/lat
+    # points.
+    if hasattr(spatially, 'bounds'):
+        return 'box', np.array(spatially.bounds, dtype='float64')
+    warp = np.array(spatially, dtype='float64')
+    if warp.shape == (4,):
+        return 'box', warp
+    elif warp.shape == (2,):
+        return 'points', warp.reshape((1, 2))
+    elif (warp.ndim == 2) and (warp.shape[1] == 2):
+        return 'points', warp
+    raise NotImplementedError("Unsupported spatial request.")
+
+
+#
+def _regular_lonlat(nc1):
+    # 1-D lon and lat coordinates with their dimension names.
+    lon1 = nc1.variables['lon']
+    lat1 = nc1.variables['lat']
+    if (len(lon1.dimensions) != 1) or (len(lat1.dimensions) != 1):
+        raise NotImplementedError("Only regular lat/lon grids.")
+    if lon1.dimensions[0] == lat1.dimensions[0]:
+        raise NotImplementedError("Only regular lat/lon grids.")
+    lon = np.array(ma.getdata(lon1[:]), dtype='float64')
+    lat = np.array(ma.getdata(lat1[:]), dtype='float64')
+    return lon, lat, lon1.dimensions[0], lat1.dimensions[0]
+
+
+#
+def _is_periodic(lon):
+    # Whether an ascending longitude axis covers the whole globe.
+    if lon.size < 2:
+        return False
+    dlon = (lon[-1] - lon[0]) / (lon.size - 1)
+    return lon[-1] - lon[0] + dlon >= 360.0 - 1e-6
+
+
+#
+def _lon_slices(lon, lon_min, lon_max):
+    """Longitude slices of a box.
+
+    Parameters
+    ----------
+    lon - numpy array
+        ascending 1-D longitudes.
+    lon_min - float
+    lon_max - float
+        box edges, in any longitude convention (lon_max < lon_min for a box
+        across the longitude origin of the request).
+
+    Returns
+    -------
+    out - list of slices
+        one slice, or two when the box crosses the first longitude of a
+        global grid (e.g. a box across 0 on a 0-360 grid).
+
+    Notes
+    -----
+    On a regional grid the box is only shifted by 360 degrees when it is
+    given in the other longitude convention, then clipped to the grid.
+
+    """
+
+    width = lon_max - lon_min
+    if width < 0:
+        width += 360.0
+    if width >= 360.0:
+        return [slice(0, lon.size)]
+    if not _is_periodic(lon):
+        overlaps = []
+        for shift in [0.0, -360.0, 360.0]:
+            warp = (min(lon_min + shift + width, lon[-1]) -
+                    max(lon_min + shift, lon[0]))
+            overlaps.append((warp, shift))
+        # The first largest overlap, no shift on ties
+        shift = max(overlaps, key=lambda x: x[0])[1]
+        lon_max = min(lon_min + shift + width, lon[-1])
+        lon_min = max(lon_min + shift, lon[0])
+        i0 = np.searchsorted(lon, lon_min, 'left')
+        i1 = np.searchsorted(lon, lon_max, 'right')
+        return [slice(int(i0), int(max(i0, i1)))]
+    lon_min = lon[0] + (lon_min - lon[0]) % 360.0
+    lon_max = lon_min + width
+    i0 = np.searchsorted(lon, lon_min, 'left')
+    i1 = np.searchsorted(lon, lon_max, 'right')
+    if lon_max <= lon[-1]:
+        return [slice(int(i0), int(i1))]
+    i2 = np.searchsorted(lon, lon_max - 360.0, 'right')
+    return [slice(int(i0), lon.size), slice(0, int(i2))]
+
+
+#
+def _lat_slice(lat, lat_min, lat_max):
+    # Latitude slice of a box, for ascending or descending latitudes.
+    if lat[0] <= lat[-1]:
+        j0 = np.searchsorted(lat, lat_min, 'left')
+        j1 = np.searchsorted(lat, lat_max, 'right')
+        return slice(int(j0), int(j1))
+    warp = lat[::-1]
+    j0 = np.searchsorted(warp, lat_min, 'left')
+    j1 = np.searchsorted(warp, lat_max, 'right')
+    return slice(int(lat.size - j1), int(lat.size - j0))
+
+
+#
+def _nearest_indices(coordinates, values, periodic=False):
+    # Indices of the nearest coordinates (ascending or descending), with
+    # longitude wrap for a periodic axis.
+    flag_descending = coordinates[0] > coordinates[-1]
+    if flag_descending:
+        coordinates = coordinates[::-1]
+    if periodic:
+        values = coordinates[0] + (values - coordinates[0]) % 360.0
+        coordinates = np.append(coordinates, coordinates[0] + 360.0)
+    warp = np.searchsorted(coordinates, values)
+    right = np.minimum(warp, coordinates.size - 1)
+    left = np.maximum(warp - 1, 0)
+    flag_left = (values - coordinates[left]) <= (coordinates[right] - values)
+    indices = np.where(flag_left, left, right)
+    if periodic:
+        indices = indices % (coordinates.size - 1)
+        n = coordinates.size - 1
+    else:
+        n = coordinates.size
+    if flag_descending:
+        indices = n - 1 - indices
+    return indices
+
+
+#
+def _index_slices(indices, n, periodic=False):
+    # Smallest slices covering indices; on a periodic axis the largest gap
+    # between indices is left out, which may give two slices.
+    unique_indices = np.unique(indices)
+    if not periodic or unique_indices.size == 1:
+        return [slice(int(unique_indices[0]), int(unique_indices[-1]) + 1)]
+    gaps = np.diff(np.append(unique_indices, unique_indices[0] + n))
+    k = int(np.argmax(gaps))
+    if k == unique_indices.size - 1:
+        return [slice(int(unique_indices[0]), int(unique_indices[-1]) + 1)]
+    return [slice(int(unique_indices[k + 1]), n),
+            slice(0, int(unique_indices[k]) + 1)]
+
+
+#
+def _block_positions(indices, dim_slices):
+    # Positions of indices in the concatenation of the slices.
+    positions = np.zeros(np.shape(indices), dtype='int64')
+    offset = 0
+    for dim_slice in dim_slices:
+        flag_in = (indices >= dim_slice.start) & (indices < dim_slice.stop)
+        positions[flag_in] = offset + indices[flag_in] - dim_slice.start
+        offset += dim_slice.stop - dim_slice.start
+    return positions
+
+
 #
 def nc_subdomain_bounds(nc1, spatially):
     """Get bounds of NetCDF subdomain.
@@ -374,38 +1165,80 @@ def nc_subdomain_bounds(nc1, spatially):
     Parameters
     ----------
     nc1 - netCDF4.Dataset
-    spatially - spatially object
+    spatially - lon/lat box, lon/lat points or geometry
+        (lon_min, lat_min, lon_max, lat_max), an Nx2 array of (lon, lat) or
+        an object with a 'bounds' attribute (e.g. shapely geometry).
 
     Returns
     -------
-    out - dictionary of slices
+    out - dictionary of lists of slices
+        one slice for the latitude dimension, one or two slices for the
+        longitude dimension.
+
+    Notes
+    -----
+    Only regular grids with 1-D 'lat' and 'lon' variables are supported.
+    For points, the bounds cover the nearest grid cells.
 
     """
 
-    lon1 = nc1.variables['lon']
-    lat1 = nc1.variables['lat']
-    return geo.subdomain_bounds(lon1[...], lat1[...], spatially, lon1.dimensions)
+    lon, lat, lon_dimension, lat_dimension = _regular_lonlat(nc1)
+    request_type, request = _spatial_request(spatially)
+    if request_type == 'box':
+        lon_slices = _lon_slices(lon, request[0], request[2])
+        lat_slices = [_lat_slice(lat, request[1], request[3])]
+    else:
+        indices = nc_subdomain_indices(nc1, request)
+        periodic = _is_periodic(lon)
+        lon_slices = _index_slices(indices[lon_dimension], lon.size, periodic)
+        lat_slices = _index_slices(indices[lat_dimension], lat.size)
+    return {lon_dimension: lon_slices, lat_dimension: lat_slices}
 
 
 #
 def nc_subdomain_indices(nc1, geometry, warp_longitude=None):
-    lon1 = nc1.variables['lon']
-    lat1 = nc1.variables['lat']
-    if (len(lon1.dimensions) == 1) and (len(lat1.dimensions) == 1):
-        if lon1.dimensions[0] == lat1.dimensions[0]:
-            indices = geo.linear_lonlat_subdomain_indices(lon1[:], lat1[:],
-                                                          geometry,
-                                                          warp_longitude)
-            return {lon1.dimensions[0]: indices[0]}
-    raise NotImplementedError()
+    """Get indices of NetCDF subdomain.
+
+    Parameters
+    ----------
+    nc1 - netCDF4.Dataset
+    geometry - lon/lat box, lon/lat points or geometry
+        see nc_subdomain_bounds.
+    warp_longitude - unused
+
+    Returns
+    -------
+    out - dictionary of numpy arrays
+        paired indices of the grid cells for the latitude and longitude
+        dimensions.
+
+    Notes
+    -----
+    Points are assigned to their nearest grid cell, boxes give every grid
+    cell inside the box.
+
+    """
+
+    lon, lat, lon_dimension, lat_dimension = _regular_lonlat(nc1)
+    request_type, request = _spatial_request(geometry)
+    if request_type == 'box':
+        bounds = nc_subdomain_bounds(nc1, request)
+        ii = np.concatenate([np.arange(lon.size)[one_slice]
+                             for one_slice in bounds[lon_dimension]])
+        jj = np.arange(lat.size)[bounds[lat_dimension][0]]
+        jj, ii = np.meshgrid(jj, ii, indexing='ij')
+        return {lat_dimension: jj.ravel(), lon_dimension: ii.ravel()}
+    ii = _nearest_indices(lon, request[:, 0], _is_periodic(lon))
+    jj = _nearest_indices(lat, request[:, 1])
+    return {lat_dimension: jj, lon_dimension: ii}
 
 
 #
 def nc_subperiod_slice(nc1, initial_year, final_year, left_open=False,
                        right_open=True):
     time1 = nc1.variables['time']
-    initial_nc_date = netCDF4.netcdftime.datetime(initial_year, 1, 1, 0, 0, 0)
-    final_nc_date = netCDF4.netcdftime.datetime(final_year, 1, 1, 0, 0, 0)
+    initial_nc_date = netcdftime.datetime(initial_year, 1, 1, 0, 0, 0)
+    final_nc_date = netcdftime.datetime(final_year, 1, 1, 0, 0, 0)
     initial_num = netCDF4.date2num(initial_nc_date, time1.units, time1.calendar)
     final_num = netCDF4.date2num(final_nc_date, time1.units, time1.calendar)
     times = time1[:]
@@ -423,6 +1256,18 @@ def nc_subperiod_slice(nc1, initial_year, final_year, left_open=False,
     return slice(indices[0][0], indices[0][-1] + 1)
 
 
+#
+def _time_subset(nc1, timely):
+    # Time indices of a period, as a slice when they are contiguous.
+    tseries = nc_timely(nc1)
+    indices = tseries.intersection(timely, as_indices=True)[0]
+    if not indices.size:
+        return slice(0, 0)
+    if (np.diff(indices) == 1).all():
+        return slice(int(indices[0]), int(indices[-1]) + 1)
+    return indices
+
+
 #
 def nc_get_data(nc1, variable, timely=None, spatially=None, time_stats=None,
                 spatial_stats=None, mask_outside_spatially=True):
@@ -432,8 +1277,11 @@ def nc_get_data(nc1, variable, timely=None, spatially=None, time_stats=None,
     ----------
     nc1 - netCDF4.Dataset
     variable - str
-    timely - timely
-    spatially - spatially
+    timely - timely Period
+    spatially - lon/lat box, lon/lat points or geometry
+        see nc_subdomain_bounds.
+    mask_outside_spatially - bool
+        mask grid cells that are not one of the requested points.
 
     Returns
     -------
@@ -441,53 +1289,55 @@ def nc_get_data(nc1, variable, timely=None, spatially=None, time_stats=None,
 
     Notes
     -----
-    This is completely out of date.
+    Only the hyperslab of the period and of the bounds of the region is
+    read. A region across the first longitude of a global grid is read as
+    two hyperslabs joined along longitudes. time_stats and spatial_stats
+    are not implemented.
 
     """
 
     var1 = nc1.variables[variable]
     dims1 = var1.dimensions
-    if 'lon' in nc1.variables.keys():
-        lon1 = nc1.variables['lon']
-        lon = geo.grid_fix_longitudes(lon1[...], 180.0)
-        lon_dimensions = lon1.dimensions
-    else:
-        lon_dimensions = []
-    if 'lat' in nc1.variables.keys():
-        lat1 = nc1.variables['lat']
-        lat = lat1[...]
-        lat_dimensions = lat1.dimensions
-    else:
-        lat_dimensions = []
-
-    slices = []
-    multiindices = []
-    for dim1 in dims1:
-        if dim1 == 'time' and timely:
-            mdate1 = nc_timely(nc1)
-            time_indices = mdate1.intersection(timely, as_indices=True)
-            slices.append(time_indices[0])
-            multiindices.append(slice(None, None, None))
-        elif (dim1 in lon_dimensions) or (dim1 in lat_dimensions):
-            indices = geo.subdomain_indices(lon, lat, spatially,
-                                            lon_dimensions,
-                                            lat_dimensions)
-            bounds = geo.indices_bounds(indices)
-            slices.append(bounds[dim1])
-            multiindices.append(indices[dim1] - indices[dim1].min())
+    slices = [slice(None, None, None)] * len(dims1)
+    if timely and ('time' in dims1):
+        slices[dims1.index('time')] = _time_subset(nc1, timely)
+    bounds = {}
+    if spatially is not None:
+        bounds = nc_subdomain_bounds(nc1, spatially)
+    split_axis = None
+    split_slices = [None]
+    for dim1, dim_slices in bounds.items():
+        if dim1 not in dims1:
+            continue
+        if len(dim_slices) == 1:
+            slices[dims1.index(dim1)] = dim_slices[0]
         else:
-            slices.append(slice(None, None, None))
-            multiindices.append(slice(None, None, None))
-    print(slices)
-    mydata = var1[tuple(slices)]
-    if mask_outside_spatially:
-        mydata = ma.array(mydata)
-        ss.mask_combinatorics(mydata, tuple(multiindices))
+            split_axis = dims1.index(dim1)
+            split_slices = dim_slices
+    list_of_data = []
+    for split_slice in split_slices:
+        if split_axis is not None:
+            slices[split_axis] = split_slice
+        list_of_data.append(var1[tuple(slices)])
+    if len(list_of_data) == 1:
+        mydata = list_of_data[0]
+    else:
+        mydata = ma.concatenate(list_of_data, axis=split_axis)
+    if mask_outside_spatially and (spatially is not None):
+        if _spatial_request(spatially)[0] == 'points':
+            indices = nc_subdomain_indices(nc1, spatially)
+            multiindices = [slice(None, None, None)] * len(dims1)
+            for dim1, dim_indices in indices.items():
+                if dim1 in dims1:
+                    warp = _block_positions(dim_indices, bounds[dim1])
+                    multiindices[dims1.index(dim1)] = warp
+            mydata = ma.array(mydata)
+            mask_combinatorics(mydata, tuple(multiindices))
     return mydata
 
 
 #
-def nc_validate(nc1, variables=[]):
+def nc_validate(nc1, variables=[], check_timestep=False):
     """Validate NetCDF file.
 
     Parameters
@@ -495,6 +1345,8 @@ def nc_validate(nc1, variables=[]):
     nc1 - netCDF4.Dataset
     variables - list of str
         fields that are expected in the NetCDF file.
+    check_timestep - bool
+        warn about irregular timesteps.
 
     Notes
     -----
@@ -504,6 +1356,7 @@ def nc_validate(nc1, variables=[]):
         3.1 attribute 'calendar' exists
         3.2 attribute 'units' exists
         3.3 netCDF4.num2date(time[:],time.units,time.calendar) works
+        3.4 timestep is uniform (if check_timestep is True)
     4. variables given as input exist and have 'units' attribute
 
     """
@@ -530,6 +1383,12 @@ def nc_validate(nc1, variables=[]):
                     warp2 = "num2date failed."
                     warp3 = " value: %s, units: %s, calendar: %s."
                     warnings.warn(warp2 + warp3 % warp1)
+            if check_timestep and (ncvar1.size > 1):
+                steps, breaks = nc_timely(nc1).timestep_breaks()
+                if len(steps) > 1:
+                    warp1 = (str(steps.tolist()), str(breaks.tolist()))
+                    warp2 = "irregular timesteps (seconds): %s, at indices: %s."
+                    warnings.warn(warp2 % warp1)
         elif var1 == 'lon':
             if hasattr(ncvar1, 'units') and ncvar1.units != 'degrees_east':
                 warp1 = "lon variable units are not 'degrees_north'. units: %s"
@@ -547,6 +1406,18 @@ def nc_validate(nc1, variables=[]):
 
 
 #
+def _attr_value(value):
+    # hack for bypassing unicode bug: unicode attributes are encoded on
+    # Python 2, on Python 3 str is kept as is (bytes can not be appended to
+    # the str read back from a file).
+    if isinstance(value, str):
+        return value
+    try:
+        return value.encode('latin-1')
+    except (AttributeError, UnicodeEncodeError):
+        return value
+
+
 def nc_copy_attrs(nc_source, nc_destination, includes=[], excludes=[], renames=None,
                   defaults=None, appends=None):
     """Copy attributes from source file to destination file.
@@ -594,37 +1465,20 @@ def nc_copy_attrs(nc_source, nc_destination, includes=[], excludes=[], renames=N
                 renames[attribute] = attribute
             if renames[attribute] == '_FillValue':
                 continue
-            copy_attr = getattr(nc_source, attribute)
-            # hack for bypassing unicode bug
-            try:
-                copy_attr = copy_attr.encode('latin-1')
-            except (AttributeError, UnicodeEncodeError):
-                pass
+            copy_attr = _attr_value(getattr(nc_source, attribute))
             nc_destination.__setattr__(renames[attribute], copy_attr)
     for attribute in defaults.keys():
         if not hasattr(nc_destination, attribute):
-            # hack for bypassing unicode bug
-            try:
-                default_attr = defaults[attribute].encode('latin-1')
-            except (AttributeError, UnicodeEncodeError):
-                default_attr = defaults[attribute]
+            default_attr = _attr_value(defaults[attribute])
             nc_destination.__setattr__(attribute, default_attr)
     for attribute in appends.keys():
         if hasattr(nc_destination, attribute):
             warp = getattr(nc_destination, attribute)
-            # hack for bypassing unicode bug
-            try:
-                append_attr = appends[attribute].encode('latin-1')
-            except (AttributeError, UnicodeEncodeError):
-                append_attr = appends[attribute]
+            append_attr = _attr_value(appends[attribute])
             new_attr = warp + '\n' + append_attr
             nc_destination.__setattr__(attribute, new_attr)
         else:
-            # hack for bypassing unicode bug
-            try:
-                append_attr = appends[attribute].encode('latin-1')
-            except (AttributeError, UnicodeEncodeError):
-                append_attr = appends[attribute]
+            append_attr = _attr_value(appends[attribute])
             nc_destination.__setattr__(attribute, append_attr)
 
 
@@ -740,7 +1594,7 @@ def nc_copy_variables_structure(nc_source, nc_destination, includes=[],
             warp = 'fill_value' not in create_args[var_src].keys()
             if hasattr(ncvar1, '_FillValue') and warp:
                 create_args[var_src]['fill_value'] = ncvar1._FillValue
-            if not create_args[var_src].has_key('chunksizes'):
+            if 'chunksizes' not in create_args[var_src]:
                 # If dimensions size have changed it is not safe to copy
                 # chunksizes.
                 for one_dimension in new_dimensions[var_src]:
@@ -833,10 +1687,90 @@ def nc_copy_variables_attributes(nc_source, nc_destination, includes=[],
                       attr_defaults[var_src], attr_appends[var_src])
 
 
+#
+def _chunk_blocks(shape, chunks, itemsize, max_bytes):
+    """Block shape for streaming over a chunked array.
+
+    Parameters
+    ----------
+    shape - tuple of int
+    chunks - list of int or None
+        chunk shape, None or 'contiguous' for contiguous storage.
+    itemsize - int
+    max_bytes - int
+
+    Returns
+    -------
+    out - list of int
+
+    Notes
+    -----
+    The block starts as one chunk (one row of the last dimension for
+    contiguous storage) and is grown by whole chunks, from the last
+    dimension to the first, as long as it fits in max_bytes. A dimension
+    is only grown once all the following dimensions are complete, so that
+    blocks cover contiguous runs of chunks.
+
+    """
+
+    if len(shape) == 0:
+        return []
+    if chunks is None or chunks == 'contiguous':
+        chunks = [1] * (len(shape) - 1) + [shape[-1]]
+    block = [max(1, min(c, n)) for c, n in zip(chunks, shape)]
+    for i in range(len(shape) - 1, -1, -1):
+        others = itemsize * int(np.prod(block)) // block[i]
+        warp = (max_bytes // max(others, 1)) // block[i] * block[i]
+        block[i] = min(shape[i], max(block[i], warp))
+        if block[i] < shape[i]:
+            break
+    return block
+
+
+#
+def _slices_region(slices, shape):
+    # Start, step and length of each dimension selected by a tuple of slices.
+    if slices is None:
+        slices = ()
+    if not isinstance(slices, tuple):
+        slices = (slices,)
+    if len(slices) > len(shape):
+        raise NetCDFError("Too many slices for variable dimensions.")
+    region = []
+    for i, n in enumerate(shape):
+        if i < len(slices):
+            one_slice = slices[i]
+        else:
+            one_slice = slice(None, None, None)
+        if not isinstance(one_slice, slice):
+            raise NotImplementedError("Slice copies only support slices.")
+        start, stop, step = one_slice.indices(n)
+        region.append((start, step, len(range(start, stop, step))))
+    return region
+
+
+#
+def _block_ranges(length, block, region, chunk):
+    # (start, length) of the blocks along one dimension of a region of
+    # selected elements. Block boundaries are aligned on the source chunks,
+    # so that a chunk at the edge of two blocks is not read twice.
+    if not length:
+        return []
+    start, step = region[0:2]
+    first = block
+    if (chunk is not None) and (step > 0) and (start % chunk):
+        warp = (chunk - start % chunk + step - 1) // step
+        first = max(1, min(block, warp + block - max(1, chunk // step)))
+    ranges = [(0, min(first, length))]
+    for k in range(first, length, block):
+        ranges.append((k, min(block, length - k)))
+    return ranges
+
+
 #
 def nc_copy_variables_data(nc_source, nc_destination, includes=[], excludes=[],
                            renames=None, source_slices=None,
-                           destination_slices=None):
+                           destination_slices=None, max_bytes=2 ** 27):
     """Copy NetCDF variables data.
 
     Parameters
@@ -846,6 +1780,20 @@ def nc_copy_variables_data(nc_source, nc_destination, includes=[], excludes=[],
     includes - list of str
     excludes - list of str
     renames - dict
+    source_slices - dict
+        for each source variable, a tuple of slices to copy from.
+    destination_slices - dict
+        for each destination variable, a tuple of slices to copy to.
+    max_bytes - int
+        approximate memory bound for each read/write.
+
+    Notes
+    -----
+    Data is streamed in blocks following the chunk layout of the source
+    variable, grown up to max_bytes, so variables are never fully loaded.
+    Missing trailing slices select whole dimensions. The stop of the
+    destination slices can be omitted, it then follows the number of
+    elements selected in the source (e.g. to fill an unlimited dimension).
 
     """
 
@@ -871,11 +1819,76 @@ def nc_copy_variables_data(nc_source, nc_destination, includes=[], excludes=[],
         if renames[var_src] not in vars_dest:
             raise NotImplementedError("Variable not found in destination file.")
         ncvar2 = nc_destination.variables[renames[var_src]]
-        if var_src in source_slices:
-            raise NotImplementedError("Slice copies.")
-        if renames[var_src] in destination_slices:
-            raise NotImplementedError("Slice copies.")
-        ncvar2[...] = ncvar1[...]
+        if len(ncvar1.shape) == 0:
+            ncvar2[...] = ncvar1[...]
+            continue
+        region1 = _slices_region(source_slices.get(var_src), ncvar1.shape)
+        # Destination slices are resolved against the destination shape. An
+        # ascending slice without stop takes the length of the source region
+        # from its start (which may be past the end), so that unlimited
+        # dimensions can grow.
+        warp = destination_slices.get(renames[var_src])
+        if warp is None:
+            warp = ()
+        elif not isinstance(warp, tuple):
+            warp = (warp,)
+        region2 = []
+        for i, (start1, step1, length) in enumerate(region1):
+            if i < len(warp):
+                one_slice = warp[i]
+            else:
+                one_slice = slice(None, None, None)
+            if not isinstance(one_slice, slice):
+                raise NotImplementedError("Slice copies only support slices.")
+            n = ncvar2.shape[i]
+            step2 = one_slice.step or 1
+            if (step2 > 0) and (one_slice.stop is None):
+                start2 = one_slice.start or 0
+                if start2 < 0:
+                    start2 = max(0, start2 + n)
+            else:
+                start2, stop2, step2 = one_slice.indices(n)
+                if len(range(start2, stop2, step2)) != length:
+                    msg = "Source and destination slices shapes differ: %s."
+                    raise NetCDFError(msg % (var_src,))
+            region2.append((start2, step2, length))
+        shape = [length for start, step, length in region1]
+        try:
+            chunks = ncvar1.chunking()
+        except Exception:
+            chunks = None
+        if not isinstance(ncvar1.dtype, np.dtype):
+            # Variable length types (e.g. str) have no item size
+            chunks = None
+            block = shape
+        elif chunks in [None, 'contiguous']:
+            chunks = None
+            block = _chunk_blocks(shape, chunks, ncvar1.dtype.itemsize,
+                                  max_bytes)
+        else:
+            # chunks in the source, expressed in selected elements
+            warp = [max(1, c // abs(r[1])) for c, r in zip(chunks, region1)]
+            block = _chunk_blocks(shape, warp, ncvar1.dtype.itemsize,
+                                  max_bytes)
+        ranges = []
+        for i in range(len(shape)):
+            warp = None if chunks is None else chunks[i]
+            ranges.append(_block_ranges(shape[i], block[i], region1[i], warp))
+        for corner in itertools.product(*ranges):
+            slices1 = []
+            slices2 = []
+            for i, (k, n) in enumerate(corner):
+                for slices, region in [(slices1, region1), (slices2, region2)]:
+                    start, step = region[i][0:2]
+                    first = start + k * step
+                    last = first + (n - 1) * step
+                    if step > 0:
+                        slices.append(slice(first, last + 1, step))
+                    elif last == 0:
+                        slices.append(slice(first, None, step))
+                    else:
+                        slices.append(slice(first, last - 1, step))
+            ncvar2[tuple(slices2)] = ncvar1[tuple(slices1)]
 
 
 #
@@ -886,37 +1899,738 @@ def nc_copy(nc_source, nc_destination, timely=None, spatially=None, history_log=
     ----------
     nc_source - netCDF4.Dataset
     nc_destination - netCDF4.Dataset
-    timely - timely
-    spatially - spatially
+    timely - timely Period
+    spatially - lon/lat box, lon/lat points or geometry
+        see nc_subdomain_bounds.
     history_log - str
 
     Notes
     -----
-    This is completely out of date.
+    Data is streamed with nc_copy_variables_data, a region across the
+    first longitude of a global grid is copied as two hyperslabs. For
+    points, the bounding box of their grid cells is copied.
 
     """
 
-    bounds_dict = nc.nc_subdomain_bounds(nc_source, spatially)
-    # Create netCDF dimensions
-    excludes = []
-    for k, v in iteritems(bounds_dict):
-        nc1.createDimension(k, v.stop - v.start)
-        excludes.append(k)
-    nc_copy_dimensions(nc_source, nc_destination, excludes=excludes)
+    bounds = {}
+    if spatially is not None:
+        bounds = nc_subdomain_bounds(nc_source, spatially)
+    if timely:
+        warp = _time_subset(nc_source, timely)
+        if not isinstance(warp, slice):
+            raise NotImplementedError("Non contiguous time subset.")
+        bounds['time'] = [warp]
+    reshapes = {}
+    for dim, dim_slices in bounds.items():
+        if dim == 'time' and nc_source.dimensions[dim].isunlimited():
+            continue
+        reshapes[dim] = sum([x.stop - x.start for x in dim_slices])
+    nc_copy_dimensions(nc_source, nc_destination, reshapes=reshapes)
 
     # 2.6.2. Description of file contents
     if history_log:
-        nc_append_gattr(nc_source, nc_destination, 'history', history_log)
-        nc_copy_gattrs(nc_source, nc_destination, excludes=['history'])
+        nc_copy_attrs(nc_source, nc_destination,
+                      appends={'history': history_log})
     else:
-        nc_copy_gattrs(nc_source, nc_destination)
+        nc_copy_attrs(nc_source, nc_destination)
 
     # Create netCDF variables
+    nc_copy_variables_structure(nc_source, nc_destination,
+                                create_args={'_global': {'zlib': True}})
+    nc_copy_variables_attributes(nc_source, nc_destination)
     for variable in nc_source.variables.keys():
-        nc_copy_variable_structure(nc_source, nc_destination, variable, zlib=True)
-        nc_copy_variable_attributes(nc_source, nc_destination, variable)
-        var1 = nc_destination.variables[variable]
-        var1[...] = nc_get_data(nc_source, variable, timely, spatially)
+        dims = nc_source.variables[variable].dimensions
+        source_slices = [slice(None, None, None)] * len(dims)
+        destination_slices = [slice(None, None, None)] * len(dims)
+        split_axis = None
+        split_slices = [None]
+        for i, dim in enumerate(dims):
+            if dim not in bounds:
+                continue
+            if len(bounds[dim]) == 1:
+                source_slices[i] = bounds[dim][0]
+            else:
+                split_axis = i
+                split_slices = bounds[dim]
+        offset = 0
+        for split_slice in split_slices:
+            if split_axis is not None:
+                source_slices[split_axis] = split_slice
+                destination_slices[split_axis] = slice(offset, None)
+                offset += split_slice.stop - split_slice.start
+            nc_copy_variables_data(
+                nc_source, nc_destination, includes=[variable],
+                source_slices={variable: tuple(source_slices)},
+                destination_slices={variable: tuple(destination_slices)})
+
+
+#
+def rechunk(nc_files, nc_destination, chunksizes, var_names=None,
+            create_args=None, max_bytes=2 ** 27, history_log=''):
+    """Copy NetCDF files with a new chunking and compression layout.
+
+    Parameters
+    ----------
+    nc_files - str or list of str
+        files sorted in time, concatenated along time (e.g. monthly files
+        into a yearly file).
+    nc_destination - netCDF4.Dataset
+    chunksizes - tuple of int or dict
+        chunk shape of the copied variables, or a chunk shape for each
+        variable, e.g. (8760, 16, 16). Chunks larger than a dimension are
+        reduced to the dimension size.
+    var_names - list of str
+        time dependent variables to copy, defaults to all of them.
+    create_args - dict
+        see nc_copy_variables_structure, defaults to zlib compression.
+    max_bytes - int
+        memory bound of the data buffer.
+    history_log - str
+
+    Notes
+    -----
+    Variables are read through MultiFileVariable in blocks of whole
+    destination chunks grown up to max_bytes (half of it for the read and
+    half for the concatenation across files), so each destination chunk
+    is compressed once. Times are converted to the units of the first
+    file. Variables without a time dimension are copied from the first
+    file. The time dimension stays unlimited if it is in the first file,
+    so the copy can still be appended to.
+
+    """
+
+    if isinstance(nc_files, str):
+        nc_files = [nc_files]
+    dataset_pool.invalidate(nc_destination.filepath())
+    if create_args is None:
+        create_args = {'_global': {'zlib': True}}
+    create_args = dict([(key, dict(value))
+                        for key, value in create_args.items()])
+    with dataset_pool.open(nc_files[0]) as nc_source:
+        time_variables = nc_variables_with_dimension(nc_source, 'time')
+        time_bounds = getattr(nc_source.variables['time'], 'bounds', None)
+        if var_names is None:
+            var_names = [var_name for var_name in time_variables
+                         if var_name not in ['time', 'time_vectors',
+                                             time_bounds]]
+        multi_variables = {}
+        for var_name in var_names:
+            multi_variables[var_name] = MultiFileVariable(nc_files, var_name)
+        time_multi = MultiFileVariable(nc_files, 'time')
+        nt = time_multi.shape[0]
+        includes = [var_name for var_name in nc_source.variables.keys()
+                    if (var_name not in time_variables) or
+                    (var_name in var_names) or
+                    (var_name in ['time', 'time_vectors', time_bounds])]
+        for var_name in var_names:
+            if isinstance(chunksizes, dict):
+                chunks = chunksizes[var_name]
+            else:
+                chunks = chunksizes
+            shape = multi_variables[var_name].shape
+            if len(chunks) != len(shape):
+                msg = "Chunk shape does not match variable: %s."
+                raise NetCDFError(msg % (var_name,))
+            if var_name not in create_args:
+                create_args[var_name] = {}
+            create_args[var_name]['chunksizes'] = tuple(
+                [max(1, min(c, n)) for c, n in zip(chunks, shape)])
+        if nc_source.dimensions['time'].isunlimited():
+            nc_copy_dimensions(nc_source, nc_destination)
+        else:
+            nc_copy_dimensions(nc_source, nc_destination,
+                               reshapes={'time': nt})
+        if history_log:
+            nc_copy_attrs(nc_source, nc_destination,
+                          appends={'history': history_log})
+        else:
+            nc_copy_attrs(nc_source, nc_destination)
+        nc_copy_variables_structure(nc_source, nc_destination,
+                                    includes=includes, create_args=create_args)
+        nc_copy_variables_attributes(nc_source, nc_destination,
+                                     includes=includes)
+        static_variables = [var_name for var_name in includes
+                            if var_name not in time_variables]
+        if static_variables:
+            nc_copy_variables_data(nc_source, nc_destination,
+                                   includes=static_variables,
+                                   max_bytes=max_bytes)
+    nc_destination.variables['time'][:] = time_multi.time
+    if 'time_vectors' in includes:
+        nc_destination.variables['time_vectors'][:, :] = \
+            time_multi.time_vectors
+    if time_bounds in includes:
+        for nc_file, time_slice in time_multi.file_slices():
+            with dataset_pool.open(nc_file) as nc1:
+                time1 = nc1.variables['time']
+                scale, offset = _time_units_conversion(
+                    time1.units, time_multi.time_units, time_multi.calendar)
+                warp = nc1.variables[time_bounds][...]
+                nc_destination.variables[time_bounds][time_slice, ...] = \
+                    warp * scale + offset
+    for var_name in var_names:
+        var1 = multi_variables[var_name]
+        var2 = nc_destination.variables[var_name]
+        chunks = var2.chunking()
+        if chunks == 'contiguous':
+            chunks = None
+        elif int(np.prod(chunks)) * var1.dtype.itemsize > max_bytes // 2:
+            msg = "Chunks of %s do not fit in max_bytes."
+            raise NetCDFError(msg % (var_name,))
+        block = _chunk_blocks(var1.shape, chunks, var1.dtype.itemsize,
+                              max_bytes // 2)
+        ranges = [range(0, n, b) for n, b in zip(var1.shape, block)]
+        for corner in itertools.product(*ranges):
+            slices = tuple([slice(k, min(k + b, n))
+                            for k, b, n in zip(corner, block, var1.shape)])
+            var2[slices] = var1[slices]
+
+
+def _direct_chunk_copy(h5_source, h5_destination, offset):
+    # Copy the compressed chunks of an HDF5 dataset into another one, shifted
+    # by offset along the first dimension, without decompressing them.
+    for k in range(h5_source.id.get_num_chunks()):
+        chunk_offset = h5_source.id.get_chunk_info(k).chunk_offset
+        filter_mask, chunk = h5_source.id.read_direct_chunk(chunk_offset)
+        warp = (chunk_offset[0] + offset,) + tuple(chunk_offset[1:])
+        h5_destination.id.write_direct_chunk(warp, chunk, filter_mask)
+
+
+#
+def nc_stitch_time_parts(part_files, nc_file, nc_format='NETCDF4',
+                         max_bytes=2 ** 27):
+    """Concatenate files holding consecutive time ranges of one output.
+
+    Parameters
+    ----------
+    part_files - list of str
+        files sorted in time, with the same structure and time as the
+        first dimension of time dependent variables.
+    nc_file - str
+    nc_format - str
+    max_bytes - int
+        see nc_copy_variables_data.
+
+    Notes
+    -----
+    With h5py, chunks of time dependent variables are copied still
+    compressed when all the parts share the same chunk shape and every
+    part but the last holds a whole number of time chunks, so stitching
+    costs little more than the disk I/O. Otherwise the time slabs are
+    copied in order with nc_copy_variables_data.
+
+    """
+
+    nc_parts = [netCDF4.Dataset(part_file, 'r') for part_file in part_files]
+    try:
+        nc_source = nc_parts[0]
+        lengths = [len(nc_part.dimensions['time']) for nc_part in nc_parts]
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        time_variables = nc_variables_with_dimension(nc_source, 'time')
+        create_args = {}
+        direct_variables = []
+        for var_name in nc_source.variables.keys():
+            var1 = nc_source.variables[var_name]
+            filters = var1.filters()
+            if filters is None:
+                filters = {}
+            create_args[var_name] = {}
+            for key in ['zlib', 'complevel', 'shuffle', 'fletcher32']:
+                if key in filters:
+                    create_args[var_name][key] = filters[key]
+            chunking = var1.chunking()
+            if chunking in [None, 'contiguous']:
+                continue
+            create_args[var_name]['chunksizes'] = chunking
+            if (var_name not in time_variables) or (h5py is None):
+                continue
+            if var1.dimensions[0] != 'time':
+                continue
+            for nc_part in nc_parts:
+                if nc_part.variables[var_name].chunking() != chunking:
+                    break
+            else:
+                if not (offsets[1:-1] % chunking[0]).any():
+                    direct_variables.append(var_name)
+        reshapes = {}
+        if not nc_source.dimensions['time'].isunlimited():
+            reshapes['time'] = int(offsets[-1])
+        dataset_pool.invalidate(nc_file)
+        nc1 = netCDF4.Dataset(nc_file, 'w', format=nc_format)
+        try:
+            nc_copy_dimensions(nc_source, nc1, reshapes=reshapes)
+            nc_copy_attrs(nc_source, nc1)
+            nc_copy_variables_structure(nc_source, nc1,
+                                        create_args=create_args)
+            nc_copy_variables_attributes(nc_source, nc1)
+            warp = [var_name for var_name in nc_source.variables.keys()
+                    if var_name not in time_variables]
+            if warp:
+                nc_copy_variables_data(nc_source, nc1, includes=warp,
+                                       max_bytes=max_bytes)
+            warp = [var_name for var_name in time_variables
+                    if var_name not in direct_variables]
+            for k, nc_part in enumerate(nc_parts):
+                for var_name in warp:
+                    axis = nc_part.variables[var_name].dimensions.index('time')
+                    destination_slices = [slice(None)] * (axis + 1)
+                    destination_slices[axis] = slice(int(offsets[k]), None)
+                    nc_copy_variables_data(
+                        nc_part, nc1, includes=[var_name],
+                        destination_slices={var_name:
+                                            tuple(destination_slices)},
+                        max_bytes=max_bytes)
+        finally:
+            nc1.close()
+    finally:
+        for nc_part in nc_parts:
+            nc_part.close()
+    if not direct_variables:
+        return
+    h5_destination = h5py.File(nc_file, 'r+')
+    try:
+        for var_name in direct_variables:
+            dataset = h5_destination[var_name]
+            if dataset.shape[0] != offsets[-1]:
+                dataset.resize(int(offsets[-1]), axis=0)
+            for k, part_file in enumerate(part_files):
+                h5_source = h5py.File(part_file, 'r')
+                try:
+                    _direct_chunk_copy(h5_source[var_name], dataset,
+                                       int(offsets[k]))
+                finally:
+                    h5_source.close()
+    finally:
+        h5_destination.close()
+
+
+#
+def _multidate_to_num(mdate, time_units):
+    # Encode dates as numbers in CF 'units since date' time units, in the
+    # calendar of the dates.
+    time_unit, time_vector, time_zone = cf_decode_time_since(time_units)
+    calendar = mdate._unique_calendars[0]
+    reference_date = ty.Date(ma.array(time_vector, mask=[False] * 6),
+                             calendar)
+    reference_year = min(time_vector[0],
+                         ma.getdata(mdate.times[..., 0]).min())
+    seconds = mdate.second_ordinals(reference_year)
+    seconds = seconds - reference_date.second_ordinals(reference_year)[0]
+    seconds_per_unit = {'day': 86400.0, 'hour': 3600.0, 'minute': 60.0,
+                        'second': 1.0}
+    return seconds / seconds_per_unit[time_unit]
+
+
+#
+def _resampling_periods(tseries, deltat, left_open=False, right_open=True):
+    """Regular periods covering a time series.
+
+    Parameters
+    ----------
+    tseries - timely TimeSeries
+    deltat - timely DeltaT
+    left_open - bool
+    right_open - bool
+
+    Returns
+    -------
+    out - timely MultiPeriod
+
+    Notes
+    -----
+    Periods are aligned on the beginning of the time unit above the
+    resolution of deltat (e.g. 6-hourly periods start at 00:00, daily
+    periods on the first day of the month, monthly periods in january).
+
+    """
+
+    keys = tseries.second_ordinals()
+    first_date = tseries[int(np.argmin(keys))]
+    last_date = tseries[int(np.argmax(keys))]
+    resolution = np.nonzero(ma.getdata(deltat.times[0, :]))[0][-1]
+    warp = ma.getdata(first_date.times[0, 0:max(resolution, 1)])
+    calendar = first_date.calendars[0]
+    initial_date = ty.implicit_period([int(x) for x in warp],
+                                      calendar).initial_date()
+    if left_open:
+        initial_date = initial_date - deltat
+    # One deltat past the last date, so that a single date still makes a
+    # period, empty periods at the end are dropped by nc_resample.
+    period = ty.explicit_period(initial_date, last_date + deltat)
+    periods = period.regular_division(deltat, None, deltat)
+    periods.left_open[...] = left_open
+    periods.right_open[...] = right_open
+    return periods
+
+
+#
+def _time_reduce(var1, time_indices, statistic, max_bytes):
+    # Reduce a variable along its time axis over a subset of time indices,
+    # reading at most max_bytes (in float64) at once.
+    time_axis = var1.dimensions.index('time')
+    shape = list(var1.shape)
+    del shape[time_axis]
+    step_bytes = 8 * int(np.prod(shape))
+    block = max(1, max_bytes // max(step_bytes, 1))
+    if isinstance(time_indices, slice):
+        blocks = [slice(k, min(k + block, time_indices.stop))
+                  for k in range(time_indices.start, time_indices.stop, block)]
+    else:
+        blocks = [time_indices[0][k:k + block]
+                  for k in range(0, time_indices[0].size, block)]
+    if statistic == 'min':
+        accumulator = np.empty(shape)
+        accumulator.fill(np.inf)
+    elif statistic == 'max':
+        accumulator = np.empty(shape)
+        accumulator.fill(-np.inf)
+    else:
+        accumulator = np.zeros(shape)
+    count = np.zeros(shape, dtype='int64')
+    slices = [slice(None, None, None)] * len(var1.dimensions)
+    for time_block in blocks:
+        slices[time_axis] = time_block
+        data = ma.array(var1[tuple(slices)])
+        valid = ~ma.getmaskarray(data)
+        values = np.asarray(ma.getdata(data), dtype='float64')
+        count += valid.sum(axis=time_axis)
+        if statistic == 'min':
+            warp = np.where(valid, values, np.inf).min(axis=time_axis)
+            accumulator = np.minimum(accumulator, warp)
+        elif statistic == 'max':
+            warp = np.where(valid, values, -np.inf).max(axis=time_axis)
+            accumulator = np.maximum(accumulator, warp)
+        else:
+            accumulator += np.where(valid, values, 0).sum(axis=time_axis)
+    if statistic == 'mean':
+        accumulator = accumulator / np.maximum(count, 1)
+    return ma.array(accumulator, mask=(count == 0))
+
+
+#
+def nc_resample(nc_source, nc_destination, var_name, deltat=None,
+                statistic='mean', periods=None, left_open=False,
+                right_open=True, max_bytes=2 ** 27, create_args=None):
+    """Aggregate a variable over time periods.
+
+    Parameters
+    ----------
+    nc_source - netCDF4.Dataset
+    nc_destination - netCDF4.Dataset
+    var_name - str
+    deltat - timely DeltaT
+        length of regular periods (e.g. DeltaT([0, 0, 1]) for daily).
+    statistic - str
+        'mean', 'min', 'max' or 'sum'.
+    periods - timely MultiPeriod
+        periods to aggregate over, instead of regular periods.
+    left_open - bool
+    right_open - bool
+        whether regular periods exclude their initial/final date.
+    max_bytes - int
+        approximate memory bound when reading the variable.
+    create_args - dict
+        passed to nc_copy_variables_structure.
+
+    Notes
+    -----
+    Time indices of each period are found with a single binary search on
+    the time series (MultiDate.intersection_many) and the variable is
+    reduced period by period, in blocks of time steps bounded by max_bytes,
+    so the source variable is never fully in memory. Masked values are
+    ignored, a period without valid values is masked.
+
+    Regular periods are built with Period.regular_division in the calendar
+    of the source file, and periods before the first or after the last time
+    step with data are not written.
+
+    Dimensions, variables that do not depend on time and attributes are
+    copied with the nc_copy_* functions. The time of each period is its
+    initial date, with 'time_bnds' and 'time_vectors' (if in the source).
+
+    """
+
+    statistics = {'mean': 'mean', 'min': 'minimum', 'max': 'maximum',
+                  'sum': 'sum'}
+    if statistic not in statistics:
+        raise NotImplementedError("Statistic: %s" % (statistic,))
+    if create_args is None:
+        create_args = {}
+    tseries = nc_timely(nc_source)
+    flag_regular = periods is None
+    if flag_regular:
+        if deltat is None:
+            raise NetCDFError("Need either deltat or periods.")
+        if ma.getmaskarray(tseries.times[..., 0]).all():
+            raise NetCDFError("No valid time step to resample.")
+        periods = _resampling_periods(tseries, deltat, left_open, right_open)
+    list_of_indices = tseries.intersection_many(periods)
+    sizes = []
+    for time_indices in list_of_indices:
+        if isinstance(time_indices, slice):
+            sizes.append(time_indices.stop - time_indices.start)
+        else:
+            sizes.append(time_indices[0].size)
+    sizes = np.array(sizes)
+    period_times = periods.times.reshape((-1, 2, 6))
+    if flag_regular:
+        nonempty = np.nonzero(sizes)[0]
+        if not nonempty.size:
+            raise NetCDFError("No time step in the resampling periods.")
+        warp = slice(nonempty[0], nonempty[-1] + 1)
+        list_of_indices = list_of_indices[warp]
+        period_times = period_times[warp, :, :]
+    calendar = periods._unique_calendars[0]
+    initial_dates = ty.MultiDate(period_times[:, 0, :], calendar)
+    final_dates = ty.MultiDate(period_times[:, 1, :], calendar)
+
+    time1 = nc_source.variables['time']
+    time_num = _multidate_to_num(initial_dates, time1.units)
+    bnds_num = _multidate_to_num(final_dates, time1.units)
+    var1 = nc_source.variables[var_name]
+    new_dtype = {}
+    if np.modf(time_num)[0].any() or np.modf(bnds_num)[0].any():
+        new_dtype['time'] = 'f8'
+    if statistic == 'mean' and var1.dtype.kind in 'iu':
+        new_dtype[var_name] = 'f4'
+
+    # Structure and attributes
+    nc_copy_attrs(nc_source, nc_destination)
+    nc_copy_dimensions(nc_source, nc_destination, excludes=['time'],
+                       defaults={'time': None, 'nv': 2})
+    static_vars = []
+    for one_var in nc_source.variables.keys():
+        if 'time' not in nc_source.variables[one_var].dimensions:
+            static_vars.append(one_var)
+    includes = static_vars + ['time', var_name]
+    if 'time_vectors' in nc_source.variables.keys():
+        includes.append('time_vectors')
+    nc_copy_variables_structure(nc_source, nc_destination, includes=includes,
+                                new_dtype=new_dtype, create_args=create_args)
+    nc_copy_variables_attributes(nc_source, nc_destination, includes=includes)
+    nc_copy_variables_data(nc_source, nc_destination, includes=static_vars)
+    time2 = nc_destination.variables['time']
+    time2.bounds = 'time_bnds'
+    time_bnds = nc_destination.createVariable('time_bnds', time2.dtype,
+                                              ('time', 'nv'))
+    var2 = nc_destination.variables[var_name]
+    cell_method = "time: %s" % (statistics[statistic],)
+    if hasattr(var2, 'cell_methods'):
+        var2.cell_methods = var2.cell_methods + ' ' + cell_method
+    else:
+        var2.cell_methods = cell_method
+
+    # Data
+    time2[:] = time_num
+    time_bnds[:, 0] = time_num
+    time_bnds[:, 1] = bnds_num
+    if 'time_vectors' in nc_destination.variables.keys():
+        tvs = nc_destination.variables['time_vectors']
+        tvs[:, :] = ma.getdata(period_times[:, 0, :])
+    time_axis = var2.dimensions.index('time')
+    slices = [slice(None, None, None)] * len(var2.dimensions)
+    for i, time_indices in enumerate(list_of_indices):
+        slices[time_axis] = i
+        var2[tuple(slices)] = _time_reduce(var1, time_indices, statistic,
+                                           max_bytes)
+
+
+#
+def _time_sample(var1, var2, start, step, max_bytes):
+    # Copy every step-th time step of a variable from start. Time steps in
+    # the same source chunk are read as one contiguous range (which has to
+    # be decompressed anyway) and strided in memory, time chunks without
+    # samples are not read.
+    time_axis = var1.dimensions.index('time')
+    indices = np.arange(start, var1.shape[time_axis], step)
+    if not indices.size:
+        return
+    try:
+        chunks = var1.chunking()
+    except Exception:
+        chunks = None
+    if chunks in [None, 'contiguous']:
+        chunks = None
+        time_chunk = 1
+    else:
+        chunks = list(chunks)
+        time_chunk = chunks[time_axis]
+    groups = indices // time_chunk
+    warp = np.nonzero(np.diff(groups))[0] + 1
+    for k0, k1 in zip(np.concatenate([[0], warp]),
+                      np.concatenate([warp, [indices.size]])):
+        first = indices[k0]
+        last = indices[k1 - 1]
+        shape = list(var1.shape)
+        shape[time_axis] = last - first + 1
+        if chunks is not None:
+            chunks[time_axis] = shape[time_axis]
+        block = _chunk_blocks(shape, chunks, var1.dtype.itemsize, max_bytes)
+        if chunks is None:
+            block[time_axis] = shape[time_axis]
+        ranges = [range(0, n, b) for n, b in zip(shape, block)]
+        ranges[time_axis] = [0]
+        for corner in itertools.product(*ranges):
+            slices1 = [slice(k, min(k + b, n))
+                       for k, b, n in zip(corner, block, shape)]
+            slices2 = list(slices1)
+            slices1[time_axis] = slice(first, last + 1)
+            slices2[time_axis] = slice(k0, k1)
+            warp = [slice(None, None, None)] * len(shape)
+            warp[time_axis] = slice(None, None, step)
+            var2[tuple(slices2)] = var1[tuple(slices1)][tuple(warp)]
+
+
+#
+def nc_sample(nc_source, nc_destination, start=0, step=1, var_names=None,
+              max_bytes=2 ** 27, create_args=None, history_log=''):
+    """Copy every step-th time step of a NetCDF file.
+
+    Parameters
+    ----------
+    nc_source - netCDF4.Dataset
+    nc_destination - netCDF4.Dataset
+    start - int
+        first time index.
+    step - int
+        e.g. 6 for 6 hourly samples of hourly data.
+    var_names - list of str
+        time dependent variables to copy (time, time_vectors and the time
+        bounds are always copied), defaults to all of them.
+    max_bytes - int
+        approximate memory bound for each read.
+    create_args - dict
+        passed to nc_copy_variables_structure, defaults to zlib for all
+        the variables.
+    history_log - str
+        appended to the history attribute.
+
+    Notes
+    -----
+    Only the source time chunks holding samples are read, each of them
+    once, so files chunked over the whole month (see
+    cfsr.optimal_chunksizes) are streamed with one read per spatial block.
+    Sampled variables keep the spatial chunking of the source, with time
+    chunks shortened to the number of samples.
+
+    """
+
+    dataset_pool.invalidate(nc_destination.filepath())
+    if create_args is None:
+        create_args = {'_global': {'zlib': True}}
+    else:
+        create_args = dict(create_args)
+    time1 = nc_source.variables['time']
+    nt = len(range(start, time1.shape[0], step))
+    coordinates = ['time', 'time_vectors', getattr(time1, 'bounds', None)]
+    includes = []
+    time_vars = []
+    for one_var in nc_source.variables.keys():
+        var1 = nc_source.variables[one_var]
+        if 'time' not in var1.dimensions:
+            includes.append(one_var)
+            continue
+        if var_names is not None:
+            if one_var not in var_names and one_var not in coordinates:
+                continue
+        includes.append(one_var)
+        time_vars.append(one_var)
+        try:
+            chunks = var1.chunking()
+        except Exception:
+            chunks = 'contiguous'
+        if chunks != 'contiguous' and one_var not in create_args:
+            chunks = list(chunks)
+            warp = var1.dimensions.index('time')
+            chunks[warp] = max(1, min(chunks[warp], nt))
+            create_args[one_var] = {'chunksizes': chunks}
+
+    if history_log:
+        nc_copy_attrs(nc_source, nc_destination,
+                      appends={'history': history_log})
+    else:
+        nc_copy_attrs(nc_source, nc_destination)
+    if nc_source.dimensions['time'].isunlimited():
+        nc_copy_dimensions(nc_source, nc_destination)
+    else:
+        nc_copy_dimensions(nc_source, nc_destination, reshapes={'time': nt})
+    nc_copy_variables_structure(nc_source, nc_destination, includes=includes,
+                                create_args=create_args)
+    nc_copy_variables_attributes(nc_source, nc_destination, includes=includes)
+    static_vars = [x for x in includes if x not in time_vars]
+    if static_vars:
+        nc_copy_variables_data(nc_source, nc_destination,
+                               includes=static_vars, max_bytes=max_bytes)
+    for one_var in time_vars:
+        _time_sample(nc_source.variables[one_var],
+                     nc_destination.variables[one_var], start, step,
+                     max_bytes)
+
+
+#
+def _nc_sample_file(arguments):
+    # Single argument wrapper of nc_sample for map functions.
+    nc_file, nc_destination, nc_format, kwargs = arguments
+    nc1 = netCDF4.Dataset(nc_file, 'r')
+    try:
+        dataset_pool.invalidate(nc_destination)
+        nc2 = netCDF4.Dataset(nc_destination, 'w', format=nc_format)
+        try:
+            nc_sample(nc1, nc2, **kwargs)
+        finally:
+            nc2.close()
+    finally:
+        nc1.close()
+    return nc_destination
+
+
+#
+def nc_sample_files(nc_files, nc_destinations, start=0, step=1,
+                    var_names=None, nc_format='NETCDF4', max_bytes=2 ** 27,
+                    history_log='', processes=None, map_function=None):
+    """Copy every step-th time step of many NetCDF files in parallel.
+
+    Parameters
+    ----------
+    nc_files - list of str
+    nc_destinations - list of str
+        one destination file for each source file.
+    start - int
+    step - int
+    var_names - list of str
+    nc_format - str
+    max_bytes - int
+        approximate memory bound for each read, in each process.
+    history_log - str
+        see nc_sample.
+    processes - int
+        size of the multiprocessing pool, defaults to the number of CPUs.
+    map_function - function(function, iterable)
+        parallel map (e.g. an ipyparallel view map_sync), replaces the
+        multiprocessing pool.
+
+    Returns
+    -------
+    out - list of str
+        the destination files.
+
+    """
+
+    if len(nc_files) != len(nc_destinations):
+        raise NetCDFError("Need one destination for each file.")
+    kwargs = {'start': start, 'step': step, 'var_names': var_names,
+              'max_bytes': max_bytes, 'history_log': history_log}
+    list_of_arguments = [(nc_file, nc_destination, nc_format, kwargs)
+                         for nc_file, nc_destination
+                         in zip(nc_files, nc_destinations)]
+    if map_function is None:
+        pool = multiprocessing.Pool(processes)
+        try:
+            return pool.map(_nc_sample_file, list_of_arguments)
+        finally:
+            pool.close()
+            pool.join()
+    return list(map_function(_nc_sample_file, list_of_arguments))
 
 
 #
@@ -962,12 +2676,151 @@ def save_array(nc1, array, variable_name, datatype='', dimensions=None,
     return var1
 
 
+def _next_prime(n):
+    # Smallest prime >= n, for the number of chunk cache slots.
+    n = max(int(n), 2)
+    while any([n % d == 0 for d in range(2, int(np.sqrt(n)) + 1)]):
+        n += 1
+    return n
+
+
+def _chunk_cache_settings(var1, access_pattern, max_bytes):
+    # (size, nelems, preemption) of the chunk cache for an access pattern.
+    chunking = var1.chunking()
+    if (chunking is None) or (chunking == 'contiguous'):
+        return None
+    chunks = np.array(chunking)
+    shape = np.maximum(np.array(var1.shape), 1)
+    chunk_bytes = int(np.prod(chunks)) * var1.dtype.itemsize
+    nchunks = -(-shape // chunks)
+    if access_pattern == 'point':
+        # All the chunks along time for one point, partially read chunks
+        # are kept until the other points of the batch are read.
+        ncached = int(nchunks[0])
+        preemption = 0.0
+    elif access_pattern == 'map':
+        # All the chunks of one time step, fully read chunks are dropped.
+        ncached = int(np.prod(nchunks[1:]))
+        preemption = 1.0
+    else:
+        raise NetCDFError("Unknown access pattern: %s" % (access_pattern,))
+    ncached = max(1, min(ncached, max_bytes // max(chunk_bytes, 1)))
+    size = max(ncached * chunk_bytes, chunk_bytes)
+    return size, _next_prime(100 * ncached), preemption
+
+
+#
+def nc_set_access_pattern(var1, access_pattern, max_bytes=2 ** 28):
+    """Tune the chunk cache of a variable for an access pattern.
+
+    Parameters
+    ----------
+    var1 - netCDF4.Variable
+        time is the first dimension.
+    access_pattern - str or None
+        'point' for time series at a few grid points (var1[:, j, i]),
+        'map' for whole grids at a few time steps (var1[t, :, :]),
+        None leaves the cache unchanged.
+    max_bytes - int
+        upper bound of the cache size.
+
+    Notes
+    -----
+    With the default cache, chunks spanning a whole month are evicted
+    between two points and decompressed once per point.
+
+    """
+
+    if access_pattern is None:
+        return
+    settings = _chunk_cache_settings(var1, access_pattern, max_bytes)
+    if settings is not None:
+        var1.set_var_chunk_cache(*settings)
+
+
+#
+def _open_read(nc_file, access_pattern):
+    # Read-only handle in a with statement: shared through dataset_pool, or
+    # our own when the chunk cache is tuned, so that the cache of the other
+    # users of a shared handle is left unchanged.
+    if access_pattern is None:
+        return dataset_pool.open(nc_file)
+    return contextlib.closing(netCDF4.Dataset(nc_file, 'r'))
+
+
+#
+def nc_read_points(var1, points):
+    """Time series at multiple grid points.
+
+    Parameters
+    ----------
+    var1 - netCDF4.Variable
+        time is the first dimension.
+    points - array of int
+        indices in the other dimensions, shape (npoints, ndim - 1),
+        e.g. [[j1, i1], [j2, i2], ...].
+
+    Returns
+    -------
+    out - masked array
+        shape (nt, npoints), in the order of the points.
+
+    Notes
+    -----
+    Points are grouped by chunk and each group is read as one slab, so
+    each chunk is decompressed once per call whatever the number of
+    points it contains.
+
+    """
+
+    points = np.asarray(points, dtype=int).reshape([-1, var1.ndim - 1])
+    points = np.where(points < 0, points + np.array(var1.shape[1:]), points)
+    chunking = var1.chunking()
+    if (chunking is None) or (chunking == 'contiguous'):
+        chunks = np.ones([var1.ndim - 1], dtype=int)
+    else:
+        chunks = np.array(chunking[1:])
+    keys = points // chunks
+    order = np.lexsort(keys.T[::-1])
+    breaks = np.nonzero(np.any(np.diff(keys[order], axis=0) != 0,
+                               axis=1))[0] + 1
+    data = ma.masked_all([var1.shape[0], points.shape[0]], dtype=var1.dtype)
+    for group in np.split(order, breaks):
+        if not group.size:
+            continue
+        lower = points[group].min(axis=0)
+        upper = points[group].max(axis=0) + 1
+        warp = [slice(int(l), int(u)) for l, u in zip(lower, upper)]
+        slab = var1[tuple([slice(None)] + warp)]
+        local = points[group] - lower
+        data[:, group] = slab[(slice(None),) + tuple(local.T)]
+    return data
+
+
 #
 def open_cf_nc_file(nc_file, mode='r', var_names=None, output_type='individual',
-                    load_data=False):
+                    load_data=False, access_pattern=None):
     # output_type are either 'individual' or 'dict' (also supports 'i' or 'd')
+    # access_pattern ('point' or 'map') tunes the chunk cache of var_names.
     # Remember to close the file if load_data is False!
-    nc1 = netCDF4.Dataset(nc_file, mode)
+    # Loaded data is read through the pool of read-only handles (or a handle
+    # of our own with an access_pattern).
+    # With load_data='lazy', the file is a LazyFile (use it in a with
+    # statement) and variables are LazyVariable proxies.
+    flag_lazy = load_data == 'lazy'
+    if flag_lazy:
+        if mode != 'r':
+            raise NetCDFError("Lazy variables are read-only.")
+        load_data = False
+    flag_pool = load_data and (mode == 'r') and (access_pattern is None)
+    if flag_lazy:
+        nc1 = LazyFile(nc_file)
+    elif flag_pool:
+        nc1 = dataset_pool.acquire(nc_file)
+    else:
+        if mode != 'r':
+            dataset_pool.invalidate(nc_file)
+        nc1 = netCDF4.Dataset(nc_file, mode)
     mykeys = ['time', 'lon', 'lat']
     if var_names is not None:
         mykeys.extend(var_names)
@@ -975,15 +2828,25 @@ def open_cf_nc_file(nc_file, mode='r', var_names=None, output_type='individual',
         var_names = []
     d = {}
     d['nc'] = nc1
-    for mykey in mykeys:
-        if mykey in nc1.variables.keys():
-            if load_data:
-                d[mykey] = nc1.variables[mykey][...]
+    try:
+        for mykey in mykeys:
+            if mykey in nc1.variables.keys():
+                if mykey in var_names and flag_lazy:
+                    nc_set_access_pattern(nc1._variable(mykey),
+                                          access_pattern)
+                elif mykey in var_names:
+                    nc_set_access_pattern(nc1.variables[mykey],
+                                          access_pattern)
+                if load_data:
+                    d[mykey] = nc1.variables[mykey][...]
+                else:
+                    d[mykey] = nc1.variables[mykey]
             else:
-                d[mykey] = nc1.variables[mykey]
-        else:
-            d[mykey] = None
-    if load_data:
+                d[mykey] = None
+    finally:
+        if flag_pool:
+            dataset_pool.release(nc1)
+    if load_data and not flag_pool:
         nc1.close()
     if output_type in ['dict', 'd']:
         return d
@@ -998,20 +2861,18 @@ def open_cf_nc_file(nc_file, mode='r', var_names=None, output_type='individual',
 
 #
 def nc_detect_grid(nc_file):
-    nc1 = netCDF4.Dataset(nc_file, 'r')
-    lon1 = nc1.variables['lon'][...]
-    lat1 = nc1.variables['lat'][...]
-    lon_dimensions = lon1.dimensions
-    lat_dimensions = lat1.dimensions
-    nc1.close()
+    with dataset_pool.open(nc_file) as nc1:
+        lon1 = nc1.variables['lon'][...]
+        lat1 = nc1.variables['lat'][...]
+        lon_dimensions = nc1.variables['lon'].dimensions
+        lat_dimensions = nc1.variables['lat'].dimensions
     return geogrid.detect_grid(lon1, lat1, lon_dimensions, lat_dimensions)
 
 
 def nc_grid_warp_longitude(nc_file):
-    nc1 = netCDF4.Dataset(nc_file, 'r')
-    lon1 = nc1.variables['lon'][...]
-    lat1 = nc1.variables['lat'][...]
-    nc1.close()
+    with dataset_pool.open(nc_file) as nc1:
+        lon1 = nc1.variables['lon'][...]
+        lat1 = nc1.variables['lat'][...]
     return geogrid.grid_warp_longitude(lon1, lat1)
 
 
@@ -1028,29 +2889,30 @@ def _calendar_from_nc_dataset(nc_dataset):
 
 
 def _calendar_from_file(nc_file):
-    nc_dataset = netCDF4.Dataset(nc_file, 'r')
-    calendar = _calendar_from_nc_dataset(nc_dataset)
-    nc_dataset.close()
-    return calendar
+    with dataset_pool.open(nc_file) as nc_dataset:
+        return _calendar_from_nc_dataset(nc_dataset)
 
 
 def nt_from_multiple_files_with_calendar_check(nc_files):
     nt = 0
     nc_calendars = []
     for nc_file in nc_files:
-        nc_dataset = netCDF4.Dataset(nc_file, 'r')
-        nc_time = nc_dataset.variables['time']
-        nt += nc_time.size
-        nc_calendars.append(_calendar_from_time_variable(nc_time))
-        nc_dataset.close()
+        with dataset_pool.open(nc_file) as nc_dataset:
+            nc_time = nc_dataset.variables['time']
+            nt += nc_time.size
+            nc_calendars.append(_calendar_from_time_variable(nc_time))
     if len(set(nc_calendars)) != 1:
         raise NotImplementedError("Inconsistent calendars.")
     return nt, nc_calendars[0]
 
 
 def load_point_timeseries_from_multiple_files(nc_files, var_name, k=None,
-                                              j=None, i=None, nt=None):
+                                              j=None, i=None, nt=None,
+                                              access_pattern=None):
     # if i is provided but not j, it's a list of 2d points...
+    # For many points, nc_read_points reads each chunk once.
+    # access_pattern='point' tunes the chunk cache (see
+    # nc_set_access_pattern) of handles opened for this call only.
     calendar = None
     start_units = None
     if nt is None:
@@ -1059,44 +2921,298 @@ def load_point_timeseries_from_multiple_files(nc_files, var_name, k=None,
     data_ts = ma.masked_all([nt])
     t = 0
     for nc_file in nc_files:
-        nc_dataset = netCDF4.Dataset(nc_file, 'r')
-        nc_time = nc_dataset.variables['time']
-        if start_units is None:
-            start_units = nc_time.units
-        if calendar is None:
-            calendar = _calendar_from_time_variable(nc_time)
-        if 'time_vectors' in nc_dataset.variables.keys():
-            tvs = _time_vectors_int(nc_dataset.variables['time_vectors'][:, :])
-        else:
-            nc_datetimes = netCDF4.num2date(nc_time[:], nc_time.units,
-                                            nc_time.calendar)
-            tvs = _datetimes_to_time_vectors(nc_datetimes)
-        # Issue with 2nd dimension here, might not be always 6.
-        if tvs.shape[1] == 6:
-            tvs_ts[t:t + tvs.shape[0], :] = tvs[:, :]
-        elif tvs.shape[1] == 3:
-            tvs_ts[t:t + tvs.shape[0], 0:3] = tvs[:, :]
-        else:
-            raise NotImplementedError("Unexpected time vectors shape.")
-        nc_var = nc_dataset.variables[var_name]
-        if k is not None:
-            if j is not None:
-                data_ts[t:t + tvs.shape[0]] = nc_var[:, k, j, i]
-            elif i is not None:
-                data_ts[t:t + tvs.shape[0]] = nc_var[:, k, i]
+        with _open_read(nc_file, access_pattern) as nc_dataset:
+            nc_time = nc_dataset.variables['time']
+            if start_units is None:
+                start_units = nc_time.units
+            if calendar is None:
+                calendar = _calendar_from_time_variable(nc_time)
+            if 'time_vectors' in nc_dataset.variables.keys():
+                warp = nc_dataset.variables['time_vectors'][:, :]
+                tvs = _time_vectors_int(warp)
             else:
-                data_ts[t:t + tvs.shape[0]] = nc_var[:, k]
-        else:
-            if j is not None:
-                data_ts[t:t + tvs.shape[0]] = nc_var[:, j, i]
-            elif i is not None:
-                data_ts[t:t + tvs.shape[0]] = nc_var[:, i]
+                nc_datetimes = netCDF4.num2date(nc_time[:], nc_time.units,
+                                                nc_time.calendar)
+                tvs = _datetimes_to_time_vectors(nc_datetimes)
+            # Issue with 2nd dimension here, might not be always 6.
+            if tvs.shape[1] == 6:
+                tvs_ts[t:t + tvs.shape[0], :] = tvs[:, :]
+            elif tvs.shape[1] == 3:
+                tvs_ts[t:t + tvs.shape[0], 0:3] = tvs[:, :]
             else:
-                data_ts[t:t + tvs.shape[0]] = nc_var[:]
-        t += tvs.shape[0]
-        nc_dataset.close()
+                raise NotImplementedError("Unexpected time vectors shape.")
+            nc_var = nc_dataset.variables[var_name]
+            nc_set_access_pattern(nc_var, access_pattern)
+            if k is not None:
+                if j is not None:
+                    data_ts[t:t + tvs.shape[0]] = nc_var[:, k, j, i]
+                elif i is not None:
+                    data_ts[t:t + tvs.shape[0]] = nc_var[:, k, i]
+                else:
+                    data_ts[t:t + tvs.shape[0]] = nc_var[:, k]
+            else:
+                if j is not None:
+                    data_ts[t:t + tvs.shape[0]] = nc_var[:, j, i]
+                elif i is not None:
+                    data_ts[t:t + tvs.shape[0]] = nc_var[:, i]
+                else:
+                    data_ts[t:t + tvs.shape[0]] = nc_var[:]
+            t += tvs.shape[0]
     tvs_ts = _time_vectors_type(tvs_ts, tvs)
     # There is no check for a uniform increase in the time steps
     # The data type of returned time vectors can be float even when it should
     # be integers.
     return tvs_ts, data_ts, start_units, calendar
+
+
+#
+def _time_units_conversion(time_units, reference_units, calendar):
+    # Scale and offset converting time values from time_units to
+    # reference_units (value * scale + offset).
+    unit1, time_vector1, zone1 = cf_decode_time_since(time_units)
+    unit2, time_vector2, zone2 = cf_decode_time_since(reference_units)
+    seconds_per_unit = {'day': 86400.0, 'hour': 3600.0, 'minute': 60.0,
+                        'second': 1.0}
+    calendar = ty.calendar_from_alias(calendar)
+    date1 = ty.Date(ma.array(time_vector1, mask=[False] * 6), calendar)
+    date2 = ty.Date(ma.array(time_vector2, mask=[False] * 6), calendar)
+    reference_year = min(time_vector1[0], time_vector2[0])
+    warp = date1.second_ordinals(reference_year)[0]
+    warp = warp - date2.second_ordinals(reference_year)[0]
+    scale = seconds_per_unit[unit1] / seconds_per_unit[unit2]
+    return scale, warp / seconds_per_unit[unit2]
+
+
+#
+def _split_time_item(item, offsets):
+    # Split an index on the concatenated time axis into (file, local index)
+    # pairs, in the order of the selection.
+    nt = offsets[-1]
+    if isinstance(item, (int, np.integer)):
+        if item < 0:
+            item += nt
+        if (item < 0) or (item >= nt):
+            raise IndexError("Time index out of range.")
+        k = np.searchsorted(offsets, item, 'right') - 1
+        return [(int(k), int(item - offsets[k]))]
+    if isinstance(item, slice):
+        start, stop, step = item.indices(nt)
+        indices = np.arange(start, stop, step)
+    else:
+        indices = np.asarray(item)
+        if indices.dtype == bool:
+            indices = np.nonzero(indices)[0]
+        indices = np.where(indices < 0, indices + nt, indices)
+        if indices.size and ((indices.min() < 0) or (indices.max() >= nt)):
+            raise IndexError("Time index out of range.")
+    if not indices.size:
+        return [(0, slice(0, 0))]
+    files = np.searchsorted(offsets, indices, 'right') - 1
+    breaks = np.nonzero(np.diff(files))[0] + 1
+    groups = []
+    for run in np.split(np.arange(indices.size), breaks):
+        k = int(files[run[0]])
+        local = indices[run] - offsets[k]
+        steps = np.diff(local)
+        if isinstance(item, slice) or (steps.size and (steps == steps[0]).all()
+                                       and steps[0] != 0):
+            if local.size == 1:
+                local = slice(int(local[0]), int(local[0]) + 1)
+            elif steps[0] > 0:
+                local = slice(int(local[0]), int(local[-1]) + 1, int(steps[0]))
+            elif local[-1] == 0:
+                local = slice(int(local[0]), None, int(steps[0]))
+            else:
+                local = slice(int(local[0]), int(local[-1]) - 1, int(steps[0]))
+        groups.append((k, local))
+    return groups
+
+
+#
+class MultiFileVariable:
+    """Variable concatenated along time over multiple NetCDF files."""
+
+    def __init__(self, nc_files, var_name, access_pattern=None):
+        """Initialize MultiFileVariable.
+
+        Parameters
+        ----------
+        nc_files - list of str
+            files of consecutive time ranges (e.g. monthly files), sorted
+            by their first time step if needed.
+        var_name - str
+        access_pattern - str or None
+            'point' or 'map', see nc_set_access_pattern.
+
+        Notes
+        -----
+        Each file is opened once to index its time steps, shape and
+        calendar. Times are converted to the units of the first file.
+        Files with overlapping time ranges raise NetCDFError.
+        Reading opens only the files touched by the selection, handles are
+        shared through dataset_pool (without an access_pattern).
+
+        """
+
+        self.nc_files = list(nc_files)
+        self.var_name = var_name
+        self.access_pattern = access_pattern
+        if not self.nc_files:
+            raise NetCDFError("No files.")
+        nc_calendars = []
+        list_of_times = []
+        list_of_tvs = []
+        lengths = []
+        for nc_file in self.nc_files:
+            with dataset_pool.open(nc_file) as nc1:
+                var1 = nc1.variables[var_name]
+                time1 = nc1.variables['time']
+                calendar = _calendar_from_time_variable(time1)
+                if not nc_calendars:
+                    self.dimensions = var1.dimensions
+                    self.dtype = var1.dtype
+                    self.time_units = time1.units
+                    self.calendar = calendar
+                    self.time_axis = var1.dimensions.index('time')
+                    shape = list(var1.shape)
+                    self.attributes = {}
+                    for attribute in var1.ncattrs():
+                        self.attributes[attribute] = getattr(var1, attribute)
+                nc_calendars.append(calendar)
+                warp = list(var1.shape)
+                del warp[self.time_axis]
+                del shape[self.time_axis]
+                if (var1.dimensions != self.dimensions) or (warp != shape):
+                    msg = "Inconsistent variable shape in %s."
+                    raise NetCDFError(msg % (nc_file,))
+                shape.insert(self.time_axis, 0)
+                times = time1[:]
+                if time1.units != self.time_units:
+                    scale, offset = _time_units_conversion(time1.units,
+                                                           self.time_units,
+                                                           calendar)
+                    times = times * scale + offset
+                list_of_times.append(times)
+                if 'time_vectors' in nc1.variables.keys():
+                    tvs = nc1.variables['time_vectors'][:, :]
+                else:
+                    datetimes = netCDF4.num2date(time1[:], time1.units,
+                                                 calendar)
+                    tvs = _datetimes_to_time_vectors(datetimes)
+                list_of_tvs.append(ma.array(tvs, mask=ma.getmaskarray(tvs)))
+                lengths.append(var1.shape[self.time_axis])
+        if len(set(nc_calendars)) != 1:
+            raise NotImplementedError("Inconsistent calendars.")
+        # Files in the order of their first time step (e.g. from a glob)
+        first_times = [float(times[0]) if times.size else -np.inf
+                       for times in list_of_times]
+        order = sorted(range(len(self.nc_files)),
+                       key=lambda k: first_times[k])
+        self.nc_files = [self.nc_files[k] for k in order]
+        list_of_times = [list_of_times[k] for k in order]
+        list_of_tvs = [list_of_tvs[k] for k in order]
+        lengths = [lengths[k] for k in order]
+        previous = None
+        for nc_file, times in zip(self.nc_files, list_of_times):
+            if not times.size:
+                continue
+            if (previous is not None) and (times[0] <= previous[1][-1]):
+                msg = "Overlapping time ranges in %s and %s."
+                raise NetCDFError(msg % (previous[0], nc_file))
+            previous = (nc_file, times)
+        self.time = ma.concatenate(list_of_times)
+        self.time_vectors = _time_vectors_int(ma.concatenate(list_of_tvs))
+        self._offsets = np.concatenate([[0], np.cumsum(lengths)])
+        warp = list(shape)
+        warp[self.time_axis] = int(self._offsets[-1])
+        self.shape = tuple(warp)
+        self.ndim = len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def timely(self):
+        """Time series of the concatenated time axis.
+
+        Returns
+        -------
+        out - timely TimeSeries
+
+        """
+
+        calendar = ty.calendar_from_alias(self.calendar)
+        # timely expects a full mask array
+        tvs = ma.array(self.time_vectors,
+                       mask=ma.getmaskarray(self.time_vectors))
+        return ty.TimeSeries(tvs, calendar)
+
+    def file_slices(self):
+        """Files and the slice of the concatenated time axis they cover.
+
+        Returns
+        -------
+        out - list of (str, slice)
+
+        """
+
+        return [(nc_file, slice(int(self._offsets[k]),
+                                int(self._offsets[k + 1])))
+                for k, nc_file in enumerate(self.nc_files)]
+
+    def _read_file(self, k, item):
+        with _open_read(self.nc_files[k], self.access_pattern) as nc1:
+            var1 = nc1.variables[self.var_name]
+            nc_set_access_pattern(var1, self.access_pattern)
+            return var1[item]
+
+    def points(self, points):
+        """Time series at multiple grid points.
+
+        Parameters
+        ----------
+        points - array of int
+            see nc_read_points.
+
+        Returns
+        -------
+        out - masked array
+            shape (nt, npoints).
+
+        """
+
+        if self.time_axis != 0:
+            raise NotImplementedError("Time must be the first dimension.")
+        list_of_data = []
+        for nc_file in self.nc_files:
+            with _open_read(nc_file, self.access_pattern) as nc1:
+                var1 = nc1.variables[self.var_name]
+                nc_set_access_pattern(var1, self.access_pattern)
+                list_of_data.append(nc_read_points(var1, points))
+        return ma.concatenate(list_of_data, axis=0)
+
+    def __getitem__(self, item):
+        if not isinstance(item, tuple):
+            item = (item,)
+        if any([x is Ellipsis for x in item]):
+            i = [x is Ellipsis for x in item].index(True)
+            warp = [slice(None, None, None)] * (self.ndim - len(item) + 1)
+            item = item[:i] + tuple(warp) + item[i + 1:]
+        item = item + (slice(None, None, None),) * (self.ndim - len(item))
+        if len(item) > self.ndim:
+            raise IndexError("Too many indices.")
+        time_item = item[self.time_axis]
+        groups = _split_time_item(time_item, self._offsets)
+        list_of_data = []
+        for k, local in groups:
+            warp = list(item)
+            warp[self.time_axis] = local
+            list_of_data.append(self._read_file(k, tuple(warp)))
+        if len(list_of_data) == 1:
+            return list_of_data[0]
+        # Integer indices before the time axis remove dimensions
+        axis = self.time_axis
+        for one_item in item[:self.time_axis]:
+            if isinstance(one_item, (int, np.integer)):
+                axis -= 1
+        return ma.concatenate(list_of_data, axis=axis)
+
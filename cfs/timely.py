@@ -57,9 +57,18 @@ period = implicit_period([yyyy,mm])
 timeseries = Timeseries([[yyyy,mm,dd,hh,mn,ss],[yyyy,mm,dd,hh,mn,ss]])
 timeseries = period.regular_sample(deltat)
 
+Profiling of the calendar arithmetic (see enable_profiling):
+
+with profiling():
+    timeseries = period.regular_sample(deltat)
+    # prints calls and times of the MultiDate/Period methods, and the
+    # number of scalar calls of the vectorized calendar functions
+
 """
 
+import timeit
 import warnings
+import contextlib
 
 import numpy as np
 import numpy.ma as ma
@@ -77,6 +86,56 @@ class TimelyError(Exception):
     pass
 
 
+# Profile collecting call counts and timings, None unless profiling is
+# enabled (see enable_profiling)
+_profile = None
+# Calendars created so far, vectorized again when profiling is toggled
+_calendars = []
+
+
+#
+def _counted(function, name):
+    # Count the calls of a scalar function in the profile.
+    def counted_function(*args):
+        if _profile is not None:
+            _profile.scalar_calls[name] = _profile.scalar_calls.get(name, 0) + 1
+        return function(*args)
+    counted_function.__name__ = function.__name__
+    return counted_function
+
+
+#
+def _profiled_vectorize(function, name, **kwargs):
+    # np.vectorize counting the calls of the vectorized function, the scalar
+    # calls it dispatches and the time spent in it.
+    vfunction = np.vectorize(_counted(function, name), **kwargs)
+
+    def profiled_function(*args):
+        t = timeit.default_timer()
+        try:
+            return vfunction(*args)
+        finally:
+            if _profile is not None:
+                _profile.add(name, timeit.default_timer() - t)
+    return profiled_function
+
+
+#
+def _timed(function, name):
+    # Time a method in the profile.
+    def timed_function(*args, **kwargs):
+        t = timeit.default_timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if _profile is not None:
+                _profile.add(name, timeit.default_timer() - t)
+    timed_function.__name__ = function.__name__
+    timed_function.__doc__ = function.__doc__
+    timed_function._timely_original = function
+    return timed_function
+
+
 # Vectorize functions on lists
 def _index(some_list, value):
     return some_list.index(value)
@@ -95,6 +154,21 @@ def _get_item(some_list, item):
 _Vget_item = np.vectorize(_get_item)
 
 
+#
+def _search_bounds(keys, bounds, left_open, right_open):
+    # Start and stop indices in sorted keys for an array of (initial, final)
+    # bounds, honoring open ends.
+    left_open = np.asarray(ma.getdata(left_open), dtype=bool)
+    right_open = np.asarray(ma.getdata(right_open), dtype=bool)
+    starts = np.where(left_open,
+                      np.searchsorted(keys, bounds[:, 0], 'right'),
+                      np.searchsorted(keys, bounds[:, 0], 'left'))
+    stops = np.where(right_open,
+                     np.searchsorted(keys, bounds[:, 1], 'left'),
+                     np.searchsorted(keys, bounds[:, 1], 'right'))
+    return starts, np.maximum(starts, stops)
+
+
 #
 
 
@@ -541,22 +615,48 @@ class Calendar:
         self.fn_is_leap = fn_is_leap
         self.alias = alias
         self.cycles_alias = cycles_alias
+        self._callbacks = (year_cycles, days_in_cycle, fn_is_leap)
+        self._vectorize()
+        _calendars.append(self)
+
+        # Cache of the lookup tables returned by year_tables
+        self._year_tables = {}
+
+    def _vectorize(self):
+        # Vectorize operations on calendars, the callbacks and the vectorized
+        # functions count their calls while profiling is enabled.
+        year_cycles, days_in_cycle, fn_is_leap = self._callbacks
+        if _profile is not None:
+            year_cycles = _counted(year_cycles, year_cycles.__name__)
+            days_in_cycle = _counted(days_in_cycle, days_in_cycle.__name__)
+            if fn_is_leap is not None:
+                fn_is_leap = _counted(fn_is_leap, fn_is_leap.__name__)
+        self.year_cycles = year_cycles
+        self.days_in_cycle = days_in_cycle
+        self.fn_is_leap = fn_is_leap
 
-        # Vectorize operations on calendars
-        vec = np.vectorize
-        self._Vyear_cycles = vec(self.year_cycles, otypes=[type({})])
-        self._Vdays_in_cycle = vec(self.days_in_cycle, otypes=[type([])])
-        self._Vis_leap = vec(self.is_leap)
-        self._Vcount_cycles_in_year = vec(self.count_cycles_in_year)
-        self._Vcount_days_in_cycle = vec(self.count_days_in_cycle)
-        self._Vcount_days_in_year = vec(self.count_days_in_year)
-        self._Vith_day_in_cycle = vec(self._ith_day_in_cycle)
-        self._Vith_day_in_year = vec(self._ith_day_in_year)
-        self._Vprevious_cycle = vec(self._previous_cycle)
-        warp = self._count_cycles_in_previous_year
-        self._Vcount_cycles_in_previous_year = vec(warp)
-        warp = self._count_days_in_previous_cycle
-        self._Vcount_days_in_previous_cycle = vec(warp)
+        vectorized = [
+            ('_Vyear_cycles', self.year_cycles, {'otypes': [type({})]}),
+            ('_Vdays_in_cycle', self.days_in_cycle, {'otypes': [type([])]}),
+            ('_Vis_leap', self.is_leap, {}),
+            ('_Vcount_cycles_in_year', self.count_cycles_in_year, {}),
+            ('_Vcount_days_in_cycle', self.count_days_in_cycle, {}),
+            ('_Vcount_days_in_year', self.count_days_in_year, {}),
+            ('_Vith_day_in_cycle', self._ith_day_in_cycle, {}),
+            ('_Vith_day_in_year', self._ith_day_in_year, {}),
+            ('_Vprevious_cycle', self._previous_cycle, {}),
+            ('_Vcount_cycles_in_previous_year',
+             self._count_cycles_in_previous_year, {}),
+            ('_Vcount_days_in_previous_cycle',
+             self._count_days_in_previous_cycle, {})]
+        for name, function, kwargs in vectorized:
+            if _profile is None:
+                warp = np.vectorize(function, **kwargs)
+            else:
+                warp = _profiled_vectorize(function,
+                                           "%s.%s" % (self.alias, name),
+                                           **kwargs)
+            setattr(self, name, warp)
 
     def __str__(self):
         return self.alias
@@ -748,6 +848,158 @@ class Calendar:
         previous_cycle, previous_year = self._previous_cycle(cycle, year)
         return len(self.days_in_cycle(previous_cycle, previous_year))
 
+    def year_tables(self, initial_year, final_year):
+        """Lookup tables of cycles and days for a range of years.
+
+        Parameters
+        ----------
+        initial_year : int
+        final_year : int
+
+        Returns
+        -------
+        out1,out2,out3,out4,out5 : numpy arrays
+            days elapsed between the beginning of `initial_year` and the
+            beginning of each year (N+1), days elapsed between the beginning
+            of each year and the beginning of each cycle (N x C+2, indexed by
+            cycle value), position of each day in its cycle (N x C+1 x D+1,
+            indexed by cycle and day values, -1 where the day does not exist),
+            cycles elapsed between the beginning of `initial_year` and
+            the beginning of each year (N+1), and day values (N x C+1 x L,
+            indexed by cycle value and position, -1 past the end of a cycle).
+
+        Notes
+        -----
+        N is the number of years, C the maximum number of cycles in a year,
+        D the maximum day value and L the maximum number of days in a cycle.
+        The calendar functions are called once per year and cycle, so that
+        converting dates to ordinals does not depend on the number of dates.
+        Tables are cached on the calendar.
+
+        """
+
+        key = (int(initial_year), int(final_year))
+        if key in self._year_tables:
+            return self._year_tables[key]
+        years = range(key[0], key[1] + 1)
+        cycles_in_year = [self.count_cycles_in_year(year) for year in years]
+        days_in_cycles = []
+        for year, cycles in zip(years, cycles_in_year):
+            days_in_year = []
+            for cycle in range(1, cycles + 1):
+                days = self.days_in_cycle(cycle, year)
+                if days == float('inf'):
+                    msg = "Ordinals undefined for infinite cycles in '%s'."
+                    raise TimelyError(msg % (self.alias,))
+                days_in_year.append(list(days))
+            days_in_cycles.append(days_in_year)
+        max_cycles = max(cycles_in_year)
+        max_day = max([max(days) for days_in_year in days_in_cycles
+                       for days in days_in_year])
+        cycle_lengths = np.zeros([len(years), max_cycles + 1], dtype=myint)
+        max_length = max([len(days) for days_in_year in days_in_cycles
+                          for days in days_in_year])
+        positions = -np.ones([len(years), max_cycles + 1, max_day + 1],
+                             dtype=myint)
+        day_values = -np.ones([len(years), max_cycles + 1, max_length],
+                              dtype=myint)
+        for i, days_in_year in enumerate(days_in_cycles):
+            for j, days in enumerate(days_in_year):
+                cycle_lengths[i, j + 1] = len(days)
+                positions[i, j + 1, days] = np.arange(len(days))
+                day_values[i, j + 1, 0:len(days)] = days
+        days_before_cycle = np.zeros([len(years), max_cycles + 2], dtype=myint)
+        days_before_cycle[:, 1:] = np.cumsum(cycle_lengths, axis=1)
+        days_before_year = np.zeros([len(years) + 1], dtype=myint)
+        days_before_year[1:] = np.cumsum(days_before_cycle[:, -1])
+        cycles_before_year = np.zeros([len(years) + 1], dtype=myint)
+        cycles_before_year[1:] = np.cumsum(cycles_in_year)
+        if len(self._year_tables) > 32:
+            self._year_tables.clear()
+        self._year_tables[key] = (days_before_year, days_before_cycle,
+                                  positions, cycles_before_year, day_values)
+        return self._year_tables[key]
+
+    def _ordinal_tables(self, reference_year, ordinals, per_year):
+        # Year tables covering ordinals counted from reference_year, with
+        # the index of the reference year in the tables.
+        ordinals = np.asarray(ordinals)
+        before = max(0, -int(ordinals.min()) // per_year + 1)
+        after = max(0, int(ordinals.max()) // per_year + 1)
+        while True:
+            tables = self.year_tables(reference_year - before,
+                                      reference_year + after)
+            if per_year > 1:
+                elapsed = tables[0]
+            else:
+                elapsed = tables[3]
+            iref = before
+            warp = ordinals + elapsed[iref]
+            if (warp.min() >= 0) and (warp.max() < elapsed[-1]):
+                return tables, iref
+            before = 2 * before + 1
+            after = 2 * after + 1
+
+    def cycle_ordinals_to_dates(self, cycle_ordinals, reference_year):
+        """Years and cycles from cycle ordinals.
+
+        Parameters
+        ----------
+        cycle_ordinals : numpy array
+            cycles elapsed since the beginning of the reference year.
+        reference_year : int
+
+        Returns
+        -------
+        out1,out2 : numpy arrays
+            years and cycles.
+
+        """
+
+        cycle_ordinals = np.asarray(cycle_ordinals, dtype=myint)
+        tables, iref = self._ordinal_tables(reference_year, cycle_ordinals, 1)
+        cycles_before_year = tables[3]
+        warp = cycle_ordinals + cycles_before_year[iref]
+        iy = np.searchsorted(cycles_before_year, warp, 'right') - 1
+        years = reference_year - iref + iy
+        cycles = warp - cycles_before_year[iy] + 1
+        return years, cycles
+
+    def day_ordinals_to_dates(self, day_ordinals, reference_year):
+        """Years, cycles and days from day ordinals.
+
+        Parameters
+        ----------
+        day_ordinals : numpy array
+            days elapsed since the beginning of the reference year.
+        reference_year : int
+
+        Returns
+        -------
+        out1,out2,out3 : numpy arrays
+            years, cycles and days.
+
+        """
+
+        day_ordinals = np.asarray(day_ordinals, dtype=myint)
+        # A year has at least a few hundred days in usual calendars, the
+        # tables are extended if needed.
+        tables, iref = self._ordinal_tables(reference_year, day_ordinals, 300)
+        days_before_year, days_before_cycle = tables[0:2]
+        day_values = tables[4]
+        warp = day_ordinals + days_before_year[iref]
+        iy = np.searchsorted(days_before_year, warp, 'right') - 1
+        warp = warp - days_before_year[iy]
+        cycles = np.zeros(warp.shape, dtype=myint)
+        # Cycles are few, this loops on cycle values and not on dates
+        for c in range(1, days_before_cycle.shape[1] - 1):
+            cycles += warp >= days_before_cycle[iy, c + 1]
+        cycles += 1
+        positions = warp - days_before_cycle[iy, cycles]
+        days = day_values[iy, cycles, positions]
+        years = reference_year - iref + iy
+        return years, cycles, days
+
 
 #
 # Built-in calendars
@@ -2281,9 +2533,15 @@ class MultiDate(_CollectionTime):
             self.calendars = ma.empty(self.times.shape[:-1],
                                       dtype=type(Calendar))
             self.calendars[...] = calendars
+            self._unique_calendars = np.array([calendars])
         else:
             self.calendars = calendars
-        self._unique_calendars = np.unique(self.calendars)
+            # Calendars are not orderable, np.unique can not sort them
+            warp = []
+            for cal in np.ravel(ma.getdata(self.calendars)):
+                if cal not in warp:
+                    warp.append(cal)
+            self._unique_calendars = np.array(warp)
         # Look for non-numerical values :
         try:
             (fractional, integral) = np.modf(self.times)
@@ -2564,6 +2822,103 @@ class MultiDate(_CollectionTime):
             ma_day_number_in_year = ma_day_number_in_year + warp1
         return ma_day_number_in_year + self.day_number_in_cycle()
 
+    def _ordinals(self, reference_year=None):
+        # Ordinals and cycle/day counts from the calendar lookup tables.
+        years = np.array(ma.getdata(self.times[..., 0]), dtype=myint)
+        cycles = np.array(ma.getdata(self.times[..., 1]), dtype=myint)
+        days = np.array(ma.getdata(self.times[..., 2]), dtype=myint)
+        if reference_year is None:
+            reference_year = years.min()
+        initial_year = min(years.min(), reference_year)
+        final_year = max(years.max(), reference_year)
+        ordinals = {}
+        for key in ['day', 'cycle', 'day_position', 'days_in_cycle',
+                    'days_in_year', 'cycles_in_year']:
+            ordinals[key] = np.zeros(years.shape, dtype=myint)
+        for cal in self._unique_calendars:
+            ijs = np.where(self.calendars == cal)
+            tables = cal.year_tables(initial_year, final_year)
+            days_before_year, days_before_cycle = tables[0:2]
+            positions, cycles_before_year = tables[2:4]
+            iy = years[ijs] - initial_year
+            iref = reference_year - initial_year
+            ic = cycles[ijs]
+            day_positions = positions[iy, ic, days[ijs]]
+            warp = days_before_year[iy] - days_before_year[iref]
+            warp = warp + days_before_cycle[iy, ic]
+            ordinals['day'][ijs] = warp + day_positions
+            warp = cycles_before_year[iy] - cycles_before_year[iref]
+            ordinals['cycle'][ijs] = warp + ic - 1
+            ordinals['day_position'][ijs] = day_positions
+            warp = days_before_cycle[iy, ic + 1] - days_before_cycle[iy, ic]
+            ordinals['days_in_cycle'][ijs] = warp
+            warp = days_before_year[iy + 1] - days_before_year[iy]
+            ordinals['days_in_year'][ijs] = warp
+            warp = cycles_before_year[iy + 1] - cycles_before_year[iy]
+            ordinals['cycles_in_year'][ijs] = warp
+        return ordinals
+
+    def day_ordinals(self, reference_year=None):
+        """Days elapsed since the beginning of a reference year.
+
+        Parameters
+        ----------
+        reference_year : int, optional
+            (default is the minimum year of the dates).
+
+        Returns
+        -------
+        out : numpy array
+            integer day ordinals, negative before the reference year.
+
+        """
+
+        return self._ordinals(reference_year)['day']
+
+    def cycle_ordinals(self, reference_year=None):
+        """Cycles elapsed since the beginning of a reference year.
+
+        Parameters
+        ----------
+        reference_year : int, optional
+            (default is the minimum year of the dates).
+
+        Returns
+        -------
+        out : numpy array
+            integer cycle ordinals, negative before the reference year.
+
+        """
+
+        return self._ordinals(reference_year)['cycle']
+
+    def second_ordinals(self, reference_year=None):
+        """Seconds elapsed since the beginning of a reference year.
+
+        Parameters
+        ----------
+        reference_year : int, optional
+            (default is the minimum year of the dates).
+
+        Returns
+        -------
+        out : numpy array
+            integer (or float if the dates have decimals) second ordinals.
+
+        Notes
+        -----
+        This is an absolute time key within a calendar: sorting, comparing
+        and differencing dates can be done directly on it. Two sets of dates
+        must use the same reference year to be compared.
+
+        """
+
+        day_ordinals = self.day_ordinals(reference_year)
+        hours = ma.getdata(self.times[..., 3])
+        minutes = ma.getdata(self.times[..., 4])
+        seconds = ma.getdata(self.times[..., 5])
+        return day_ordinals * 86400 + hours * 3600 + minutes * 60 + seconds
+
     def add_years(self, increments, fractional_interpretation='days'):
         """Add (or substract) a number of years to (from) the date.
 
@@ -2614,7 +2969,7 @@ class MultiDate(_CollectionTime):
         if not hasattr(integral, 'size'):
             fractional = my_ones * fractional
             integral = my_ones * integral
-        calendars = np.unique(self.calendars)
+        calendars = self._unique_calendars
 
         # Add/substract just enough to get to first month where possible
         # Also substract when possible (i.e. does not go back to previous year)
@@ -2851,7 +3206,7 @@ class MultiDate(_CollectionTime):
             self.second(new_seconds)
 
     def __add__(self, multideltat):
-        new_mdate = MultiDate(self.times, self.calendars)
+        new_mdate = MultiDate(ma.array(self.times, copy=True), self.calendars)
         new_mdate.add_years(multideltat.year())
         new_mdate.add_cycles(multideltat.cycle())
         new_mdate.add_days(multideltat.day())
@@ -2911,41 +3266,108 @@ class MultiDate(_CollectionTime):
     def difference(self, other):
         raise NotImplementedError()
 
+    def _sorted_keys(self, other):
+        # Second ordinals of self and other with a common reference year,
+        # and whether the keys of self are sorted along a single axis.
+        if not np.array_equal(self._unique_calendars,
+                              other._unique_calendars):
+            warp = "you better know what you are doing..."
+            warnings.warn("intersection using different calendars, " + warp)
+        reference_year = min(ma.getdata(self.times[..., 0]).min(),
+                             ma.getdata(other.times[..., 0]).min())
+        keys = self.second_ordinals(reference_year)
+        other_keys = other.second_ordinals(reference_year)
+        flag_sorted = (keys.ndim == 1) and (np.diff(keys) >= 0).all()
+        return keys, other_keys, flag_sorted
+
     def intersection(self, other, as_indices=False):
-        if isinstance(other, Period):
+        """Dates within a period.
+
+        Parameters
+        ----------
+        other : Period
+        as_indices : bool
+            return indices instead of dates.
+
+        Returns
+        -------
+        out : MultiDate or tuple of numpy arrays
+            dates within the period, or their indices (as numpy.where).
+
+        Notes
+        -----
+        Comparisons are done on absolute second ordinals. If the dates are
+        sorted, the bounds are found by binary search.
+
+        """
+
+        if not isinstance(other, Period):
+            raise NotImplementedError()
+        keys, other_keys, flag_sorted = self._sorted_keys(other)
+        if flag_sorted:
+            warp = _search_bounds(keys, other_keys[np.newaxis, :],
+                                  other.left_open, other.right_open)
+            indices = (np.arange(warp[0][0], warp[1][0]),)
+        else:
             if other.left_open:
-                flag_initial = self > other.initial_date()
+                flag_initial = keys > other_keys[0]
             else:
-                flag_initial = self >= other.initial_date()
+                flag_initial = keys >= other_keys[0]
             if other.right_open:
-                flag_final = self < other.final_date()
+                flag_final = keys < other_keys[1]
             else:
-                flag_final = self <= other.final_date()
-            flag_within = np.bitwise_and(flag_initial, flag_final)
-            if as_indices:
-                return np.where(flag_within)
-            # self < other.final_date()
-            # other.initial_date()
-            # other.final_date()
-            ##initial_indice = None
-            ##final_indice = None
-            # list_indices = []
-            # for i in range(self.times.shape[0]):
-            # if self[i].within(other):
-            # list_indices.append(i)
-            ##if initial_indice is None:
-            ##initial_indice = i
-            ##final_indice = i
-            ##else:
-            ##final_indice = i
-            # if as_indices:
-            ##return initial_indice,final_indice+1
-            # return (np.array(list_indices),)
-            # else:
-            ##return self[initial_indice:final_indice+1]
-            # self[(np.array(list_indices),)]
-        else:
-            raise NotImplementedError()
+                flag_final = keys <= other_keys[1]
+            indices = np.where(np.bitwise_and(flag_initial, flag_final))
+        if as_indices:
+            return indices
+        if not indices[0].size:
+            return None
+        return self[indices]
+
+    def intersection_many(self, other):
+        """Indices of the dates within each of many periods.
+
+        Parameters
+        ----------
+        other : MultiPeriod
+
+        Returns
+        -------
+        out : list
+            for each period (in the flattened order of other), a slice if
+            the dates are sorted, otherwise a tuple of numpy arrays (as
+            numpy.where).
+
+        Notes
+        -----
+        With sorted dates, all the periods are located by a single binary
+        search on second ordinals, e.g. every month of a 30 year hourly
+        time series is indexed in one call. The returned slices can be
+        used directly to read netCDF variables.
+
+        """
+
+        keys, other_keys, flag_sorted = self._sorted_keys(other)
+        bounds = other_keys.reshape((-1, 2))
+        left_open = ma.getdata(other.left_open).ravel()
+        right_open = ma.getdata(other.right_open).ravel()
+        if flag_sorted:
+            starts, stops = _search_bounds(keys, bounds, left_open,
+                                           right_open)
+            return [slice(int(i0), int(i1)) for i0, i1 in zip(starts, stops)]
+        list_of_indices = []
+        for i in range(bounds.shape[0]):
+            if left_open[i]:
+                flag_initial = keys > bounds[i, 0]
+            else:
+                flag_initial = keys >= bounds[i, 0]
+            if right_open[i]:
+                flag_final = keys < bounds[i, 1]
+            else:
+                flag_final = keys <= bounds[i, 1]
+            warp = np.where(np.bitwise_and(flag_initial, flag_final))
+            list_of_indices.append(warp)
+        return list_of_indices
 
     def symmetric_difference(self, other):
         raise NotImplementedError()
@@ -3091,56 +3513,72 @@ class Date(MultiDate):
 
 #
 class TimeSeries(MultiDate):
+    def _uniform_step(self, ordinals):
+        # Common first difference of the ordinals, None if not uniform.
+        steps = np.diff(ordinals)
+        if (np.abs(steps - steps[0]) < threshold).all():
+            return steps[0]
+        return None
+
     def timestep(self):
+        """Uniform timestep of the time series.
+
+        Returns
+        -------
+        out : DeltaT
+
+        Notes
+        -----
+        The timestep is given in years if only the years vary, in cycles if
+        only the years and cycles vary, otherwise it is computed from the
+        first differences of :meth:`second_ordinals`.
+        A TimelyError is raised if the timestep is not uniform, use
+        :meth:`timestep_breaks` to locate the irregularities.
+
+        """
+
         if self.times.shape[0] < 2:
             raise TimelyError("Need more than one date to compute timestep.")
-        # get first timesteps
-        period = explicit_period(self[0], self[1])
-        counts = []
-        flags_uniform = []
-        for j in range(0, 6):
-            if ~period.times[0, :].mask[j]:
-                counts.append(period.len(j))
-                if (j in [0, 1, 2]) and (counts[j] == 1):
-                    flags_uniform.append(False)
-                else:
-                    flags_uniform.append(True)
-        # check that every subsequent timesteps are the same
-        for i in range(2, self.times.shape[0]):
-            period = explicit_period(self[0], self[i])
-            for j in range(0, 6):
-                if ~period.times[0, :].mask[j] and flags_uniform[j]:
-                    if j in [0, 1, 2]:
-                        this_count = counts[j] - 1
-                        this_timestep = period.len(j) - 1
-                    else:
-                        this_count = counts[j]
-                        this_timestep = period.len(j)
-                    if i * this_count != this_timestep:
-                        flags_uniform[j] = False
-            if not (True in flags_uniform):
-                raise TimelyError("Could not calculate a uniform timestep.")
-        if len(flags_uniform) > 5 and flags_uniform[5]:
-            deltat = DeltaT([0, 0, 0, 0, 0, counts[5]])
-            deltat.seconds_to_minutes()
-            deltat.minutes_to_hours()
-            deltat.hours_to_days()
-            return deltat
-        elif len(flags_uniform) > 4 and flags_uniform[4]:
-            deltat = DeltaT([0, 0, 0, 0, counts[4]])
-            deltat.minutes_to_hours()
-            deltat.hours_to_days()
-            return deltat
-        elif len(flags_uniform) > 3 and flags_uniform[3]:
-            deltat = DeltaT([0, 0, 0, counts[3]])
-            deltat.hours_to_days()
-            return deltat
-        elif len(flags_uniform) > 2 and flags_uniform[2]:
-            return DeltaT([0, 0, counts[2] - 1])
-        elif len(flags_uniform) > 1 and flags_uniform[1]:
-            return DeltaT([0, counts[1] - 1])
-        elif flags_uniform[0]:
-            return DeltaT([counts[0] - 1])
+        times = ma.getdata(self.times)
+        if (times[:, 1:] == times[0, 1:]).all():
+            step = self._uniform_step(times[:, 0])
+            if step is not None:
+                return DeltaT([step])
+        if (times[:, 2:] == times[0, 2:]).all():
+            step = self._uniform_step(self.cycle_ordinals())
+            if step is not None:
+                return DeltaT([0, step])
+        step = self._uniform_step(self.second_ordinals())
+        if step is None:
+            raise TimelyError("Could not calculate a uniform timestep.")
+        deltat = DeltaT([0, 0, 0, 0, 0, step])
+        deltat.seconds_to_minutes()
+        deltat.minutes_to_hours()
+        deltat.hours_to_days()
+        return deltat
+
+    def timestep_breaks(self):
+        """Distinct timesteps of the time series and where they change.
+
+        Returns
+        -------
+        out1,out2 : numpy arrays
+            sorted distinct timesteps (in seconds), and indices of the dates
+            from which the timestep differs from the previous one.
+
+        Notes
+        -----
+        A regular time series has a single timestep and no breaks. A missing
+        date shows up as two breaks, one at the date preceding the gap and
+        one at the date following it.
+
+        """
+
+        if self.times.shape[0] < 2:
+            raise TimelyError("Need more than one date to compute timestep.")
+        steps = np.diff(self.second_ordinals())
+        breaks = np.nonzero(np.abs(np.diff(steps)) >= threshold)[0] + 1
+        return np.unique(steps), breaks
 
 
 #
@@ -3190,200 +3628,80 @@ class MultiPeriod(MultiDate):
             return Period(self.times[item, :, :], self.left_open[item],
                           self.right_open[item], self.calendars[item, :])
 
+    def _count(self, component):
+        """Count the time units covered by the periods.
+
+        Parameters
+        ----------
+        component : int
+            time vector element (0 for years, ..., 5 for seconds).
+
+        Returns
+        -------
+        out : numpy array
+            number of time units touched by each period.
+
+        Notes
+        -----
+        Counts are differences of absolute ordinals of the final and initial
+        dates, plus one. An open end point is not counted if it falls on
+        a boundary of the time unit (e.g. a right open period ending at
+        00:00:00 does not count that day).
+
+        """
+
+        ordinals = self._ordinals()
+        times = ma.getdata(self.times)
+        # Absolute ordinal of each end point for the given time unit
+        if component == 0:
+            keys = times[..., 0]
+        elif component == 1:
+            keys = ordinals['cycle']
+        else:
+            keys = ordinals['day']
+            for j in range(3, component + 1):
+                keys = keys * [24, 60, 60][j - 3] + times[..., j]
+        # Initial date on the last instant of the unit, final date on the
+        # first instant of the unit, checked for all smaller elements.
+        flag_last = np.ones(self.shape, dtype=bool)
+        flag_first = np.ones(self.shape, dtype=bool)
+        for j in range(component + 1, 6):
+            if j == 1:
+                last_value = ordinals['cycles_in_year'][..., 0]
+                flag_first &= times[..., 1, 1] == 1
+            elif j == 2:
+                last_value = ordinals['days_in_cycle'][..., 0] - 1
+                flag_first &= ordinals['day_position'][..., 1] == 0
+            else:
+                last_value = [23, 59, 59][j - 3]
+                flag_first &= times[..., 1, j] == 0
+            if j == 2:
+                flag_last &= ordinals['day_position'][..., 0] == last_value
+            else:
+                flag_last &= times[..., 0, j] == last_value
+        flag_left_open = np.bitwise_and(ma.getdata(self.left_open), flag_last)
+        flag_right_open = np.bitwise_and(ma.getdata(self.right_open),
+                                         flag_first)
+        warp = keys[..., 1] - keys[..., 0] + 1
+        return warp - flag_left_open - flag_right_open
+
     def count_years(self):
-        if not self.decimals:
-            # Check for left_open condition
-            days_in_cycle = self.count_days_in_cycle()
-            last_cycle_in_year = self.count_cycles_in_year()
-            last_day_in_cycle = self.ith_day_in_cycle(days_in_cycle)
-            c1 = self.times[..., 0, 1] == last_cycle_in_year[..., 0]
-            c2 = self.times[..., 0, 2] == last_day_in_cycle[..., 0]
-            c3 = self.times[..., 0, 3] == 23
-            c4 = self.times[..., 0, 4] == 59
-            c5 = self.times[..., 0, 5] == 59
-            ct = np.bitwise_and(c1, c2)
-            ct = np.bitwise_and(c3, ct)
-            ct = np.bitwise_and(c4, ct)
-            ct = np.bitwise_and(c5, ct)
-            flag_left_open = self.left_open * ct
-            # Check for right_open condition
-            first_day_in_cycle = self.ith_day_in_cycle(1)
-            c1 = self.times[..., 1, 1] == 1
-            c2 = self.times[..., 1, 2] == first_day_in_cycle[..., 1]
-            c3 = self.times[..., 1, 3] == 0
-            c4 = self.times[..., 1, 4] == 0
-            c5 = self.times[..., 1, 5] == 0
-            ct = np.bitwise_and(c1, c2)
-            ct = np.bitwise_and(c3, ct)
-            ct = np.bitwise_and(c4, ct)
-            ct = np.bitwise_and(c5, ct)
-            flag_right_open = self.right_open * ct
-        # Calculate number of years
-        warp = ma.ones(self.shape, dtype=myint)
-        num_of_years = self.times[..., 1, 0] - self.times[..., 0, 0] + warp
-        return num_of_years - flag_left_open - flag_right_open
+        return self._count(0)
 
     def count_cycles(self):
-        if not self.decimals:
-            # Check for left_open condition
-            days_in_cycle = self.count_days_in_cycle()
-            last_day_in_cycle = self.ith_day_in_cycle(days_in_cycle)
-            c2 = self.times[..., 0, 2] == last_day_in_cycle[..., 0]
-            c3 = self.times[..., 0, 3] == 23
-            c4 = self.times[..., 0, 4] == 59
-            c5 = self.times[..., 0, 5] == 59
-            ct = np.bitwise_and(c2, c3)
-            ct = np.bitwise_and(c4, ct)
-            ct = np.bitwise_and(c5, ct)
-            flag_left_open = self.left_open * ct
-            # Check for right_open condition
-            first_day_in_cycle = self.ith_day_in_cycle(1)
-            c2 = self.times[..., 1, 2] == first_day_in_cycle[..., 1]
-            c3 = self.times[..., 1, 3] == 0
-            c4 = self.times[..., 1, 4] == 0
-            c5 = self.times[..., 1, 5] == 0
-            ct = np.bitwise_and(c2, c3)
-            ct = np.bitwise_and(c4, ct)
-            ct = np.bitwise_and(c5, ct)
-            flag_right_open = self.right_open * ct
-        # Calculate number of cycles
-        cycle_count = ma.zeros(self.shape, dtype=myint)
-        for y in range(self.times[..., 0, 0].min(), self.times[..., 1, 0].max() + 1):
-            flag_initial_year = (y == self.times[..., 0, 0])
-            flag_final_year = (y == self.times[..., 1, 0])
-            warp1 = (y >= self.times[..., 0, 0])
-            warp2 = (y <= self.times[..., 1, 0])
-            flag_between = np.bitwise_and(warp1, warp2)
-            cycles_in_year = ma.zeros(self.times.shape[:-1], dtype=myint)
-            for cal in self._unique_calendars:
-                ijs = np.where(self.calendars == cal)
-                cycles_in_year[ijs] = cal.count_cycles_in_year(y)
-            t1 = flag_initial_year * (self.times[..., 0, 1] - ma.ones(self.shape))
-            t2 = flag_between * cycles_in_year[..., 0]
-            t3 = flag_final_year * (cycles_in_year[..., 0] - self.times[..., 1, 1])
-            cycle_count += -t1 + t2 - t3
-        return cycle_count - flag_left_open - flag_right_open
+        return self._count(1)
 
     def count_days(self):
-        if not self.decimals:
-            # Check for left_open condition
-            c3 = self.times[..., 0, 3] == 23
-            c4 = self.times[..., 0, 4] == 59
-            c5 = self.times[..., 0, 5] == 59
-            ct = np.bitwise_and(c3, c4)
-            ct = np.bitwise_and(c5, ct)
-            flag_left_open = self.left_open * ct
-            # Check for right_open condition
-            c3 = self.times[..., 1, 3] == 0
-            c4 = self.times[..., 1, 4] == 0
-            c5 = self.times[..., 1, 5] == 0
-            ct = np.bitwise_and(c3, c4)
-            ct = np.bitwise_and(c5, ct)
-            flag_right_open = self.right_open * ct
-        day_count = ma.zeros(self.shape, dtype=myint)
-        for y in range(self.times[..., 0, 0].min(), self.times[..., 1, 0].max() + 1):
-            flag_initial_year = (y == self.times[..., 0, 0])
-            flag_final_year = (y == self.times[..., 1, 0])
-            warp1 = (y >= self.times[..., 0, 0])
-            warp2 = (y <= self.times[..., 1, 0])
-            flag_between = np.bitwise_and(warp1, warp2)
-            if flag_between.sum() != 0:
-                # deal with in-between years
-                days_in_year = ma.zeros(self.times.shape[:-1], dtype=myint)
-                for cal in self._unique_calendars:
-                    ijs = np.where(self.calendars == cal)
-                    days_in_year[ijs] = cal.count_days_in_year(y)
-                day_count += flag_between * days_in_year[..., 0]
-            if flag_initial_year.sum() != 0:
-                # deal with initial years
-                cycles_in_year = self.count_cycles_in_year()[..., 0]
-                warp = ma.array(self.times[..., 0, 1], mask=~flag_initial_year)
-                for cc in range(1, warp.max() + 1):
-                    flag_initial_cycle = (cc == self.times[..., 0, 1])
-                    flag_before = (cc < self.times[..., 0, 1])
-                    days_in_cycle = ma.zeros(self.times.shape[:-1], dtype=myint)
-                    for cal in self._unique_calendars:
-                        ijs = np.where(self.calendars == cal)
-                        days_in_cycle[ijs] = cal.count_days_in_cycle(cc, y)
-                    day_num_in_cycle = self.day_number_in_cycle()
-                    t1 = flag_initial_cycle * (day_num_in_cycle[..., 0] - ma.ones(self.shape))
-                    t2 = flag_before * days_in_cycle[..., 0]
-                    day_count -= flag_initial_year * (t1 + t2)
-            if flag_final_year.sum() != 0:
-                # deal with final years
-                cycles_in_year = self.count_cycles_in_year()[..., 1]
-                warp1 = ma.array(self.times[..., 1, 1], mask=~flag_final_year)
-                warp2 = ma.array(cycles_in_year, mask=~flag_final_year)
-                for cc in range(warp1.min(), warp2.max() + 1):
-                    flag_final_cycle = (cc == self.times[..., 1, 1])
-                    flag_after = (cc > self.times[..., 1, 1])
-                    days_in_cycle = ma.zeros(self.times.shape[:-1], dtype=myint)
-                    for cal in self._unique_calendars:
-                        ijs = np.where(self.calendars == cal)
-                        days_in_cycle[ijs] = cal.count_days_in_cycle(cc, y)
-                    day_num_in_cycle = self.day_number_in_cycle()
-                    warp = days_in_cycle[..., 1] - day_num_in_cycle[..., 1]
-                    t1 = flag_after * days_in_cycle[..., 1]
-                    t2 = flag_final_cycle * (warp)
-                    day_count -= flag_final_year * (t1 + t2)
-        return day_count - flag_left_open - flag_right_open
+        return self._count(2)
 
     def count_hours(self):
-        if not self.decimals:
-            # Check for left_open condition
-            c3 = self.times[..., 0, 3] == 23
-            c4 = self.times[..., 0, 4] == 59
-            c5 = self.times[..., 0, 5] == 59
-            ct = np.bitwise_and(c4, c5)
-            flag_left_open_hour = self.left_open * ct
-            ct = np.bitwise_and(c3, c4)
-            ct = np.bitwise_and(c5, ct)
-            flag_left_open = self.left_open * ct
-            # Check for right_open condition
-            c3 = self.times[..., 1, 3] == 0
-            c4 = self.times[..., 1, 4] == 0
-            c5 = self.times[..., 1, 5] == 0
-            ct = np.bitwise_and(c4, c5)
-            flag_right_open_hour = self.right_open * ct
-            ct = np.bitwise_and(c3, c4)
-            ct = np.bitwise_and(c5, ct)
-            flag_right_open = self.right_open * ct
-        num_of_hours = self.count_days() * 24
-        t1 = -(self.times[..., 0, 3] + flag_left_open_hour) * (~flag_left_open)
-        t2 = -(23 - self.times[..., 1, 3] + flag_right_open_hour) * (~flag_right_open)
-        return num_of_hours + t1 + t2
+        return self._count(3)
 
     def count_minutes(self):
-        if not self.decimals:
-            # Check for left_open condition
-            c4 = self.times[..., 0, 4] == 59
-            c5 = self.times[..., 0, 5] == 59
-            ct = np.bitwise_and(c4, c5)
-            flag_left_open_hour = self.left_open * ct
-            flag_left_open = self.left_open * c5
-            # Check for right_open condition
-            c4 = self.times[..., 1, 4] == 0
-            c5 = self.times[..., 1, 5] == 0
-            ct = np.bitwise_and(c4, c5)
-            flag_right_open_hour = self.right_open * ct
-            flag_right_open = self.right_open * c5
-        num_of_minutes = self.count_hours() * 60
-        t1 = -(self.times[..., 0, 4] + flag_left_open) * (~flag_left_open_hour)
-        t2 = -(59 - self.times[..., 1, 4] + flag_right_open) * (~flag_right_open_hour)
-        return num_of_minutes + t1 + t2
+        return self._count(4)
 
     def count_seconds(self):
-        if not self.decimals:
-            # Check for left_open condition
-            c5 = self.times[..., 0, 5] == 59
-            flag_left_open = self.left_open * c5
-            # Check for right_open condition
-            c5 = self.times[..., 1, 5] == 0
-            flag_right_open = self.right_open * c5
-        num_of_seconds = self.count_minutes() * 60
-        t1 = -(self.times[..., 0, 5] + self.left_open) * (~flag_left_open)
-        t2 = -(59 - self.times[..., 1, 5] + self.right_open) * (~flag_right_open)
-        return num_of_seconds + t1 + t2
+        return self._count(5)
 
     def len(self, units='seconds'):
         if units == 'seconds' or units == 5:
@@ -3391,14 +3709,14 @@ class MultiPeriod(MultiDate):
         elif units == 'minutes' or units == 4:
             return self.count_seconds() / 60.0
         elif units == 'hours' or units == 3:
-            return self.count_seconds() / 360.0
+            return self.count_seconds() / 3600.0
         elif units == 'days' or units == 2:
             return self.count_seconds() / 86400.0
         elif units in ['cycles', 'months'] or units == 1:
-            days_in_cycle = self.count_days_in_cycle()
+            days_in_cycle = self._ordinals()['days_in_cycle']
             return self.count_seconds() / (86400.0 * days_in_cycle[..., 0])
         elif units == 'years' or units == 0:
-            days_in_year = self.count_days_in_year()
+            days_in_year = self._ordinals()['days_in_year']
             return self.count_seconds() / (86400.0 * days_in_year[..., 0])
 
     def buffer(self, deltat):
@@ -3660,11 +3978,16 @@ class Period(MultiPeriod):
 
         Returns
         -------
-        out : TimeSeries
+        out : MultiPeriod
+            [start, start + length[ periods, with starts every deltat
+            within the period (None if there are none).
 
         Notes
         -----
         The buffer is only applied on the initial date.
+        When deltat and length each use a single kind of time unit (years,
+        cycles, or days/hours/minutes/seconds), all the divisions are
+        computed at once from ordinals, otherwise one at a time.
 
         """
 
@@ -3674,31 +3997,62 @@ class Period(MultiPeriod):
             initial_date = self.initial_date()
         if self.left_open and (initial_date == self.initial_date()):
             initial_date = initial_date + deltat
+        final_date = self.final_date()
         if self.right_open:
-            if initial_date >= self.final_date():
+            if (initial_date >= final_date).all():
                 return None
         else:
-            if initial_date > self.final_date():
+            if (initial_date > final_date).all():
                 return None
-        multiperiod_times = ma.empty([1, 2, 6])
-        multiperiod_times[0, 0, :] = initial_date.time
-        # next_date = initial_date + deltat
-        next_date = initial_date + deltat
-        end_date = initial_date + length
-        multiperiod_times[0, 1, :] = end_date.time
-        final_date = self.final_date()
-        if new_calendar is not None:
-            final_date.calendar = new_calendar
-        while next_date <= final_date:
-            if self.right_open and (next_date == final_date):
-                break
-            next_period = ma.empty([2, 6])
-            next_period[0, :] = next_date.time
-            end_date = next_date + length
-            next_period[1, :] = end_date.time
-            multiperiod_times = ma.vstack([multiperiod_times, next_period])
-            next_date = next_date + deltat
-        return TimeWindows(multiperiod_times.data, self.calendar)
+        if new_calendar is None:
+            calendar = self.calendars[0]
+        else:
+            calendar = new_calendar
+        initial_date = Date(initial_date.times[0, :], calendar)
+        final_date = Date(final_date.times[0, :], calendar)
+        reference_year = initial_date.year()[0]
+        final_key = final_date.second_ordinals(reference_year)[0]
+        # Upper bound on the number of divisions
+        shortest = _regular_shifts(initial_date, deltat, np.array([1]))
+        if shortest is None:
+            starts = []
+            next_date = initial_date
+            while True:
+                key = next_date.second_ordinals(reference_year)[0]
+                if (key > final_key) or (self.right_open and key == final_key):
+                    break
+                starts.append(ma.getdata(next_date.times[0, :]))
+                next_date = next_date + deltat
+            starts = ma.array(starts, mask=np.zeros(np.shape(starts), bool))
+        else:
+            warp = MultiDate(shortest, calendar)
+            step = warp.second_ordinals(reference_year)[0]
+            step = step - initial_date.second_ordinals(reference_year)[0]
+            warp = final_key - initial_date.second_ordinals(reference_year)[0]
+            # a cycle or a year can be shorter than the first one
+            n = int(warp // (step / 2.0)) + 2
+            starts = _regular_shifts(initial_date, deltat, np.arange(n))
+            keys = MultiDate(starts, calendar).second_ordinals(reference_year)
+            if self.right_open:
+                starts = starts[keys < final_key, :]
+            else:
+                starts = starts[keys <= final_key, :]
+        if not starts.shape[0]:
+            return None
+        ends = _regular_shifts(MultiDate(starts, calendar), length,
+                               np.ones([starts.shape[0]], dtype=myint))
+        if ends is None:
+            ends = []
+            for i in range(starts.shape[0]):
+                warp = Date(starts[i, :], calendar) + length
+                ends.append(ma.getdata(warp.times[0, :]))
+            ends = ma.array(ends, mask=np.zeros(np.shape(ends), bool))
+        warp = np.result_type(ma.getdata(starts), ma.getdata(ends))
+        multiperiod_times = ma.zeros([starts.shape[0], 2, 6], dtype=warp)
+        multiperiod_times.mask = np.zeros(multiperiod_times.shape, bool)
+        multiperiod_times[:, 0, :] = starts
+        multiperiod_times[:, 1, :] = ends
+        return MultiPeriod(multiperiod_times, False, True, calendar)
 
     # def count_years(self):
     # """Count the number of years covered by the period.
@@ -4049,6 +4403,70 @@ class Period(MultiPeriod):
 #
 
 
+def _regular_shifts(mdate, deltat, multipliers):
+    """Dates shifted by multiples of a time interval.
+
+    Parameters
+    ----------
+    mdate : MultiDate
+        a single date, or one date per multiplier.
+    deltat : DeltaT
+    multipliers : numpy array of int
+
+    Returns
+    -------
+    out : masked array
+        time vectors (N x 6), or None if deltat mixes years, cycles and
+        smaller units, has decimal years or cycles, or if the dates use
+        different calendars.
+
+    Notes
+    -----
+    Years are added directly, cycles and smaller units are added on cycle
+    and second ordinals which are converted back to dates with the calendar
+    lookup tables. Shifted dates that do not exist (e.g. Feb 29 plus one
+    year) are rejected when building a MultiDate from the result.
+
+    """
+
+    steps = ma.getdata(deltat.times[0, :])
+    if (np.modf(steps[0:2])[0] != 0).any():
+        return None
+    if len(mdate._unique_calendars) != 1:
+        return None
+    flags = steps != 0
+    multipliers = np.asarray(multipliers)
+    calendar = mdate._unique_calendars[0]
+    times = np.zeros([multipliers.size, 6], dtype=np.result_type(
+        ma.getdata(mdate.times), steps))
+    times[...] = ma.getdata(mdate.times)
+    reference_year = int(times[:, 0].min())
+    if not flags.any():
+        pass
+    elif not flags[1:].any():
+        times[:, 0] += multipliers * int(steps[0])
+    elif flags[1] and not (flags[0] or flags[2:].any()):
+        warp = mdate.cycle_ordinals(reference_year) + multipliers * steps[1]
+        years, cycles = calendar.cycle_ordinals_to_dates(warp, reference_year)
+        times[:, 0] = years
+        times[:, 1] = cycles
+    elif not flags[0:2].any():
+        warp = steps[2] * 86400 + steps[3] * 3600 + steps[4] * 60 + steps[5]
+        seconds = mdate.second_ordinals(reference_year) + multipliers * warp
+        if np.modf(seconds)[0].any():
+            times = np.array(times, dtype=myfloat)
+        days = np.array(seconds // 86400, dtype=myint)
+        seconds = seconds - days * 86400
+        warp = calendar.day_ordinals_to_dates(days, reference_year)
+        times[:, 0], times[:, 1], times[:, 2] = warp
+        times[:, 3] = seconds // 3600
+        times[:, 4] = (seconds % 3600) // 60
+        times[:, 5] = seconds % 60
+    else:
+        return None
+    return ma.array(times, mask=np.zeros(times.shape, bool))
+
+
 def deltats2dates(multideltat, reference_date):
     time_array = np.zeros([len(num), 6])
     time_array[:, 0] = reference_date.year()
@@ -4120,16 +4538,186 @@ def implicit_period(time, calendar=CalGregorian):
     """
 
     validate_time = _Time(time)
-    date1 = Date(validate_time.times, calendar)
-    interval = ma.zeros([6])
+    # The resolution is taken before Date fills the masked elements
     if ma.getmaskarray(validate_time.times[0]).sum() == 6:
         resolution = 0
     else:
         warp = ~ma.getmaskarray(validate_time.times[0])
         resolution = np.nonzero(warp)[0][-1] + 1
+    date1 = Date(validate_time.times, calendar)
+    interval = ma.zeros([6])
     interval[resolution - 1] = 1
     date2 = date1 + DeltaT(interval)
     period_matrix = ma.empty([2, 6])
     period_matrix[0, :] = _conversion_to_ma(time)
     period_matrix[1, :] = date2.times[:]
     return Period(period_matrix, False, True, calendar)
+
+
+class Profile:
+    """Call counts and timings collected while profiling is enabled.
+
+    Attributes
+    ----------
+    calls : dict
+        number of calls of each timed method and vectorized function.
+    times : dict
+        cumulative time (in seconds) of each timed method and vectorized
+        function, nested calls are included in the time of the caller.
+    scalar_calls : dict
+        number of scalar calls of each vectorized function (keyed as in
+        calls) and of each calendar callback (keyed by function name).
+
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.times = {}
+        self.scalar_calls = {}
+
+    def add(self, name, seconds):
+        """Record a call of a timed method or vectorized function."""
+
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def report(self, limit=None):
+        """Report of the profile, sorted by cumulative time.
+
+        Parameters
+        ----------
+        limit : int or None
+            maximum number of lines in each section.
+
+        Returns
+        -------
+        out : str
+
+        """
+
+        lines = ["%-50s %9s %10s %10s %12s" % (
+            'method / vectorized function', 'calls', 'time (s)',
+            'ms/call', 'scalar/call')]
+        names = sorted(self.calls.keys(), key=lambda x: -self.times[x])
+        for name in names[0:limit]:
+            calls = self.calls[name]
+            if name in self.scalar_calls:
+                warp = "%12.1f" % (float(self.scalar_calls[name]) / calls,)
+            else:
+                warp = "%12s" % ('',)
+            lines.append("%-50s %9d %10.4f %10.4f %s" % (
+                name, calls, self.times[name],
+                1000.0 * self.times[name] / calls, warp))
+        lines.append('')
+        lines.append("%-50s %9s" % ('calendar callback', 'calls'))
+        callbacks = [name for name in self.scalar_calls.keys()
+                     if name not in self.calls]
+        callbacks.sort(key=lambda x: -self.scalar_calls[x])
+        for name in callbacks[0:limit]:
+            lines.append("%-50s %9d" % (name, self.scalar_calls[name]))
+        return '\n'.join(lines)
+
+
+# Operators timed in addition to the public methods
+_profiled_operators = ['__init__', '__getitem__', '__add__', '__sub__',
+                       '__eq__', '__ne__', '__lt__', '__le__', '__gt__',
+                       '__ge__']
+
+
+#
+def _set_profiling(enable):
+    # Wrap (or unwrap) the public methods of the time classes in timers and
+    # vectorize the calendars again with (or without) call counts.
+    global _Vindex, _Vget_item
+    for cls in [MultiDeltaT, DeltaT, MultiDate, Date, TimeSeries,
+                MultiPeriod, Period]:
+        for name, method in list(cls.__dict__.items()):
+            if name.startswith('_') and name not in _profiled_operators:
+                continue
+            if hasattr(method, '_timely_original'):
+                if not enable:
+                    setattr(cls, name, method._timely_original)
+            elif enable and callable(method) and not isinstance(method, type):
+                setattr(cls, name,
+                        _timed(method, "%s.%s" % (cls.__name__, name)))
+    if enable:
+        _Vindex = _profiled_vectorize(_index, '_Vindex')
+        _Vget_item = _profiled_vectorize(_get_item, '_Vget_item')
+    else:
+        _Vindex = np.vectorize(_index)
+        _Vget_item = np.vectorize(_get_item)
+    for calendar in _calendars:
+        calendar._vectorize()
+
+
+def enable_profiling():
+    """Start counting calls and timing the timely operations.
+
+    Returns
+    -------
+    out : Profile
+        the profile being collected, a new one unless profiling was
+        already enabled.
+
+    Notes
+    -----
+    The public methods (and arithmetic/comparison operators) of MultiDate,
+    Period and the related classes are timed, the vectorized calendar
+    functions are timed and count their scalar calls, and the calendar
+    callbacks (e.g. days_in_month_gregorian) count their calls. Nothing is
+    wrapped while profiling is disabled, so there is no overhead then.
+    Calendar objects are vectorized again, so they must not be in use by
+    another thread.
+
+    """
+
+    global _profile
+    if _profile is None:
+        _profile = Profile()
+        _set_profiling(True)
+    return _profile
+
+
+def disable_profiling():
+    """Stop profiling and restore the timely operations.
+
+    Returns
+    -------
+    out : Profile or None
+        the collected profile, None if profiling was not enabled.
+
+    """
+
+    global _profile
+    profile = _profile
+    _profile = None
+    if profile is not None:
+        _set_profiling(False)
+    return profile
+
+
+@contextlib.contextmanager
+def profiling(report=True, limit=30):
+    """Profile the timely operations in a with statement.
+
+    Parameters
+    ----------
+    report : bool
+        print the report when leaving the with statement.
+    limit : int or None
+        maximum number of lines in each section of the report.
+
+    Examples
+    --------
+    >>> with profiling() as profile:
+    ...     period.regular_sample(one_hour)
+
+    """
+
+    profile = enable_profiling()
+    try:
+        yield profile
+    finally:
+        disable_profiling()
+        if report:
+            print(profile.report(limit))
@@ -0,0 +1,61 @@
+"""Tests of catalog on small synthetic files."""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.ma as ma
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'cfs'))
+
+import catalog
+import timely as ty
+from test_netcdf import _hourly_file
+
+
+def _period(initial_time, final_time, left_open, right_open):
+    warp = ma.array([initial_time, final_time], mask=np.zeros([2, 6], bool))
+    return ty.Period(warp, left_open, right_open)
+
+
+class TestFindFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.nc_files = []
+        for k in range(3):
+            nc_file = os.path.join(self.path, "tas_%d.nc" % (k,))
+            _hourly_file(nc_file, nt=24, first=24 * k)
+            self.nc_files.append(nc_file)
+        self.catalog_file = os.path.join(self.path, 'catalog.db')
+        catalog.build_catalog(self.path, self.catalog_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def find(self, period):
+        return catalog.find_files(self.catalog_file, 'tas', period)
+
+    def test_closed_bounds(self):
+        day1 = [1979, 1, 1, 0, 0, 0]
+        day2 = [1979, 1, 2, 0, 0, 0]
+        self.assertEqual(self.find((day1, day2)), self.nc_files[0:2])
+        self.assertEqual(self.find(_period(day1, day2, False, False)),
+                         self.nc_files[0:2])
+
+    def test_open_bounds(self):
+        day1 = [1979, 1, 1, 23, 0, 0]
+        day2 = [1979, 1, 2, 0, 0, 0]
+        self.assertEqual(self.find(_period(day1, day2, False, True)),
+                         self.nc_files[0:1])
+        self.assertEqual(self.find(_period(day1, day2, True, False)),
+                         self.nc_files[1:2])
+        self.assertEqual(self.find(_period(day1, day2, True, True)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
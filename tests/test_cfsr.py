@@ -0,0 +1,149 @@
+"""Tests of cfsr on synthetic GRIB messages.
+
+gribou is replaced by an in-memory module, so that pygrib is not needed:
+messages are packed as in GRIB2 simple packing, with a reference value
+and scale factors of their own.
+
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+import numpy as np
+import numpy.ma as ma
+import netCDF4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'cfs'))
+
+ny = 12
+nx = 16
+ndays = 2
+
+
+def _pack(values, bits, binary_scale_factor, decimal_scale_factor):
+    # Simple packing: the reference value is the minimum stored in float32,
+    # values are rounded to a multiple of 2 ** E / 10 ** D above it.
+    warp = values * 10.0 ** decimal_scale_factor
+    reference = float(np.float32(warp.min()))
+    if reference > warp.min():
+        reference = float(np.nextafter(np.float32(reference),
+                                       np.float32(-np.inf)))
+    packed = np.round((warp - reference) / 2.0 ** binary_scale_factor)
+    packed = np.clip(packed, 0, 2 ** bits - 1)
+    warp = reference + packed * 2.0 ** binary_scale_factor
+    return warp / 10.0 ** decimal_scale_factor
+
+
+def _max_fixture(seed=0):
+    # Running maxima of 6h windows (0-1h to 0-6h) with the true maxima of
+    # each hour, messages packed over 24 bits.
+    rs = np.random.RandomState(seed)
+    lat = np.repeat(np.linspace(90, -90, ny)[:, None], nx, 1)
+    lon = np.repeat(np.linspace(0, 337.5, nx)[None, :], ny, 0)
+    msg_dicts = []
+    values = []
+    hourly = []
+    for day in range(1, ndays + 1):
+        for hour in [0, 6, 12, 18]:
+            running = None
+            for end_step in range(1, 7):
+                # Cold hours keep the running maximum of the window
+                warp = 280.0 + 20.0 * rs.rand(ny, nx)
+                warp[rs.rand(ny, nx) < 0.6] -= 30.0
+                hourly.append(warp)
+                if running is None:
+                    running = warp
+                else:
+                    running = np.maximum(running, warp)
+                binary_scale_factor = -int(rs.randint(10, 14))
+                values.append(_pack(running, 24, binary_scale_factor, 0))
+                msg_dicts.append(
+                    {'name': 'Maximum temperature',
+                     'parameterName': 'Maximum temperature',
+                     'nameECMF': 'Maximum temperature', 'units': 'K',
+                     'parameterUnits': 'K', 'unitsECMF': 'K',
+                     'stepType': 'max', 'stepTypeInternal': 'max',
+                     'typeOfLevel': 'heightAboveGround',
+                     'unitsOfFirstFixedSurface': 'm',
+                     'scaleFactorOfFirstFixedSurface': 0,
+                     'scaledValueOfFirstFixedSurface': 2,
+                     'unitsOfSecondFixedSurface': 'unknown',
+                     'startStep': 0, 'endStep': end_step, 'year': 1979,
+                     'month': 1, 'day': day, 'hour': hour,
+                     'bitsPerValue': 24,
+                     'binaryScaleFactor': binary_scale_factor,
+                     'decimalScaleFactor': 0})
+    return msg_dicts, values, np.array(hourly), lat, lon
+
+
+def _fake_gribou(msg_dicts, values, lat, lon):
+    gribou = types.ModuleType('gribou')
+    gribou.get_all_msg_dict = lambda grib_file: [dict(d) for d in msg_dicts]
+    gribou.get_latlons = lambda grib_file, msg_id=1: (lat, lon)
+    gribou.get_msg_data = lambda grib_file, msg_id: values[msg_id - 1]
+    gribou.msg_iterator = lambda grib_file: ({'values': v} for v in values)
+    return gribou
+
+
+class TestHourlyExtremes(unittest.TestCase):
+
+    def setUp(self):
+        self.msg_dicts, values, self.hourly, lat, lon = _max_fixture()
+        self.saved_gribou = sys.modules.get('gribou')
+        sys.modules['gribou'] = _fake_gribou(self.msg_dicts, values, lat, lon)
+        sys.modules.pop('cfsr', None)
+        import cfsr
+        self.cfsr = cfsr
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        sys.modules.pop('cfsr', None)
+        if self.saved_gribou is None:
+            sys.modules.pop('gribou', None)
+        else:
+            sys.modules['gribou'] = self.saved_gribou
+
+    def convert(self, extremes, **kwargs):
+        nc_file = os.path.join(self.path, "tasmax_%s.nc" % (extremes,))
+        self.cfsr.hourly_grib2_to_netcdf(
+            'fake.grb2', 'rda', nc_file, 'tasmax', 'Maximum temperature',
+            2.0, extremes=extremes, **kwargs)
+        nc1 = netCDF4.Dataset(nc_file, 'r')
+        data = nc1.variables['tasmax'][:, :, :]
+        cell_methods = nc1.variables['tasmax'].cell_methods
+        nc1.close()
+        return data, cell_methods
+
+    def test_hourly_known_values_are_hourly_maxima(self):
+        data, cell_methods = self.convert('hourly', cache_size=7)
+        self.assertEqual(cell_methods, "time: maximum (interval: 1 hour)")
+        truth = self.hourly[:, ::-1, :]
+        known = ~ma.getmaskarray(data)
+        # Packing errors are below 2 ** -10 K, a running maximum would be
+        # off by several K.
+        error = np.abs(data[known] - truth[known])
+        self.assertTrue(error.max() < 2.0 ** -9)
+        self.assertTrue(known[0::6].all())
+        self.assertTrue(0.1 < known.mean() < 0.9)
+
+    def test_hourly_bounded_by_window(self):
+        hourly, cell_methods = self.convert('hourly')
+        window, cell_methods = self.convert('window')
+        self.assertEqual(cell_methods, "time: maximum (interval: 6 hours)")
+        warp = hourly.reshape([ndays * 4, 6, ny, nx]).max(axis=1)
+        self.assertTrue(np.allclose(warp, window, atol=2.0 ** -9))
+
+    def test_hourly_weird_delta_t(self):
+        for msg_dict in self.msg_dicts[1:6]:
+            msg_dict['startStep'] = 1
+        self.assertRaises(NotImplementedError, self.convert, 'hourly')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,446 @@
+"""Tests of netcdf on small synthetic files."""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.ma as ma
+import netCDF4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'cfs'))
+
+import netcdf as nc
+import timely as ty
+
+
+def _hourly_file(nc_file, nt=48, nlat=3, nlon=4, history=None, first=0):
+    # Hourly file laid out as the converted CFSR files, starting first
+    # hours after 1979-01-01.
+    nc1 = netCDF4.Dataset(nc_file, 'w', format='NETCDF4')
+    if history is not None:
+        nc1.history = history
+    nc1.createDimension('time', None)
+    nc1.createDimension('timecomp', 6)
+    nc1.createDimension('lat', nlat)
+    nc1.createDimension('lon', nlon)
+    time = nc1.createVariable('time', 'i4', ('time',))
+    time.units = 'hours since 1979-01-01 00:00:00'
+    time.calendar = 'gregorian'
+    time_vectors = nc1.createVariable('time_vectors', 'i2',
+                                      ('time', 'timecomp'))
+    lat = nc1.createVariable('lat', 'f4', ('lat',))
+    lat.units = 'degrees_north'
+    lat[:] = np.linspace(-45, 45, nlat)
+    lon = nc1.createVariable('lon', 'f4', ('lon',))
+    lon.units = 'degrees_east'
+    lon[:] = np.linspace(0, 270, nlon)
+    tas = nc1.createVariable('tas', 'f4', ('time', 'lat', 'lon'), zlib=True)
+    tas.units = 'K'
+    hours = first + np.arange(nt)
+    time[:] = hours
+    warp = np.zeros([nt, 6], dtype='i2')
+    warp[:, 0] = 1979
+    warp[:, 1] = 1
+    warp[:, 2] = 1 + hours // 24
+    warp[:, 3] = hours % 24
+    time_vectors[:, :] = warp
+    warp = np.arange(first * nlat * nlon, (first + nt) * nlat * nlon)
+    tas[:, :, :] = warp.reshape([nt, nlat, nlon])
+    nc1.close()
+
+
+class TestSample(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_sample_appends_history(self):
+        source = os.path.join(self.path, 'tas_1hr.nc')
+        destination = os.path.join(self.path, 'tas_6hr.nc')
+        _hourly_file(source, history='2015-01-01T00:00:00: Convert')
+        nc.nc_sample_files([source], [destination], start=5, step=6,
+                           history_log='6 hourly sample.', map_function=map)
+        nc1 = netCDF4.Dataset(destination, 'r')
+        self.assertEqual(nc1.history,
+                         '2015-01-01T00:00:00: Convert\n6 hourly sample.')
+        self.assertTrue(np.all(nc1.variables['time'][:] ==
+                               np.arange(5, 48, 6)))
+        warp = np.arange(48 * 12).reshape([48, 3, 4])[5::6]
+        self.assertTrue(np.all(nc1.variables['tas'][:, :, :] == warp))
+        nc1.close()
+
+    def test_sample_without_history(self):
+        source = os.path.join(self.path, 'tas_1hr.nc')
+        destination = os.path.join(self.path, 'tas_6hr.nc')
+        _hourly_file(source)
+        nc1 = netCDF4.Dataset(source, 'r')
+        nc2 = netCDF4.Dataset(destination, 'w')
+        nc.nc_sample(nc1, nc2, start=0, step=24, history_log='Daily.')
+        nc2.close()
+        nc1.close()
+        nc2 = netCDF4.Dataset(destination, 'r')
+        self.assertEqual(nc2.history, 'Daily.')
+        self.assertEqual(nc2.variables['tas'].shape, (2, 3, 4))
+        nc2.close()
+
+    def test_sample_selected_variables(self):
+        source = os.path.join(self.path, 'tas_1hr.nc')
+        destination = os.path.join(self.path, 'tas_6hr.nc')
+        _hourly_file(source)
+        nc1 = netCDF4.Dataset(source, 'a')
+        nc1.createVariable('pr', 'f4', ('time', 'lat', 'lon'))
+        nc1.close()
+        nc.nc_sample_files([source], [destination], start=3, step=6,
+                           var_names=['tas'], max_bytes=64, processes=1)
+        nc2 = netCDF4.Dataset(destination, 'r')
+        try:
+            self.assertEqual(sorted(nc2.variables.keys()),
+                             ['lat', 'lon', 'tas', 'time', 'time_vectors'])
+            self.assertEqual(nc2.variables['tas'].chunking(), [1, 3, 4])
+            warp = nc2.variables['time_vectors'][:, :]
+            self.assertTrue(np.all(warp[:, 3] == [3, 9, 15, 21] * 2))
+            warp = np.arange(48 * 12).reshape([48, 3, 4])[3::6]
+            self.assertTrue(np.all(nc2.variables['tas'][:, :, :] == warp))
+        finally:
+            nc2.close()
+
+    def test_sample_files_destinations(self):
+        self.assertRaises(nc.NetCDFError, nc.nc_sample_files, ['a.nc'],
+                          [], map_function=map)
+
+
+class TestResample(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.source = os.path.join(self.path, 'tas_1hr.nc')
+        self.destination = os.path.join(self.path, 'tas_day.nc')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def resample(self, **kwargs):
+        nc1 = netCDF4.Dataset(self.source, 'r')
+        nc2 = netCDF4.Dataset(self.destination, 'w')
+        try:
+            nc.nc_resample(nc1, nc2, 'tas', ty.DeltaT([0, 0, 1]), **kwargs)
+            return nc2.variables['tas'][:, :, :]
+        finally:
+            nc2.close()
+            nc1.close()
+
+    def test_resample_daily_max(self):
+        _hourly_file(self.source)
+        data = self.resample(statistic='max')
+        warp = np.arange(48 * 12).reshape([2, 24, 3, 4]).max(axis=1)
+        self.assertTrue(np.all(data == warp))
+
+    def test_resample_single_time_step(self):
+        _hourly_file(self.source, nt=1)
+        self.assertEqual(self.resample().shape, (1, 3, 4))
+
+    def test_resample_no_time_step_in_periods(self):
+        _hourly_file(self.source, nt=1)
+        self.assertRaises(nc.NetCDFError, self.resample, left_open=True,
+                          right_open=True)
+
+    def test_resample_masked_time_axis(self):
+        _hourly_file(self.source)
+        nc1 = netCDF4.Dataset(self.source, 'a')
+        nc1.variables['time_vectors'][:, :] = ma.masked_all([48, 6])
+        nc1.close()
+        self.assertRaises(nc.NetCDFError, self.resample)
+
+
+class TestCopyVariablesData(unittest.TestCase):
+
+    def setUp(self):
+        self.nc1 = netCDF4.Dataset('source.nc', 'w', diskless=True)
+        self.nc1.createDimension('x', 12)
+        self.nc1.createDimension('y', 5)
+        var1 = self.nc1.createVariable('v', 'f4', ('x', 'y'),
+                                       chunksizes=(4, 5))
+        self.data = np.arange(60, dtype='f4').reshape([12, 5])
+        var1[:, :] = self.data
+        self.nc2 = netCDF4.Dataset('destination.nc', 'w', diskless=True)
+        self.nc2.createDimension('x', 12)
+        self.nc2.createDimension('y', 5)
+        self.nc2.createDimension('t', None)
+        self.nc2.createVariable('v', 'f4', ('x', 'y'))
+        self.nc2.createVariable('w', 'f4', ('t', 'y'))
+
+    def tearDown(self):
+        self.nc2.close()
+        self.nc1.close()
+
+    def copy(self, source_slices, destination_slices, var_name='v'):
+        nc.nc_copy_variables_data(
+            self.nc1, self.nc2, includes=['v'], renames={'v': var_name},
+            source_slices={'v': source_slices},
+            destination_slices={var_name: destination_slices},
+            max_bytes=40)
+        return self.nc2.variables[var_name][:, :]
+
+    def test_negative_step(self):
+        warp = self.copy(None, slice(None, None, -1))
+        self.assertTrue(np.all(warp == self.data[::-1]))
+        warp = self.copy(slice(0, 6), slice(10, 4, -1))
+        self.assertTrue(np.all(warp[10:4:-1] == self.data[0:6]))
+
+    def test_negative_start(self):
+        warp = self.copy(slice(0, 3), slice(-3, None))
+        self.assertTrue(np.all(warp[-3:] == self.data[0:3]))
+        warp = self.copy(slice(0, 3), slice(-5, -2))
+        self.assertTrue(np.all(warp[-5:-2] == self.data[0:3]))
+
+    def test_shape_mismatch(self):
+        self.assertRaises(nc.NetCDFError, self.copy, slice(0, 3),
+                          slice(-2, None, -1))
+
+    def test_unlimited_growth(self):
+        self.copy(slice(0, 4), slice(None), var_name='w')
+        warp = self.copy(slice(4, 8), slice(6, None), var_name='w')
+        self.assertEqual(warp.shape, (10, 5))
+        self.assertTrue(np.all(warp[6:10] == self.data[4:8]))
+        self.assertTrue(warp[4:6].mask.all())
+
+
+class TestRawDataset(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.raw_file = os.path.join(self.path, 'tas.raw')
+        raw1 = nc.RawDataset(self.raw_file, 'w', unlimited_sizes={'time': 4},
+                             max_json_size=16)
+        raw1.title = 'Raw'
+        raw1.createDimension('time', None)
+        raw1.createDimension('lat', 3)
+        raw1.createDimension('lon', 5)
+        time = raw1.createVariable('time', 'i4', ('time',))
+        time.units = 'hours since 1979-01-01 00:00:00'
+        time[:] = np.arange(4)
+        tas = raw1.createVariable('tas', 'f4', ('time', 'lat', 'lon'),
+                                  zlib=True, chunksizes=(4, 3, 5))
+        tas.units = 'K'
+        self.data = ma.array(np.arange(60, dtype='f4').reshape([4, 3, 5]))
+        self.data[1, 2, 3] = ma.masked
+        tas[:, :, :] = self.data
+        raw1.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_memory_mapped_read(self):
+        raw1 = nc.RawDataset(self.raw_file, 'r')
+        tas = raw1.variables['tas']
+        self.assertTrue(isinstance(tas.values, np.memmap))
+        self.assertFalse(isinstance(raw1.variables['time'].values,
+                                    np.memmap))
+        self.assertEqual(raw1.title, 'Raw')
+        self.assertEqual(tas.units, 'K')
+        warp = tas[1, :, :]
+        self.assertTrue(np.shares_memory(warp.data, tas.values))
+        self.assertTrue(ma.allequal(warp, self.data[1]))
+        self.assertEqual(ma.count_masked(warp), 1)
+        self.assertTrue(tas[0, :, :].mask is ma.nomask)
+
+    def test_raw_to_netcdf(self):
+        nc_file = os.path.join(self.path, 'tas.nc')
+        nc.raw_to_netcdf(self.raw_file, nc_file, max_bytes=64)
+        nc1 = netCDF4.Dataset(nc_file, 'r')
+        try:
+            self.assertEqual(nc1.title, 'Raw')
+            self.assertTrue(nc1.dimensions['time'].isunlimited())
+            tas = nc1.variables['tas']
+            self.assertEqual(tas.chunking(), [4, 3, 5])
+            self.assertTrue(tas.filters()['zlib'])
+            warp = tas[:, :, :]
+            self.assertTrue(ma.allequal(warp, self.data))
+            self.assertTrue(np.all(warp.mask == self.data.mask))
+            self.assertTrue(np.all(nc1.variables['time'][:] ==
+                                   np.arange(4)))
+        finally:
+            nc1.close()
+
+
+class TestLonSlices(unittest.TestCase):
+
+    def test_periodic_wrap(self):
+        lon = np.arange(0, 360, 2.5)
+        self.assertEqual(nc._lon_slices(lon, -10.0, 10.0),
+                         [slice(140, 144), slice(0, 5)])
+        self.assertEqual(nc._lon_slices(lon, 350.0, 10.0),
+                         [slice(140, 144), slice(0, 5)])
+        self.assertEqual(nc._lon_slices(lon, 0.0, 360.0), [slice(0, 144)])
+
+    def test_regional_clip(self):
+        lon = np.arange(250, 300.25, 0.5)
+        self.assertEqual(nc._lon_slices(lon, 240.0, 260.0), [slice(0, 21)])
+        self.assertEqual(nc._lon_slices(lon, 290.0, 310.0),
+                         [slice(80, 101)])
+        warp = nc._lon_slices(lon, 0.0, 10.0)[0]
+        self.assertEqual(lon[warp].size, 0)
+
+    def test_regional_other_convention(self):
+        lon = np.arange(-130, -59, 1.0)
+        self.assertEqual(nc._lon_slices(lon, 240.0, 250.0), [slice(10, 21)])
+        self.assertEqual(nc._lon_slices(lon, 220.0, 300.0), [slice(0, 71)])
+        lon = np.arange(250, 300.25, 0.5)
+        self.assertEqual(nc._lon_slices(lon, -110.0, -100.0),
+                         [slice(0, 21)])
+
+
+class TestDatasetPool(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.nc_files = []
+        for k in range(2):
+            nc_file = os.path.join(self.path, "tas_%d.nc" % (k,))
+            _hourly_file(nc_file, nt=24, first=24 * k)
+            self.nc_files.append(nc_file)
+        nc.dataset_pool.clear()
+        self.saved_stats = nc.dataset_pool.stats()
+
+    def tearDown(self):
+        nc.dataset_pool.clear()
+        shutil.rmtree(self.path)
+
+    def test_helpers_share_handles(self):
+        nc.nt_from_multiple_files_with_calendar_check(self.nc_files)
+        nc._calendar_from_file(self.nc_files[0])
+        nc.load_point_timeseries_from_multiple_files(self.nc_files, 'tas',
+                                                     j=1, i=2)
+        warp = nc.dataset_pool.stats()
+        self.assertEqual(warp['misses'] - self.saved_stats['misses'], 2)
+        self.assertEqual(warp['size'], 2)
+
+    def test_write_pooled_file(self):
+        nc.load_point_timeseries_from_multiple_files(self.nc_files, 'tas',
+                                                     j=1, i=2)
+        nc.nc_sample_files(self.nc_files[0:1], self.nc_files[1:2], step=6,
+                           map_function=map)
+        warp = nc.load_point_timeseries_from_multiple_files(
+            self.nc_files[1:2], 'tas', j=1, i=2)
+        self.assertTrue(np.all(warp[1] == np.arange(0, 24, 6) * 12 + 6))
+
+
+class TestStitchTimeParts(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.nc_file = os.path.join(self.path, 'tas.nc')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def stitch(self, lengths):
+        part_files = []
+        first = 0
+        for k, nt in enumerate(lengths):
+            part_file = os.path.join(self.path, "tas.part%d.nc" % (k,))
+            _hourly_file(part_file, nt=nt, first=first,
+                         history='2015-01-01T00:00:00: Convert')
+            part_files.append(part_file)
+            first += nt
+        nc.nc_stitch_time_parts(part_files, self.nc_file, max_bytes=96)
+        nc1 = netCDF4.Dataset(self.nc_file, 'r')
+        try:
+            self.assertTrue(nc1.dimensions['time'].isunlimited())
+            self.assertEqual(nc1.history, '2015-01-01T00:00:00: Convert')
+            self.assertTrue(np.all(nc1.variables['time'][:] ==
+                                   np.arange(first)))
+            warp = nc1.variables['time_vectors'][:, :]
+            self.assertTrue(np.all(warp[:, 3] == np.arange(first) % 24))
+            warp = np.arange(first * 12).reshape([first, 3, 4])
+            self.assertTrue(np.all(nc1.variables['tas'][:, :, :] == warp))
+            self.assertTrue(np.all(nc1.variables['lat'][:] == [-45, 0, 45]))
+        finally:
+            nc1.close()
+
+    def test_whole_chunk_parts(self):
+        self.stitch([24, 24, 24])
+
+    def test_uneven_parts(self):
+        self.stitch([24, 7, 17])
+
+
+class TestLazyFile(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.nc_file = os.path.join(self.path, 'tas.nc')
+        _hourly_file(self.nc_file, nt=24)
+
+    def tearDown(self):
+        nc.dataset_pool.clear()
+        shutil.rmtree(self.path)
+
+    def test_lazy_variables(self):
+        warp = nc.open_cf_nc_file(self.nc_file, var_names=['tas'],
+                                  load_data='lazy')
+        with warp[0] as nc1:
+            time, lon, lat, tas = warp[1:]
+            self.assertTrue(isinstance(tas, nc.LazyVariable))
+            self.assertEqual(tas.shape, (24, 3, 4))
+            self.assertEqual(tas.units, 'K')
+            self.assertEqual(time.units, 'hours since 1979-01-01 00:00:00')
+            self.assertTrue(np.all(tas[5, :, :] ==
+                                   np.arange(60, 72).reshape([3, 4])))
+            self.assertTrue(np.all(nc1['lat'][:] == [-45, 0, 45]))
+        self.assertFalse(nc1.isopen())
+        # Cached coordinates outlive the file, proxies do not
+        self.assertTrue(np.all(time[:] == np.arange(24)))
+        self.assertRaises(nc.NetCDFError, tas.__getitem__, 0)
+
+    def test_lazy_read_only(self):
+        self.assertRaises(nc.NetCDFError, nc.open_cf_nc_file, self.nc_file,
+                          mode='a', load_data='lazy')
+
+    def test_large_coordinates_read_on_demand(self):
+        nc1 = nc.LazyFile(self.nc_file, max_cache_bytes=8)
+        try:
+            self.assertTrue(nc1['lat']._data is None)
+            self.assertTrue(nc1['time']._data is None)
+            self.assertTrue(np.all(nc1['lat'][:] == [-45, 0, 45]))
+        finally:
+            nc1.close()
+        self.assertRaises(nc.NetCDFError, nc1['lat'].__getitem__, 0)
+
+
+class TestMultiFileVariable(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.nc_files = []
+        for k in range(3):
+            nc_file = os.path.join(self.path, "tas_%d.nc" % (k,))
+            _hourly_file(nc_file, nt=24, first=24 * k)
+            self.nc_files.append(nc_file)
+
+    def tearDown(self):
+        nc.dataset_pool.clear()
+        shutil.rmtree(self.path)
+
+    def test_unsorted_files(self):
+        warp = [self.nc_files[k] for k in [2, 0, 1]]
+        mfv = nc.MultiFileVariable(warp, 'tas')
+        self.assertEqual(mfv.nc_files, self.nc_files)
+        self.assertTrue(np.all(mfv.time == np.arange(72)))
+        warp = np.arange(72 * 12).reshape([72, 3, 4])
+        self.assertTrue(np.all(mfv[:, 1, 2] == warp[:, 1, 2]))
+
+    def test_overlapping_files(self):
+        warp = self.nc_files + [self.nc_files[1]]
+        self.assertRaises(nc.NetCDFError, nc.MultiFileVariable, warp, 'tas')
+
+
+if __name__ == '__main__':
+    unittest.main()